@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+对比两次基准测试结果
+python benchmarks/compare.py base.json head.json [--metric p95] [--threshold 10]
+
+threshold 为百分比：有基准变慢超过阈值时以退出码 1 结束，便于在 CI 中使用。
+"""
+
+import argparse
+import json
+import sys
+
+
+def main():
+    parser = argparse.ArgumentParser(description='对比两次基准测试结果')
+    parser.add_argument('base', help='基线结果 JSON')
+    parser.add_argument('head', help='新结果 JSON')
+    parser.add_argument('--metric', choices=['p50', 'p95', 'p99', 'mean'], default='p50',
+                        help='对比的统计量 (默认: p50)')
+    parser.add_argument('--threshold', type=float, help='变慢超过该百分比时返回 1')
+    args = parser.parse_args()
+
+    with open(args.base, encoding='utf-8') as f:
+        base = json.load(f)
+    with open(args.head, encoding='utf-8') as f:
+        head = json.load(f)
+
+    print(f"base: {base['meta'].get('commit')}  head: {head['meta'].get('commit')}  "
+          f"({args.metric}, ms)")
+    print(f"{'benchmark':<24} {'base':>10} {'head':>10} {'change':>9}")
+
+    regressions = []
+    for name in sorted(base['results'].keys() | head['results'].keys()):
+        old = base['results'].get(name, {}).get(args.metric)
+        new = head['results'].get(name, {}).get(args.metric)
+        if old is None or new is None:
+            print(f"{name:<24} {old if old is not None else '-':>10} "
+                  f"{new if new is not None else '-':>10} {'':>9}")
+            continue
+        change = (new - old) / old * 100 if old else 0.0
+        print(f"{name:<24} {old:>10.3f} {new:>10.3f} {change:>+8.1f}%")
+        if args.threshold is not None and change > args.threshold:
+            regressions.append(name)
+
+    if regressions:
+        print(f"\n变慢超过 {args.threshold}%: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+AgentNote Benchmark Corpus
+可复现的合成语料生成器（固定 seed 得到完全相同的数据）
+
+- 文档：中英混合 Markdown，正文长度服从对数正态分布，
+  分类与标签按 Zipf 分布（少数热门标签覆盖大部分文档）
+- x_bookmarks：推文正文、用户、时间、统计数据以及 urls/media/hashtags JSON
+"""
+
+import json
+import random
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT / "utils"))
+sys.path.insert(0, str(ROOT / "scripts"))
+import db
+import x_bookmarks_db
+
+# 语料规模预设
+SIZES = {
+    'small': 10_000,
+    'medium': 100_000,
+    'large': 1_000_000,
+}
+
+EN_WORDS = (
+    "sqlite index query cache latency throughput python flask render markdown "
+    "agent model prompt context token vector search ranking snippet cursor page "
+    "database schema trigger journal writer reader pool thread process deploy "
+    "benchmark profile memory disk network compression stream export import "
+    "review design pattern refactor module package release version history"
+).split()
+
+CJK_WORDS = (
+    "数据库 索引 查询 缓存 延迟 吞吐量 全文检索 知识库 文档 标签 分类 摘要 "
+    "模型 提示词 上下文 向量 排序 分页 游标 触发器 连接池 线程 进程 部署 "
+    "性能 内存 磁盘 网络 压缩 导出 导入 设计 模式 重构 模块 版本 历史 书签 推文"
+).split()
+
+CATEGORIES = ("tech", "notes", "research", "tutorial", "reading", "ideas",
+              "work", "life", "tools", "ai", "database", "frontend")
+
+TAG_VOCABULARY = 500                # 标签总数
+BOOKMARK_USERS = 2000               # 书签作者数
+EPOCH = datetime(2024, 1, 1)        # 合成数据的时间起点
+TIME_SPAN_DAYS = 730                # 时间跨度
+
+
+def zipf_weights(n: int, s: float = 1.1) -> list:
+    """Zipf 分布的权重：第 k 个元素的权重为 1/k^s"""
+    return [1 / (k ** s) for k in range(1, n + 1)]
+
+
+def tag_names() -> list:
+    """标签词表：英文与中文标签混合"""
+    names = []
+    for i in range(TAG_VOCABULARY):
+        word = EN_WORDS[i % len(EN_WORDS)] if i % 3 else CJK_WORDS[i % len(CJK_WORDS)]
+        names.append(word if i < len(EN_WORDS) else f"{word}-{i}")
+    return list(dict.fromkeys(names))
+
+
+def sentence(rng: random.Random, cjk: bool) -> str:
+    """生成一句中文或英文"""
+    if cjk:
+        return "".join(rng.choices(CJK_WORDS, k=rng.randint(4, 12))) + "。"
+    words = rng.choices(EN_WORDS, k=rng.randint(6, 18))
+    return " ".join(words).capitalize() + "."
+
+
+def markdown_body(rng: random.Random, target_chars: int, cjk_ratio: float) -> str:
+    """生成接近 target_chars 字符的 Markdown 正文（标题、段落、列表、代码块）"""
+    parts = []
+    size = 0
+    section = 0
+    while size < target_chars:
+        roll = rng.random()
+        if roll < 0.12:
+            section += 1
+            level = "##" if rng.random() < 0.7 else "###"
+            block = f"{level} {sentence(rng, rng.random() < cjk_ratio).rstrip('.。')} {section}"
+        elif roll < 0.22:
+            block = "\n".join(f"- {sentence(rng, rng.random() < cjk_ratio)}"
+                              for _ in range(rng.randint(2, 5)))
+        elif roll < 0.27:
+            block = "```python\n" + "\n".join(
+                f"{rng.choice(EN_WORDS)} = {rng.randint(0, 999)}" for _ in range(rng.randint(2, 8))
+            ) + "\n```"
+        else:
+            block = " ".join(sentence(rng, rng.random() < cjk_ratio)
+                             for _ in range(rng.randint(2, 6)))
+        parts.append(block)
+        size += len(block) + 2
+    return "\n\n".join(parts)
+
+
+def generate_documents(count: int, seed: int = 42):
+    """逐条产出文档字典（字段同 db.add_document），含 created_at"""
+    rng = random.Random(seed)
+    tags = tag_names()
+    tag_weights = zipf_weights(len(tags))
+    category_weights = zipf_weights(len(CATEGORIES), 0.8)
+
+    for i in range(count):
+        cjk_ratio = rng.choice((0.0, 0.3, 0.7, 1.0))
+        # 正文长度：中位数约 2KB，长尾到几十 KB
+        target = min(int(rng.lognormvariate(7.6, 0.9)), 60_000)
+        title = sentence(rng, rng.random() < cjk_ratio).rstrip('.。')[:60]
+        tag_count = min(int(rng.expovariate(0.5)), 8)
+        created = EPOCH + timedelta(seconds=rng.randrange(TIME_SPAN_DAYS * 86400))
+        yield {
+            'title': f"{title} #{i}",
+            'slug': f"bench-{seed}-{i}",
+            'content': f"# {title}\n\n" + markdown_body(rng, target, cjk_ratio),
+            'category': rng.choices(CATEGORIES, category_weights)[0] if rng.random() < 0.9 else None,
+            'tags': list(dict.fromkeys(rng.choices(tags, tag_weights, k=tag_count))),
+            'source': 'import',
+            'created_at': created.strftime('%Y-%m-%d %H:%M:%S'),
+        }
+
+
+def tweet_text(rng: random.Random) -> str:
+    """生成推文正文（中英混合，带话题与链接占位）"""
+    cjk = rng.random() < 0.5
+    text = " ".join(sentence(rng, cjk) for _ in range(rng.randint(1, 4)))
+    if rng.random() < 0.3:
+        text += " #" + rng.choice(EN_WORDS)
+    return text[:280 * (2 if not cjk else 1)]
+
+
+def generate_bookmarks(count: int, seed: int = 42):
+    """逐条产出 x_bookmarks 行字典"""
+    rng = random.Random(seed + 1)
+    users = [f"user{i}" for i in range(BOOKMARK_USERS)]
+    user_weights = zipf_weights(len(users))
+    domains = ("github.com", "arxiv.org", "example.com", "x.com", "twitter.com",
+               "medium.com", "news.ycombinator.com", "sqlite.org")
+
+    for i in range(count):
+        screen_name = rng.choices(users, user_weights)[0]
+        tweet_id = str(1_700_000_000_000_000_000 + i * 7919)
+        created = EPOCH + timedelta(seconds=rng.randrange(TIME_SPAN_DAYS * 86400))
+        bookmarked = created + timedelta(seconds=rng.randrange(30 * 86400))
+        text = tweet_text(rng)
+        urls = [
+            {'display_url': f"{d}/{rng.choice(EN_WORDS)}",
+             'expanded_url': f"https://{d}/{rng.choice(EN_WORDS)}/{rng.randint(1, 9999)}"}
+            for d in rng.sample(domains, k=min(int(rng.expovariate(1.2)), 3))
+        ]
+        media = [{'type': 'photo', 'url': f"https://pbs.twimg.com/media/{tweet_id}-{m}.jpg"}
+                 for m in range(min(int(rng.expovariate(1.5)), 4))]
+        hashtags = list(dict.fromkeys(rng.choices(EN_WORDS, k=min(int(rng.expovariate(1.0)), 4))))
+        mentions = [{'screen_name': u, 'name': u.title()}
+                    for u in rng.sample(users[:200], k=min(int(rng.expovariate(1.5)), 3))]
+        row = {
+            'tweet_id': tweet_id,
+            'tweet_url': f"https://x.com/{screen_name}/status/{tweet_id}",
+            'full_text': text,
+            'lang': 'zh' if any('一' <= ch <= '鿿' for ch in text) else 'en',
+            'created_at': created.strftime('%Y-%m-%d %H:%M:%S'),
+            'bookmarked_at': bookmarked.strftime('%Y-%m-%d %H:%M:%S'),
+            'user_id': str(users.index(screen_name) + 1000),
+            'user_name': screen_name.title(),
+            'user_screen_name': screen_name,
+            'bookmark_count': int(rng.paretovariate(1.5)),
+            'favorite_count': int(rng.paretovariate(1.2) * 10),
+            'retweet_count': int(rng.paretovariate(1.4) * 3),
+            'reply_count': int(rng.paretovariate(1.6)),
+            'quote_count': int(rng.paretovariate(2.0)),
+            'view_count': int(rng.paretovariate(1.1) * 500),
+            'urls': json.dumps(urls, ensure_ascii=False),
+            'media': json.dumps(media, ensure_ascii=False),
+            'hashtags': json.dumps(hashtags, ensure_ascii=False),
+            'user_mentions': json.dumps(mentions, ensure_ascii=False),
+        }
+        row['raw_json'] = json.dumps({'rest_id': tweet_id, 'legacy': {
+            'full_text': text, 'created_at': row['created_at'],
+            'entities': {'urls': urls, 'hashtags': hashtags, 'user_mentions': mentions},
+        }}, ensure_ascii=False)
+        yield row
+
+
+def load_documents(count: int, seed: int = 42, chunk_size: int = db.BULK_CHUNK_SIZE,
+                   progress=None) -> int:
+    """把合成文档写入当前 db.DB_PATH，返回写入数量"""
+    loaded = 0
+    for chunk in db.chunked(generate_documents(count, seed), chunk_size):
+        results = db.add_documents_bulk(chunk, chunk_size)
+        # add_document 不接受 created_at：写入后按 id 回填合成时间
+        with db.get_connection() as conn:
+            conn.executemany(
+                "UPDATE documents SET created_at = ?, updated_at = ? WHERE id = ?",
+                [(doc['created_at'], doc['created_at'], result['id'])
+                 for doc, result in zip(chunk, results) if result.get('success')]
+            )
+        loaded += sum(1 for r in results if r.get('success'))
+        if progress:
+            progress(loaded)
+    return loaded
+
+
+def load_bookmarks(count: int, seed: int = 42, chunk_size: int = db.BULK_CHUNK_SIZE) -> int:
+    """创建 x_bookmarks 表并按 tweet_id upsert 合成书签，返回写入数量"""
+    with db.get_connection() as conn:
+        x_bookmarks_db.init_schema(conn)
+
+    loaded = 0
+    for chunk in db.chunked(generate_bookmarks(count, seed), chunk_size):
+        rows = [{c: row.get(c) for c in x_bookmarks_db.BOOKMARK_COLUMNS} for row in chunk]
+        with db.get_connection() as conn:
+            stats = x_bookmarks_db.upsert_bookmarks(conn, rows)
+        loaded += stats['inserted'] + stats['updated']
+    return loaded
+
+
+def build_corpus(db_path, documents: int, bookmarks: int = 0, seed: int = 42,
+                 progress=None) -> dict:
+    """在 db_path 初始化数据库并写入合成语料"""
+    db.set_database_path(db_path)
+    db.init_database()
+    return {
+        'documents': load_documents(documents, seed, progress=progress),
+        'bookmarks': load_bookmarks(bookmarks, seed) if bookmarks else 0,
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='生成基准测试语料')
+    parser.add_argument('db', help='目标数据库路径')
+    parser.add_argument('--docs', default='small',
+                        help=f"文档数量或预设 ({'/'.join(SIZES)})，默认 small")
+    parser.add_argument('--bookmarks', type=int, default=10_000, help='书签数量 (默认: 10000)')
+    parser.add_argument('--seed', type=int, default=42, help='随机种子 (默认: 42)')
+    args = parser.parse_args()
+
+    count = SIZES.get(args.docs) or int(args.docs)
+    loaded = build_corpus(args.db, count, args.bookmarks, args.seed,
+                          progress=lambda n: print(f"\r{n}/{count}", end='', file=sys.stderr))
+    print(file=sys.stderr)
+    print(json.dumps(loaded))
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+查询计划回归检查
+对 search_documents（DocumentStream）与 BookmarkExporter 的每种查询形态运行
+EXPLAIN QUERY PLAN，出现全表扫描（SCAN，包括沿整个索引扫描），或在不该排序的
+形态上对基表结果做临时 B 树排序时，以退出码 1 结束，便于在 CI 中使用。
+
+没有选择性条件、靠 LIMIT 提前结束的形态（如最新列表）声明允许 'scan'；
+对已取出的一页结果再排序不算排序问题。
+
+用法:
+  python benchmarks/query_plans.py                       # 临时数据库 + 小语料
+  python benchmarks/query_plans.py --db /tmp/bench.db    # 检查已有数据库
+  python benchmarks/query_plans.py -v                    # 打印每条查询计划
+"""
+
+import argparse
+import contextlib
+import re
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+import corpus
+from corpus import EN_WORDS, CATEGORIES, db
+from run import load_exporter
+
+# 基表的扫描: "SCAN d" / "SCAN d USING INDEX ..."（虚拟表另算）
+_ACCESS = re.compile(r'^(SCAN|SEARCH) (\S+)')
+# 子查询与 CTE 的结果集: "CO-ROUTINE p" / "MATERIALIZE hits"
+_SUBQUERY = re.compile(r'^(?:CO-ROUTINE|MATERIALIZE) (\S+)')
+_TEMP_SORT = 'USE TEMP B-TREE FOR ORDER BY'
+
+RARE_WORD = 'zzqueryplanzz'     # 语料中不存在的词：全文检索命中很少
+
+
+def document_shapes(sample_cursor: str) -> list:
+    """search_documents 的查询形态 [(名称, 参数, 允许项)]"""
+    keyword = EN_WORDS[0]
+    return [
+        ('recent', {}, ('scan',)),
+        ('recent.cursor', {'cursor': sample_cursor}, ()),
+        ('recent.offset', {'offset': 100}, ('scan',)),
+        ('category', {'category': CATEGORIES[0]}, ()),
+        ('category.cursor', {'category': CATEGORIES[0], 'cursor': sample_cursor}, ()),
+        # 由标签的命中列表驱动，按时间排序命中
+        ('tag', {'tag': 'sqlite'}, ('sort',)),
+        ('tag.category', {'tag': 'sqlite', 'category': CATEGORIES[0]}, ('sort',)),
+        # bm25 排序
+        ('keyword_fts', {'keyword': keyword}, ('sort',)),
+        ('keyword_fts.category', {'keyword': keyword, 'category': CATEGORIES[0]}, ('sort',)),
+        # 短于 trigram 长度的关键词只能 LIKE 扫描
+        ('keyword_like', {'keyword': '索引'}, ('scan',)),
+        ('fields.full', {'fields': 'full'}, ('scan',)),
+    ]
+
+
+def bookmark_shapes(user: str) -> list:
+    """BookmarkExporter 的查询形态 [(名称, 参数, 允许项)]"""
+    date_range = {'since': '2024-06-01', 'until': '2024-06-30'}
+    return [
+        ('default', {'limit': 20}, ('scan',)),
+        ('all', {}, ('scan',)),
+        ('asc', {'limit': 20, 'order': 'asc'}, ('scan',)),
+        ('date_range', {'limit': 100, **date_range}, ()),
+        ('since', {'limit': 100, 'since': '2025-01-01'}, ()),
+        ('user', {'limit': 100, 'user': user}, ()),
+        ('user.date_range', {'limit': 100, 'user': user, **date_range}, ()),
+        ('lang', {'limit': 100, 'lang': 'zh'}, ()),
+        ('lang.date_range', {'limit': 100, 'lang': 'zh', **date_range}, ()),
+        ('links', {'limit': 100, 'with_links': True}, ('scan',)),
+        # 命中少：取全部命中再按时间排序
+        ('search.rare', {'limit': 100, 'search': RARE_WORD}, ('sort',)),
+        # 命中多：沿时间索引扫描，用命中列表过滤
+        ('search.common', {'limit': 100, 'search': EN_WORDS[0]}, ('scan',)),
+        ('search.prefix', {'limit': 100, 'search': EN_WORDS[0][:4] + '*'}, ('scan',)),
+        # 短于 trigram 长度的词只能 LIKE 扫描
+        ('search.short', {'limit': 100, 'search': 'ab'}, ('scan',)),
+        ('search.all', {'search': EN_WORDS[0]}, ('sort',)),
+        ('search.relevance', {'limit': 100, 'search': EN_WORDS[0], 'order': 'relevance'}, ('sort',)),
+        ('domain', {'limit': 100, 'domain': 'github.com'}, ('sort',)),
+        ('hashtag', {'limit': 100, 'hashtag': EN_WORDS[1]}, ('sort',)),
+        # 分区导出：结果集在外层按分区键重新排序
+        ('partition.user', {'partition': 'user'}, ('scan',)),
+        ('partition.month.relevance', {'search': EN_WORDS[0], 'order': 'relevance', 'partition': 'month'}, ('sort',)),
+        # 增量导出：沿收藏时间索引从水位线开始范围扫描；首次导出没有水位线
+        ('incremental', {'after': ('2025-01-01 00:00:00', 1000)}, ()),
+        ('incremental.user', {'user': user, 'after': ('2025-01-01 00:00:00', 1000)}, ('sort',)),
+        ('incremental.first', {'after': (None, 0)}, ('scan',)),
+    ]
+
+
+def check_plan(rows, allow=()) -> list:
+    """
+    返回计划中的问题列表
+
+    allow 可包含 'scan'（允许扫描）与 'sort'（允许对基表结果临时排序）。
+    """
+    subqueries = set()
+    base_levels = set()     # 直接访问基表的节点所在的父节点
+    problems = []
+    for node, parent, _, detail in rows:
+        match = _SUBQUERY.match(detail)
+        if match:
+            subqueries.add(match.group(1))
+            continue
+        match = _ACCESS.match(detail)
+        if match and match.group(2) not in subqueries and 'VIRTUAL TABLE' not in detail:
+            base_levels.add(parent)
+            if match.group(1) == 'SCAN' and 'scan' not in allow:
+                problems.append(f"full scan: {detail}")
+        if detail.startswith(_TEMP_SORT) and parent in base_levels and 'sort' not in allow:
+            problems.append(f"sort: {detail}")
+    return problems
+
+
+def explain(conn, sql: str, params) -> list:
+    return conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+
+
+def format_plan(rows) -> str:
+    depth = {0: 0}
+    lines = []
+    for node, parent, _, detail in rows:
+        depth[node] = depth.get(parent, 0) + 1
+        lines.append("    " + "  " * (depth[node] - 1) + detail)
+    return "\n".join(lines)
+
+
+def run_checks(db_path: str, verbose: bool = False) -> list:
+    """检查全部查询形态，返回 [(名称, 问题列表)]"""
+    db.set_database_path(db_path)
+    results = []
+
+    def record(name, rows, allow):
+        problems = check_plan(rows, allow)
+        results.append((name, problems))
+        status = "FAIL" if problems else "ok"
+        print(f"{status:<5} {name}")
+        for problem in problems:
+            print(f"      {problem}")
+        if verbose or problems:
+            print(format_plan(rows))
+
+    with db.get_read_connection() as conn:
+        sample_cursor = db.encode_cursor('2025-01-01 00:00:00', 1_000_000)
+        for name, kwargs, allow in document_shapes(sample_cursor):
+            stream = db.DocumentStream(**kwargs)
+            record(f"documents.{name}", explain(conn, stream.sql, stream.params), allow)
+
+        has_bookmarks = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'x_bookmarks'"
+        ).fetchone()
+        user = None
+        if has_bookmarks:
+            user = conn.execute(
+                """SELECT user_screen_name FROM x_bookmarks
+                   GROUP BY user_screen_name ORDER BY COUNT(*) DESC LIMIT 1"""
+            ).fetchone()
+
+    if not has_bookmarks:
+        print("(无 x_bookmarks 表，跳过书签查询)")
+        return results
+
+    exporter = load_exporter()(db_path)
+    conn = exporter._get_connection()
+    try:
+        for name, kwargs, allow in bookmark_shapes(user[0] if user else 'user0'):
+            sql, params = exporter.build_query(conn, **kwargs)
+            record(f"bookmarks.{name}", explain(conn, sql, params), allow)
+            if not kwargs.get('with_links') and kwargs.get('order') != 'relevance' and 'partition' not in kwargs:
+                count_kwargs = {k: v for k, v in kwargs.items() if k != 'order'}
+                sql, params = exporter.build_count_query(**count_kwargs)
+                record(f"bookmarks.{name}.count", explain(conn, sql, params), allow + ('sort',))
+    finally:
+        conn.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='查询计划回归检查',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__
+    )
+    parser.add_argument('--db', help='要检查的数据库 (默认: 临时生成小语料)')
+    parser.add_argument('--docs', type=int, default=500, help='临时语料的文档数 (默认: 500)')
+    parser.add_argument('--bookmarks', type=int, default=5000, help='临时语料的书签数 (默认: 5000)')
+    parser.add_argument('-v', '--verbose', action='store_true', help='打印每条查询计划')
+    args = parser.parse_args()
+
+    tmp_dir = None
+    if args.db:
+        db_path = Path(args.db).resolve()
+    else:
+        tmp_dir = tempfile.mkdtemp(prefix='agentnote-plans-')
+        db_path = Path(tmp_dir) / 'plans.db'
+        print(f"生成语料: {args.docs} 篇文档, {args.bookmarks} 条书签", file=sys.stderr)
+        with contextlib.redirect_stdout(sys.stderr):
+            corpus.build_corpus(db_path, args.docs, args.bookmarks)
+
+    try:
+        results = run_checks(str(db_path), args.verbose)
+    finally:
+        db.close_connections()
+        if tmp_dir:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    failed = [name for name, problems in results if problems]
+    print(f"\n{len(results) - len(failed)}/{len(results)} 通过")
+    if failed:
+        print(f"查询计划回归: {', '.join(failed)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+AgentNote Benchmarks
+对 utils/db.py 的主要读写路径与书签导出计时，输出 JSON（p50/p95/p99，单位毫秒）
+
+用法:
+  python benchmarks/run.py                        # 10k 文档 + 10k 书签，临时数据库
+  python benchmarks/run.py --docs medium -o a.json
+  python benchmarks/run.py --db /tmp/bench.db --reuse   # 复用已生成的语料
+  python benchmarks/compare.py base.json head.json
+"""
+
+import argparse
+import contextlib
+import importlib.util
+import json
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import corpus
+from corpus import ROOT, SIZES, CATEGORIES, EN_WORDS, CJK_WORDS, db
+
+
+def load_exporter():
+    """scripts/x-bookmarks-export.py 文件名含连字符，只能按路径加载"""
+    path = ROOT / "scripts" / "x-bookmarks-export.py"
+    spec = importlib.util.spec_from_file_location("x_bookmarks_export", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.BookmarkExporter
+
+
+def summarize(samples: list) -> dict:
+    """把一组耗时（秒）汇总为毫秒分位数"""
+    ms = sorted(s * 1000 for s in samples)
+    if len(ms) > 1:
+        cuts = statistics.quantiles(ms, n=100, method='inclusive')
+        p50, p95, p99 = cuts[49], cuts[94], cuts[98]
+    else:
+        p50 = p95 = p99 = ms[0]
+    return {
+        'n': len(ms),
+        'p50': round(p50, 4),
+        'p95': round(p95, 4),
+        'p99': round(p99, 4),
+        'mean': round(statistics.fmean(ms), 4),
+        'min': round(ms[0], 4),
+        'max': round(ms[-1], 4),
+    }
+
+
+def measure(func, args_list: list, warmup: int = 3) -> dict:
+    """依次以 args_list 中的参数调用 func 并计时"""
+    for args in args_list[:warmup]:
+        func(**args)
+    samples = []
+    for args in args_list:
+        start = time.perf_counter()
+        func(**args)
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(db_path: str, iterations: int, seed: int, has_bookmarks: bool,
+                   only: set = None) -> dict:
+    """对已生成语料的数据库运行全部基准，返回 {名称: 分位数统计}"""
+    rng = random.Random(seed)
+    db.set_database_path(db_path)
+    with db.get_read_connection() as conn:
+        max_id = conn.execute("SELECT MAX(id) FROM documents").fetchone()[0] or 1
+        tags = [r[0] for r in conn.execute(
+            "SELECT t.name FROM tags t JOIN tag_counts c ON c.tag_id = t.id ORDER BY c.count DESC"
+        )]
+
+    words = EN_WORDS + [w for w in CJK_WORDS if len(w) >= db.FTS_MIN_CHARS]
+    short_words = [w for w in CJK_WORDS if len(w) < db.FTS_MIN_CHARS]
+    hot_tags, cold_tags = tags[:10] or [None], tags[-50:] or [None]
+
+    def pick(n, make):
+        return [make() for _ in range(n)]
+
+    cases = {
+        'get_document': (db.get_document, pick(iterations, lambda: {'doc_id': rng.randint(1, max_id)})),
+        'search.recent': (db.search_documents, pick(iterations, lambda: {'limit': 20})),
+        'search.keyword_fts': (db.search_documents, pick(iterations, lambda: {'keyword': rng.choice(words)})),
+        'search.keyword_like': (db.search_documents, pick(iterations, lambda: {'keyword': rng.choice(short_words)})),
+        'search.category': (db.search_documents, pick(iterations, lambda: {'category': rng.choice(CATEGORIES)})),
+        'search.tag_hot': (db.search_documents, pick(iterations, lambda: {'tag': rng.choice(hot_tags)})),
+        'search.tag_cold': (db.search_documents, pick(iterations, lambda: {'tag': rng.choice(cold_tags)})),
+        'recent.fields_list': (db.get_recent_documents, pick(
+            iterations, lambda: {'limit': 20, 'fields': ['title', 'category']})),
+        'search.deep_offset': (db.search_documents, pick(iterations, lambda: {'offset': rng.randint(1000, 5000)})),
+        'get_categories': (db.get_categories, pick(iterations, dict)),
+        'get_all_tags': (db.get_all_tags, pick(iterations, dict)),
+        'get_documents_count': (db.get_documents_count, pick(iterations, dict)),
+    }
+
+    if has_bookmarks:
+        exporter = load_exporter()(db_path)
+        with db.get_read_connection() as conn:
+            users = [r[0] for r in conn.execute(
+                """SELECT user_screen_name FROM x_bookmarks
+                   GROUP BY user_screen_name ORDER BY COUNT(*) DESC LIMIT 20"""
+            )]
+        for fmt in ('markdown', 'compact', 'json', 'summary'):
+            cases[f'export.{fmt}'] = (exporter.export, pick(
+                max(iterations // 4, 5), lambda: {'format': fmt, 'limit': 200}))
+        cases['export.user'] = (exporter.export, pick(
+            iterations, lambda: {'format': 'summary', 'limit': 100, 'user': rng.choice(users)}))
+        cases['export.date_range'] = (exporter.export, pick(
+            iterations, lambda: {'format': 'summary', 'limit': 100,
+                                 'since': '2024-06-01', 'until': '2024-06-30'}))
+        cases['export.search'] = (exporter.export, pick(
+            iterations, lambda: {'format': 'summary', 'limit': 100, 'search': rng.choice(words)}))
+
+    # 写入放在最后，避免影响读取基准的数据分布
+    docs = corpus.generate_documents(iterations, seed + 1000)
+    cases['add_document'] = (db.add_document, [
+        {k: v for k, v in doc.items() if k not in ('created_at', 'slug')} for doc in docs
+    ])
+
+    results = {}
+    for name, (func, args_list) in cases.items():
+        if only and not any(name.startswith(prefix) for prefix in only):
+            continue
+        print(f"  {name} ...", file=sys.stderr)
+        results[name] = measure(func, args_list, warmup=0 if name == 'add_document' else 3)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='AgentNote 基准测试',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__
+    )
+    parser.add_argument('--docs', default='small',
+                        help=f"文档数量或预设 ({', '.join(f'{k}={v}' for k, v in SIZES.items())})")
+    parser.add_argument('--bookmarks', type=int, default=10_000, help='书签数量 (默认: 10000)')
+    parser.add_argument('--seed', type=int, default=42, help='随机种子 (默认: 42)')
+    parser.add_argument('-n', '--iterations', type=int, default=200, help='每项基准的调用次数')
+    parser.add_argument('--db', help='数据库路径 (默认: 临时目录，结束后删除)')
+    parser.add_argument('--reuse', action='store_true', help='--db 已存在时直接复用语料')
+    parser.add_argument('--cache', action='store_true', help='开启查询结果缓存 (默认关闭以测量真实查询)')
+    parser.add_argument('--only', action='append', help='只运行名称以此开头的基准，可重复')
+    parser.add_argument('-o', '--output', help='结果 JSON 路径 (默认: stdout)')
+    args = parser.parse_args()
+
+    count = SIZES.get(args.docs) or int(args.docs)
+    db.QUERY_CACHE_ENABLED = args.cache
+
+    tmp_dir = None
+    if args.db:
+        db_path = Path(args.db).resolve()
+    else:
+        tmp_dir = tempfile.mkdtemp(prefix='agentnote-bench-')
+        db_path = Path(tmp_dir) / 'bench.db'
+
+    try:
+        build_time = None
+        if not (args.reuse and db_path.exists()):
+            print(f"生成语料: {count} 篇文档, {args.bookmarks} 条书签 -> {db_path}", file=sys.stderr)
+            start = time.perf_counter()
+            # init_database 的提示输出到 stderr，保持 stdout 只有 JSON
+            with contextlib.redirect_stdout(sys.stderr):
+                corpus.build_corpus(db_path, count, args.bookmarks, args.seed)
+            build_time = round(time.perf_counter() - start, 3)
+
+        db.set_database_path(db_path)
+        with db.get_read_connection() as conn:
+            doc_count = conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+            has_bookmarks = bool(conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'x_bookmarks'"
+            ).fetchone()) and bool(conn.execute("SELECT 1 FROM x_bookmarks LIMIT 1").fetchone())
+
+        print("运行基准:", file=sys.stderr)
+        results = run_benchmarks(str(db_path), args.iterations, args.seed, has_bookmarks,
+                                 set(args.only) if args.only else None)
+
+        report = {
+            'meta': {
+                'commit': git_commit(),
+                'timestamp': datetime.now().isoformat(timespec='seconds'),
+                'python': platform.python_version(),
+                'sqlite': sqlite3.sqlite_version,
+                'platform': platform.platform(),
+                'documents': doc_count,
+                'bookmarks': args.bookmarks if has_bookmarks else 0,
+                'seed': args.seed,
+                'iterations': args.iterations,
+                'query_cache': args.cache,
+                'build_seconds': build_time,
+                'unit': 'ms',
+            },
+            'results': results,
+        }
+        text = json.dumps(report, ensure_ascii=False, indent=2)
+        if args.output:
+            Path(args.output).write_text(text + "\n", encoding='utf-8')
+            print(f"已写入 {args.output}", file=sys.stderr)
+        else:
+            print(text)
+    finally:
+        db.close_connections()
+        if tmp_dir:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -10,6 +10,9 @@ CREATE TABLE IF NOT EXISTS documents (
     category TEXT,
     summary TEXT,                        -- 摘要
     source TEXT DEFAULT 'chat',          -- 来源: chat, web, import
+    content_hash TEXT,                   -- content 的 sha256，用于跳过无变化写入与查重
+    content_format TEXT NOT NULL DEFAULT 'plain', -- content 存储格式: plain, zlib, zstd
+    content_dict_id INTEGER,             -- 压缩字典 (compression_dicts.id)
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
     updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
 );
@@ -42,7 +45,153 @@ CREATE TABLE IF NOT EXISTS relations (
 );
 
 -- 索引
-CREATE INDEX IF NOT EXISTS idx_documents_category ON documents (category);
-CREATE INDEX IF NOT EXISTS idx_documents_created ON documents (created_at);
+-- (category, created_at, id) 支撑按分类筛选后按时间倒序翻页，无需临时排序
+DROP INDEX IF EXISTS idx_documents_category;
+CREATE INDEX IF NOT EXISTS idx_documents_category_created ON documents (category, created_at, id);
+-- (created_at, id) 复合索引支撑按时间倒序的键集翻页
+DROP INDEX IF EXISTS idx_documents_created;
+CREATE INDEX IF NOT EXISTS idx_documents_created_id ON documents (created_at, id);
 CREATE INDEX IF NOT EXISTS idx_documents_slug ON documents (slug);
+CREATE INDEX IF NOT EXISTS idx_documents_content_hash ON documents (content_hash);
 CREATE INDEX IF NOT EXISTS idx_tags_name ON tags (name);
+-- 按标签筛选文档（主键以 document_id 开头，用不上）
+CREATE INDEX IF NOT EXISTS idx_document_tags_tag ON document_tags (tag_id, document_id);
+
+-- 压缩字典（在已有正文上训练，只增不改，旧行始终能用原字典解压）
+CREATE TABLE IF NOT EXISTS compression_dicts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    algorithm TEXT NOT NULL,             -- zlib, zstd
+    dict BLOB,                           -- 预设字典（可为空）
+    min_size INTEGER NOT NULL,           -- 超过该字节数的正文才压缩
+    active INTEGER NOT NULL DEFAULT 0,   -- 新写入使用的字典（最多一行为 1）
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+-- 全文索引 (FTS5, trigram 分词以支持中文子串检索; 需要 SQLite 3.34+)
+CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(
+    title,
+    content,
+    summary,
+    content='documents',
+    content_rowid='id',
+    tokenize='trigram'
+);
+
+-- 保持全文索引与 documents 同步。触发器只处理明文行，任何连接都能写库；
+-- 压缩行的索引条目由 utils/db.py 用解压后的正文维护（见 reindex_document）
+CREATE TRIGGER IF NOT EXISTS documents_fts_ai AFTER INSERT ON documents
+WHEN new.content_format = 'plain' BEGIN
+    INSERT INTO documents_fts (rowid, title, content, summary)
+    VALUES (new.id, new.title, new.content, new.summary);
+END;
+
+CREATE TRIGGER IF NOT EXISTS documents_fts_ad AFTER DELETE ON documents
+WHEN old.content_format = 'plain' BEGIN
+    INSERT INTO documents_fts (documents_fts, rowid, title, content, summary)
+    VALUES ('delete', old.id, old.title, old.content, old.summary);
+END;
+
+-- 压缩/解压只改变存储格式，索引中的明文不变
+CREATE TRIGGER IF NOT EXISTS documents_fts_au AFTER UPDATE OF title, content, summary ON documents
+WHEN old.content_format = 'plain' AND new.content_format = 'plain' BEGIN
+    INSERT INTO documents_fts (documents_fts, rowid, title, content, summary)
+    VALUES ('delete', old.id, old.title, old.content, old.summary);
+    INSERT INTO documents_fts (rowid, title, content, summary)
+    VALUES (new.id, new.title, new.content, new.summary);
+END;
+
+-- 分类与标签计数（由触发器增量维护，避免每次读取都做 GROUP BY）
+CREATE TABLE IF NOT EXISTS category_counts (
+    category TEXT PRIMARY KEY,
+    count INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS tag_counts (
+    tag_id INTEGER PRIMARY KEY,
+    count INTEGER NOT NULL DEFAULT 0,
+    FOREIGN KEY (tag_id) REFERENCES tags (id) ON DELETE CASCADE
+);
+
+CREATE TRIGGER IF NOT EXISTS category_counts_ai AFTER INSERT ON documents
+WHEN new.category IS NOT NULL AND new.category != '' BEGIN
+    INSERT INTO category_counts (category, count) VALUES (new.category, 1)
+    ON CONFLICT (category) DO UPDATE SET count = count + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS category_counts_ad AFTER DELETE ON documents
+WHEN old.category IS NOT NULL AND old.category != '' BEGIN
+    UPDATE category_counts SET count = count - 1 WHERE category = old.category;
+    DELETE FROM category_counts WHERE category = old.category AND count <= 0;
+END;
+
+CREATE TRIGGER IF NOT EXISTS category_counts_au AFTER UPDATE OF category ON documents
+WHEN old.category IS NOT new.category BEGIN
+    UPDATE category_counts SET count = count - 1 WHERE category = old.category;
+    DELETE FROM category_counts WHERE category = old.category AND count <= 0;
+    INSERT INTO category_counts (category, count)
+    SELECT new.category, 1 WHERE new.category IS NOT NULL AND new.category != ''
+    ON CONFLICT (category) DO UPDATE SET count = count + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS tag_counts_ai AFTER INSERT ON document_tags BEGIN
+    INSERT INTO tag_counts (tag_id, count) VALUES (new.tag_id, 1)
+    ON CONFLICT (tag_id) DO UPDATE SET count = count + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS tag_counts_ad AFTER DELETE ON document_tags BEGIN
+    UPDATE tag_counts SET count = count - 1 WHERE tag_id = old.tag_id;
+END;
+
+-- 全库写入代数：任何文档/标签变更都会递增，用作列表接口的 ETag
+CREATE TABLE IF NOT EXISTS db_generation (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    generation INTEGER NOT NULL DEFAULT 0,
+    changed_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT OR IGNORE INTO db_generation (id) VALUES (1);
+
+CREATE TRIGGER IF NOT EXISTS db_generation_documents_ai AFTER INSERT ON documents BEGIN
+    UPDATE db_generation SET generation = generation + 1, changed_at = CURRENT_TIMESTAMP WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS db_generation_documents_au AFTER UPDATE ON documents BEGIN
+    UPDATE db_generation SET generation = generation + 1, changed_at = CURRENT_TIMESTAMP WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS db_generation_documents_ad AFTER DELETE ON documents BEGIN
+    UPDATE db_generation SET generation = generation + 1, changed_at = CURRENT_TIMESTAMP WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS db_generation_document_tags_ai AFTER INSERT ON document_tags BEGIN
+    UPDATE db_generation SET generation = generation + 1, changed_at = CURRENT_TIMESTAMP WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS db_generation_document_tags_ad AFTER DELETE ON document_tags BEGIN
+    UPDATE db_generation SET generation = generation + 1, changed_at = CURRENT_TIMESTAMP WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS db_generation_tags_ai AFTER INSERT ON tags BEGIN
+    UPDATE db_generation SET generation = generation + 1, changed_at = CURRENT_TIMESTAMP WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS db_generation_tags_ad AFTER DELETE ON tags BEGIN
+    UPDATE db_generation SET generation = generation + 1, changed_at = CURRENT_TIMESTAMP WHERE id = 1;
+END;
+
+-- 预渲染的 HTML 与标题大纲（renderer_version 落后于代码时在读取时重新渲染）
+CREATE TABLE IF NOT EXISTS document_renders (
+    document_id INTEGER PRIMARY KEY,
+    renderer_version INTEGER NOT NULL,
+    content_html TEXT NOT NULL,
+    outline TEXT,                         -- JSON: [{level, title, id}]
+    rendered_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (document_id) REFERENCES documents (id) ON DELETE CASCADE
+);
+
+-- 标题或正文被任何写入者修改后丢弃旧的渲染结果
+-- （压缩/解压只改变存储格式时保留；db.py 改写正文时会同时重新渲染）
+CREATE TRIGGER IF NOT EXISTS document_renders_au AFTER UPDATE OF title, content ON documents
+WHEN old.title IS NOT new.title OR old.content_format = new.content_format BEGIN
+    DELETE FROM document_renders WHERE document_id = new.id;
+END;
@@ -7,11 +7,13 @@ Save Document to Knowledge Base
 import argparse
 import os
 import re
-import sqlite3
 import sys
 from datetime import datetime
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).parent.parent / "utils"))
+import db
+
 
 def slugify(text: str) -> str:
     """生成 URL 友好的 slug"""
@@ -33,70 +35,93 @@ def save_document(
     summary: str = None,
     source: str = 'chat',
     tags: list = None,
-    slug: str = None
+    slug: str = None,
+    allow_duplicates: bool = False
 ) -> dict:
     """
     保存文档到知识库
 
+    slug 已存在时只写入有变化的字段，完全相同则返回 action='unchanged' 且不写库；
+    新文档的正文与已有文档完全相同时返回 action='duplicate'（除非 allow_duplicates）。
+
     Returns:
         包含保存结果的字典
     """
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
+    # db 的连接工厂注册了 agentnote_text()，维护压缩行的全文索引时用它解压正文
+    conn = db.open_connection(db_path)
 
     try:
         # 生成 slug
         if not slug:
             slug = slugify(title)
 
+        digest = db.content_hash(content)
+
         # 检查 slug 是否已存在
-        cursor = conn.execute("SELECT id FROM documents WHERE slug = ?", (slug,))
-        existing = cursor.fetchone()
+        existing = conn.execute(
+            """SELECT id, title, category, summary, source, content_hash, content_format
+               FROM documents WHERE slug = ?""",
+            (slug,)
+        ).fetchone()
 
+        changed = {}
         if existing:
-            # 更新现有文档
-            conn.execute("""
-                UPDATE documents
-                SET title = ?, content = ?, category = ?, summary = ?,
-                    source = ?, updated_at = CURRENT_TIMESTAMP
-                WHERE slug = ?
-            """, (title, content, category, summary, source, slug))
             doc_id = existing['id']
-            action = 'updated'
+            fields = {'title': title, 'category': category, 'summary': summary, 'source': source}
+            changed = {k: v for k, v in fields.items() if v != existing[k]}
+            if digest != existing['content_hash']:
+                stored, content_format, dict_id = db.encode_content(conn, content)
+                changed.update(content=stored, content_format=content_format,
+                               content_dict_id=dict_id, content_hash=digest)
+
+            # 处理标签（只增删有变化的关联）
+            tags_changed = bool(tags) and db.sync_document_tags(conn, doc_id, tags)
+
+            if changed or tags_changed:
+                # 更新现有文档，只写入有变化的列
+                packed = any(f != 'plain' for f in (
+                    existing['content_format'], changed.get('content_format', existing['content_format'])))
+                before = db.index_entry(conn, doc_id) if packed else None
+                set_clause = "".join(f"{k} = ?, " for k in changed)
+                conn.execute(f"""
+                    UPDATE documents
+                    SET {set_clause}updated_at = strftime('%Y-%m-%d %H:%M:%f', 'now')
+                    WHERE id = ?
+                """, list(changed.values()) + [doc_id])
+                if packed:
+                    db.reindex_document(conn, doc_id, before)
+                action = 'updated'
+            else:
+                action = 'unchanged'
         else:
-            # 插入新文档
+            duplicate = None if allow_duplicates else db.find_duplicate(digest=digest, conn=conn)
+            if duplicate:
+                return {
+                    'success': True,
+                    'action': 'duplicate',
+                    'doc_id': duplicate['id'],
+                    'slug': duplicate['slug'],
+                    'title': duplicate['title']
+                }
+
+            # 插入新文档（开启压缩时大正文压缩存储）
+            stored, content_format, dict_id = db.encode_content(conn, content)
             cursor = conn.execute("""
-                INSERT INTO documents (slug, title, content, category, summary, source)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, (slug, title, content, category, summary, source))
+                INSERT INTO documents (slug, title, content, category, summary, source,
+                                       content_hash, content_format, content_dict_id)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (slug, title, stored, category, summary, source, digest, content_format, dict_id))
             doc_id = cursor.lastrowid
             action = 'created'
+            if content_format != 'plain':
+                db.reindex_document(conn, doc_id)
 
-        # 处理标签
-        if tags:
-            # 删除现有标签关联
-            conn.execute("DELETE FROM document_tags WHERE document_id = ?", (doc_id,))
+            if tags:
+                db.sync_document_tags(conn, doc_id, tags)
 
-            for tag_name in tags:
-                tag_name = tag_name.strip().lower()
-                if not tag_name:
-                    continue
-
-                # 获取或创建标签
-                cursor = conn.execute("SELECT id FROM tags WHERE name = ?", (tag_name,))
-                tag_row = cursor.fetchone()
-
-                if tag_row:
-                    tag_id = tag_row['id']
-                else:
-                    cursor = conn.execute("INSERT INTO tags (name) VALUES (?)", (tag_name,))
-                    tag_id = cursor.lastrowid
-
-                # 创建关联
-                conn.execute(
-                    "INSERT OR IGNORE INTO document_tags (document_id, tag_id) VALUES (?, ?)",
-                    (doc_id, tag_id)
-                )
+        # 预渲染 HTML 缓存
+        if action == 'created' or 'title' in changed or 'content' in changed:
+            db.store_render(conn, doc_id, title, content)
 
         conn.commit()
 
@@ -118,6 +143,29 @@ def save_document(
         conn.close()
 
 
+def save_jsonl(db_path: str, stream, allow_duplicates: bool = False) -> bool:
+    """
+    从 JSONL 流批量保存文档（每行一个 JSON 文档）
+
+    Returns:
+        全部成功时返回 True
+    """
+    db.set_database_path(db_path)
+    saved = failed = 0
+    for result in db.import_jsonl(stream, skip_duplicates=not allow_duplicates):
+        if result.get('duplicate'):
+            saved += 1
+            print(f"= [{result['line']}] 与已有文档正文相同，跳过: {result['title']} (ID: {result['id']})")
+        elif result['success']:
+            saved += 1
+            print(f"✓ [{result['line']}] {result['title']} (ID: {result['id']}, Slug: {result['slug']})")
+        else:
+            failed += 1
+            print(f"✗ [{result['line']}] 保存失败: {result['error']}")
+    print(f"完成: {saved} 条成功, {failed} 条失败")
+    return failed == 0
+
+
 def main():
     parser = argparse.ArgumentParser(
         description='保存文档到知识库',
@@ -127,10 +175,11 @@ def main():
   %(prog)s --title "AI 总结" --content "内容..." --category twitter
   %(prog)s --title "笔记" --content-file notes.md --tags "ai,学习"
   echo "内容" | %(prog)s --title "标题" --stdin
+  %(prog)s --jsonl < notes.jsonl     # 批量导入，每行一个 JSON 文档
         """
     )
 
-    parser.add_argument('--title', '-t', required=True, help='文档标题')
+    parser.add_argument('--title', '-t', help='文档标题')
     parser.add_argument('--content', '-c', help='文档内容 (Markdown)')
     parser.add_argument('--content-file', '-f', help='从文件读取内容')
     parser.add_argument('--stdin', action='store_true', help='从 stdin 读取内容')
@@ -139,10 +188,17 @@ def main():
     parser.add_argument('--source', default='chat', help='来源 (默认: chat)')
     parser.add_argument('--tags', help='标签，逗号分隔')
     parser.add_argument('--slug', help='自定义 slug')
+    parser.add_argument('--jsonl', action='store_true',
+                        help='从 stdin 批量读取 JSONL 文档 (字段: title, content, category, tags, summary, source, slug)')
+    parser.add_argument('--allow-duplicates', action='store_true',
+                        help='正文与已有文档完全相同时仍然保存为新文档')
     parser.add_argument('--db', help='数据库路径')
 
     args = parser.parse_args()
 
+    if not args.jsonl and not args.title:
+        parser.error('--title 为必填项 (批量模式 --jsonl 除外)')
+
     # 确定内容来源
     content = None
     if args.stdin:
@@ -152,7 +208,7 @@ def main():
             content = f.read()
     elif args.content:
         content = args.content
-    else:
+    elif not args.jsonl:
         print("错误: 必须提供内容 (--content, --content-file 或 --stdin)")
         sys.exit(1)
 
@@ -167,6 +223,11 @@ def main():
         print(f"错误: 数据库不存在: {db_path}")
         sys.exit(1)
 
+    if args.jsonl:
+        if not save_jsonl(db_path, sys.stdin, args.allow_duplicates):
+            sys.exit(1)
+        return
+
     # 解析标签
     tags = None
     if args.tags:
@@ -181,10 +242,18 @@ def main():
         summary=args.summary,
         source=args.source,
         tags=tags,
-        slug=args.slug
+        slug=args.slug,
+        allow_duplicates=args.allow_duplicates
     )
 
-    if result['success']:
+    if result['success'] and result['action'] == 'unchanged':
+        print(f"= 文档无变化，未写入: {result['title']}")
+        print(f"  ID: {result['doc_id']}")
+    elif result['success'] and result['action'] == 'duplicate':
+        print(f"= 已存在正文相同的文档，未写入 (使用 --allow-duplicates 强制保存): {result['title']}")
+        print(f"  ID: {result['doc_id']}")
+        print(f"  Slug: {result['slug']}")
+    elif result['success']:
         print(f"✓ 文档已{result['action']}: {result['title']}")
         print(f"  ID: {result['doc_id']}")
         print(f"  Slug: {result['slug']}")
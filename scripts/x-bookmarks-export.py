@@ -7,36 +7,304 @@ X Bookmarks Export Tool
 """
 
 import argparse
+import io
+import itertools
 import json
+import math
 import os
+import re
 import sqlite3
 import sys
-from datetime import datetime
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import date, datetime, timedelta
 from pathlib import Path
-from typing import Optional
+from typing import Iterable, Iterator, Optional, TextIO
+
+sys.path.insert(0, str(Path(__file__).parent))
+import x_bookmarks_db
+
+ASCII_CHARS_PER_TOKEN = 4       # estimate_tokens: 英文与链接约 4 个字符 1 个 token
+MIN_CHUNK_TOKENS = 100          # 分块预算下限，至少容纳块头与一条截断后的书签
+
+
+def parse_date(value: str) -> date:
+    """解析 YYYY-MM-DD 日期"""
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise ValueError(f"日期格式应为 YYYY-MM-DD: {value}") from None
 
 
 class BookmarkExporter:
     """书签导出器"""
 
+    # 每行一个 "display_url<TAB>url"，按推文中的顺序
+    EXTERNAL_LINKS_COLUMN = """,
+                (SELECT group_concat(coalesce(display_url, url) || char(9) || url, char(10))
+                 FROM (SELECT display_url, url FROM x_bookmark_urls u
+                       WHERE u.bookmark_id = b.id AND u.is_external
+                       ORDER BY u.position)) AS external_links"""
+
+    COLUMNS = """tweet_id, tweet_url, full_text, lang,
+                created_at, user_name, user_screen_name,
+                bookmark_count, favorite_count, retweet_count,
+                reply_count, quote_count, view_count,
+                urls, media, hashtags"""
+
+    # 分区键（作用于 build_query 的结果列）
+    PARTITION_COLUMNS = {'month': "substr(created_at, 1, 7)", 'user': "user_screen_name"}
+
+    # 多格式 / 分区导出的文件后缀
+    FORMAT_SUFFIXES = {'markdown': '.md', 'compact': '.compact.md', 'json': '.json', 'summary': '.summary.md'}
+
+    # 分块总结每块的开头与截断标记
+    SUMMARY_CHUNK_HEADER = "以下是需要总结的推文列表（第 {chunk} 部分）：\n"
+    TRUNCATED_MARK = "…（已截断）"
+
+    # 分区达到这么多条才交给进程池格式化，小分区直接在主进程边读边写
+    PARALLEL_MIN_ROWS = 2000
+
     def __init__(self, db_path: str):
         self.db_path = db_path
+        self._schema_checked = False
 
-    def _get_connection(self) -> sqlite3.Connection:
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
+    def _get_connection(self, write: bool = False) -> sqlite3.Connection:
+        """打开数据库；导出只读，只有水位线需要写连接。不做建表或迁移"""
+        conn = x_bookmarks_db.connect(self.db_path, readonly=not write)
+        if not self._schema_checked:
+            try:
+                self.check_schema(conn)
+            except RuntimeError:
+                conn.close()
+                raise
+            self._schema_checked = True
         return conn
 
-    def query_bookmarks(
+    @staticmethod
+    def check_schema(conn: sqlite3.Connection):
+        """书签表结构不是最新时抛出 RuntimeError，提示先导入或初始化"""
+        missing = x_bookmarks_db.missing_schema(conn)
+        if missing:
+            raise RuntimeError(
+                f"书签表结构不是最新 (缺少 {', '.join(missing)})，请先运行 "
+                "python scripts/x-bookmarks-import.py 导入，或 python scripts/x_bookmarks_db.py init"
+            )
+
+    def _build_filters(
+        self,
+        since: str = None,
+        until: str = None,
+        user: str = None,
+        lang: str = None,
+        search: str = None,
+        domain: str = None,
+        hashtag: str = None,
+        after: tuple = None,
+        ranked: bool = False,
+        date_scan_limit: int = None,
+        conn: sqlite3.Connection = None
+    ) -> tuple:
+        """
+        筛选条件 -> (FROM 子句, WHERE 子句, 参数, 是否按相关度排序)
+
+        search 走 x_bookmarks_fts 全文索引（语法见 x_bookmarks_db.parse_search），
+        短于 FTS_MIN_CHARS 的词退回 LIKE。ranked 且用到了全文索引时
+        JOIN 出 bm25 分数 f.rank 供排序。
+
+        按时间取前 date_scan_limit 条时（需传入 conn），命中很多的常见词改为
+        沿时间索引扫描、用命中列表过滤，找够条数即停，而不是取出全部命中再排序。
+
+        after 为增量导出的水位线 (bookmarked_at, id)，只保留其后的书签。
+        """
+        conditions = []
+        params = []
+        match = None
+
+        # 直接比较列值（不包 date()），才能用上 created_at 相关索引
+        if since:
+            conditions.append("b.created_at >= ?")
+            params.append(parse_date(since).isoformat())
+        if until:
+            conditions.append("b.created_at < ?")
+            params.append((parse_date(until) + timedelta(days=1)).isoformat())
+        if user:
+            conditions.append("b.user_screen_name = ?")
+            params.append(user)
+        if lang:
+            conditions.append("b.lang = ?")
+            params.append(lang)
+        if search:
+            match, search_conditions, search_params = self._search_filters(search)
+            conditions.extend(search_conditions)
+            params.extend(search_params)
+        if domain:
+            conditions.append("b.id IN (SELECT bookmark_id FROM x_bookmark_urls WHERE domain = ?)")
+            params.append(x_bookmarks_db.normalize_domain(domain))
+        if hashtag:
+            conditions.append("b.id IN (SELECT bookmark_id FROM x_bookmark_hashtags WHERE tag = ?)")
+            params.append(hashtag.lstrip('#'))
+        if after and after[0] is not None:
+            # 行值比较可沿 idx_x_bookmarks_bookmarked 做范围扫描
+            conditions.append("(b.bookmarked_at, b.id) > (?, ?)")
+            params.extend(after)
+        elif after and after[1]:
+            # 水位线停在没有收藏时间的书签上（NULL 排在最前）
+            conditions.append("(b.bookmarked_at IS NOT NULL OR b.id > ?)")
+            params.append(after[1])
+
+        from_clause = "x_bookmarks b"
+        ranked = ranked and match is not None
+        if ranked:
+            from_clause += f"""
+                JOIN (SELECT rowid AS fts_id, bm25(x_bookmarks_fts, {x_bookmarks_db.FTS_WEIGHTS}) AS rank
+                      FROM x_bookmarks_fts WHERE x_bookmarks_fts MATCH ?) f ON f.fts_id = b.id"""
+            params.insert(0, match)
+        elif match is not None:
+            # 一元 + 让规划器不用命中列表驱动查询
+            scan = "+" if date_scan_limit and self._many_hits(conn, match, date_scan_limit) else ""
+            conditions.append(f"{scan}b.id IN (SELECT rowid FROM x_bookmarks_fts WHERE x_bookmarks_fts MATCH ?)")
+            params.append(match)
+
+        where_clause = " AND ".join(conditions) if conditions else "1=1"
+        return from_clause, where_clause, params, ranked
+
+    @staticmethod
+    def _many_hits(conn: sqlite3.Connection, match: str, limit: int) -> bool:
+        """
+        命中数是否多到沿时间索引扫描更快
+
+        排序全部命中的代价约与命中数 h 成正比，沿索引扫描约为 limit * 总数 / h，
+        两者在 h ≈ sqrt(limit * 总数 / 10) 附近持平（按实测的单行代价估算）。
+        """
+        total = conn.execute("SELECT MAX(id) FROM x_bookmarks").fetchone()[0] or 0
+        threshold = max(int(math.sqrt(limit * total / 10)), limit)
+        hits = conn.execute(
+            "SELECT COUNT(*) FROM (SELECT 1 FROM x_bookmarks_fts WHERE x_bookmarks_fts MATCH ? LIMIT ?)",
+            (match, threshold)
+        ).fetchone()[0]
+        return hits >= threshold
+
+    @staticmethod
+    def _search_filters(search: str) -> tuple:
+        """搜索语法 -> (FTS MATCH 表达式或 None, 附加条件, 参数)"""
+        phrases = []
+        conditions = []
+        params = []
+        columns = ("b.full_text", "b.user_name", "b.user_screen_name")
+
+        for kind, term in x_bookmarks_db.parse_search(search):
+            if len(term) >= x_bookmarks_db.FTS_MIN_CHARS:
+                phrases.append(x_bookmarks_db.fts_phrase(term))
+            else:
+                # trigram 无法索引过短的词
+                escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+                conditions.append("(" + " OR ".join(f"{c} LIKE ? ESCAPE '\\'" for c in columns) + ")")
+                params.extend([f"%{escaped}%"] * len(columns))
+            if kind == 'prefix':
+                # 全文索引只能做子串匹配，前缀要求词前是非单词字符
+                pattern = f"*[^a-z0-9_]{x_bookmarks_db.glob_escape(term.lower())}*"
+                conditions.append("(" + " OR ".join(
+                    f"lower(' ' || coalesce({c}, '')) GLOB ?" for c in columns) + ")")
+                params.extend([pattern] * len(columns))
+
+        match = " AND ".join(phrases) if phrases else None
+        return match, conditions, params
+
+    def build_count_query(self, limit: int = None, order: str = 'desc', **filters) -> tuple:
+        """count_bookmarks 执行的 SQL 与参数"""
+        from_clause, where_clause, params, _ = self._build_filters(**filters)
+        query = f"SELECT 1 FROM {from_clause} WHERE {where_clause}"
+        if limit:
+            query += " LIMIT ?"
+            params.append(limit)
+        return f"SELECT COUNT(*) FROM ({query})", params
+
+    def count_bookmarks(self, **query_args) -> int:
+        """符合条件的书签数量（不超过 limit），用于输出头部的总数"""
+        query, params = self.build_count_query(**query_args)
+        conn = self._get_connection()
+        try:
+            return conn.execute(query, params).fetchone()[0]
+        finally:
+            conn.close()
+
+    def build_query(
         self,
+        conn: sqlite3.Connection,
         limit: int = None,
         since: str = None,
         until: str = None,
         user: str = None,
         lang: str = None,
         search: str = None,
-        order: str = 'desc'
-    ) -> list:
+        domain: str = None,
+        hashtag: str = None,
+        order: str = 'desc',
+        with_links: bool = False,
+        partition=None,
+        after: tuple = None
+    ) -> tuple:
+        """
+        iter_bookmarks 执行的 SQL 与参数
+
+        conn 用于估算搜索命中数以选择查询方式（见 _build_filters）。
+        partition 为 'user'（或按相关度排序时为 'month'）时，在同一结果集外层
+        先按分区键排序，使每个分区的书签相邻，分区内保持原有顺序。
+        after 不为 None 时为增量导出：取水位线之后的书签，按收藏顺序升序，
+        并附带 _bookmarked_at / _id 列用于推进水位线（见 export_incremental）。
+        """
+        from_clause, where_clause, params, ranked = self._build_filters(
+            since, until, user, lang, search, domain, hashtag, after,
+            ranked=order == 'relevance' and after is None, date_scan_limit=limit, conn=conn)
+        if after is not None:
+            order_clause = "b.bookmarked_at, b.id"
+        elif ranked:
+            order_clause = "f.rank, b.id"
+        else:
+            # 没有可用的全文检索时，relevance 退回最新优先
+            order_clause = f"b.created_at {'ASC' if order == 'asc' else 'DESC'}"
+        limit_clause = ""
+        if limit:
+            limit_clause = "LIMIT ?"
+            params.append(limit)
+
+        columns = self.COLUMNS + (self.EXTERNAL_LINKS_COLUMN if with_links else "")
+        if after is not None:
+            columns += ", b.bookmarked_at AS _bookmarked_at, b.id AS _id"
+        regroup = partition == 'user' or (partition == 'month' and ranked)
+        query = f"""
+            SELECT
+                {columns}{", f.rank AS rank, b.id AS id" if regroup and ranked else ""}
+            FROM {from_clause}
+            WHERE {where_clause}
+            ORDER BY {order_clause}
+            {limit_clause}
+        """
+        if regroup:
+            names = self.COLUMNS + (", external_links" if with_links else "")
+            inner_order = "rank, id" if ranked else f"created_at {'ASC' if order == 'asc' else 'DESC'}"
+            query = f"""
+            SELECT {names} FROM ({query})
+            ORDER BY {self.PARTITION_COLUMNS[partition]}, {inner_order}
+            """
+        return query, params
+
+    def iter_bookmarks(self, **query_args) -> Iterator[dict]:
+        """
+        逐条产出书签（直接迭代游标，内存占用与结果数量无关）
+
+        参数同 query_bookmarks；with_links=True 时附带 external_links 列
+        （从 x_bookmark_urls 汇总的外部链接）。生成器结束或被关闭时释放连接。
+        """
+        conn = self._get_connection()
+        try:
+            query, params = self.build_query(conn, **query_args)
+            for row in conn.execute(query, params):
+                yield dict(row)
+        finally:
+            conn.close()
+
+    def query_bookmarks(self, **query_args) -> list:
         """
         查询书签
 
@@ -46,64 +314,52 @@ class BookmarkExporter:
             until: 结束日期 (YYYY-MM-DD)
             user: 筛选用户 (screen_name)
             lang: 筛选语言
-            search: 全文搜索
-            order: 排序方式 (asc/desc)
+            search: 全文搜索（词语 AND 组合，支持 "短语" 与 前缀*）
+            domain: 筛选链接域名 (如 github.com)
+            hashtag: 筛选话题
+            order: 排序方式 (asc/desc/relevance)
         """
-        conn = self._get_connection()
-        try:
-            conditions = []
-            params = []
-
-            if since:
-                conditions.append("date(created_at) >= ?")
-                params.append(since)
-            if until:
-                conditions.append("date(created_at) <= ?")
-                params.append(until)
-            if user:
-                conditions.append("user_screen_name = ?")
-                params.append(user)
-            if lang:
-                conditions.append("lang = ?")
-                params.append(lang)
-            if search:
-                conditions.append("full_text LIKE ?")
-                params.append(f"%{search}%")
-
-            where_clause = " AND ".join(conditions) if conditions else "1=1"
-            order_dir = "DESC" if order == 'desc' else "ASC"
-            limit_clause = f"LIMIT {limit}" if limit else ""
+        return list(self.iter_bookmarks(**query_args))
 
-            query = f"""
-                SELECT
-                    tweet_id, tweet_url, full_text, lang,
-                    created_at, user_name, user_screen_name,
-                    bookmark_count, favorite_count, retweet_count,
-                    reply_count, quote_count, view_count,
-                    urls, media, hashtags
-                FROM x_bookmarks
-                WHERE {where_clause}
-                ORDER BY created_at {order_dir}
-                {limit_clause}
-            """
+    @staticmethod
+    def external_links(bm: dict) -> list:
+        """
+        书签中指向 X 以外的链接 [(display_url, url)]
 
-            cursor = conn.execute(query, params)
-            return [dict(row) for row in cursor.fetchall()]
-        finally:
-            conn.close()
+        优先使用 iter_bookmarks(with_links=True) 汇总好的 external_links 列，
+        调用方自行传入的行则退回解析 urls JSON。
+        """
+        if 'external_links' in bm:
+            if not bm['external_links']:
+                return []
+            return [tuple(line.split('\t', 1)) for line in bm['external_links'].split('\n')]
 
-    def format_markdown_list(self, bookmarks: list, include_stats: bool = False) -> str:
+        links = []
+        if bm.get('urls'):
+            try:
+                for url in json.loads(bm['urls']):
+                    expanded = url.get('expanded_url') if isinstance(url, dict) else None
+                    if expanded and x_bookmarks_db.is_external_url(expanded):
+                        links.append((url.get('display_url') or expanded, expanded))
+            except (json.JSONDecodeError, TypeError):
+                pass
+        return links
+
+    def iter_markdown_list(self, bookmarks: Iterable[dict], total: int = None,
+                           include_stats: bool = False) -> Iterator[str]:
         """
-        格式化为简洁的 Markdown 列表
+        格式化为简洁的 Markdown 列表（逐条产出文本块，以换行连接）
         适合后续 AI 总结
         """
-        lines = []
-        lines.append(f"# X Bookmarks Export")
-        lines.append(f"导出时间: {datetime.now().strftime('%Y-%m-%d %H:%M')}")
-        lines.append(f"总计: {len(bookmarks)} 条\n")
-        lines.append("---\n")
+        if total is None:
+            total = len(bookmarks)
+        yield f"# X Bookmarks Export"
+        yield f"导出时间: {datetime.now().strftime('%Y-%m-%d %H:%M')}"
+        yield f"总计: {total} 条\n"
+        yield "---\n"
 
         for i, bm in enumerate(bookmarks, 1):
+            lines = []
             # 基本信息
             user = f"@{bm['user_screen_name']}" if bm['user_screen_name'] else "Unknown"
             date = bm['created_at'][:10] if bm['created_at'] else "Unknown"
@@ -117,16 +373,8 @@ class BookmarkExporter:
                 lines.append(f"[原文链接]({bm['tweet_url']})")
 
             # URLs
-            if bm['urls']:
-                try:
-                    urls = json.loads(bm['urls'])
-                    if urls:
-                        for url in urls:
-                            expanded = url.get('expanded_url', '')
-                            if expanded and 'twitter.com' not in expanded and 'x.com' not in expanded:
-                                lines.append(f"- [{url.get('display_url', expanded)}]({expanded})")
-                except json.JSONDecodeError:
-                    pass
+            for display, url in self.external_links(bm):
+                lines.append(f"- [{display}]({url})")
 
             # 统计数据
             if include_stats:
@@ -143,16 +391,20 @@ class BookmarkExporter:
                     lines.append(f"\n{' | '.join(stats)}")
 
             lines.append("\n---\n")
+            yield "\n".join(lines)
 
-        return "\n".join(lines)
+    def format_markdown_list(self, bookmarks: list, include_stats: bool = False) -> str:
+        """格式化为简洁的 Markdown 列表"""
+        return "\n".join(self.iter_markdown_list(bookmarks, include_stats=include_stats))
 
-    def format_compact_list(self, bookmarks: list) -> str:
+    def iter_compact_list(self, bookmarks: Iterable[dict], total: int = None) -> Iterator[str]:
         """
-        格式化为紧凑列表
+        格式化为紧凑列表（逐条产出）
         每条一行，适合快速浏览
         """
-        lines = []
-        lines.append(f"# X Bookmarks ({len(bookmarks)} 条)\n")
+        if total is None:
+            total = len(bookmarks)
+        yield f"# X Bookmarks ({total} 条)\n"
 
         for i, bm in enumerate(bookmarks, 1):
             user = f"@{bm['user_screen_name']}" if bm['user_screen_name'] else ""
@@ -162,89 +414,529 @@ class BookmarkExporter:
                 text += "..."
             url = bm['tweet_url'] or ""
 
-            lines.append(f"{i}. [{user}]({url}) {date}")
-            lines.append(f"   {text}\n")
+            yield f"{i}. [{user}]({url}) {date}\n   {text}\n"
 
-        return "\n".join(lines)
+    def format_compact_list(self, bookmarks: list) -> str:
+        """格式化为紧凑列表"""
+        return "\n".join(self.iter_compact_list(bookmarks))
+
+    def iter_json(self, bookmarks: Iterable[dict]) -> Iterator[str]:
+        """
+        逐条产出 JSON 数组的各行，以换行连接后与 json.dumps(list, indent=2) 一致
+        """
+        previous = None
+        for bm in bookmarks:
+            # 上一条要等到知道后面还有元素时才能补逗号
+            yield "[" if previous is None else previous + ","
+            previous = "  " + json.dumps(bm, ensure_ascii=False, indent=2).replace("\n", "\n  ")
+        if previous is None:
+            yield "[]"
+        else:
+            yield previous
+            yield "]"
 
     def format_json(self, bookmarks: list) -> str:
         """导出为 JSON 格式"""
         return json.dumps(bookmarks, ensure_ascii=False, indent=2)
 
-    def format_for_summary(self, bookmarks: list) -> str:
+    def iter_for_summary(self, bookmarks: Iterable[dict]) -> Iterator[str]:
         """
-        格式化为适合 AI 总结的格式
+        格式化为适合 AI 总结的格式（逐条产出）
         只保留核心内容，去除干扰
         """
-        lines = []
-        lines.append("以下是需要总结的推文列表：\n")
+        yield "以下是需要总结的推文列表：\n"
 
         for i, bm in enumerate(bookmarks, 1):
-            user = bm['user_name'] or bm['user_screen_name'] or "Unknown"
-            text = bm['full_text'].strip()
-            url = bm['tweet_url'] or ""
+            yield self.summary_entry(i, bm)
+
+    def summary_entry(self, i: int, bm: dict, text: str = None) -> str:
+        """AI 总结格式中的一条书签（text 可替换正文，用于截断）"""
+        user = bm['user_name'] or bm['user_screen_name'] or "Unknown"
+        text = bm['full_text'].strip() if text is None else text
+        url = bm['tweet_url'] or ""
+
+        lines = [f"【{i}】{user}", f"{text}"]
 
-            lines.append(f"【{i}】{user}")
-            lines.append(f"{text}")
-
-            # 提取外部链接
-            if bm['urls']:
-                try:
-                    urls = json.loads(bm['urls'])
-                    external_urls = [u['expanded_url'] for u in urls
-                                     if u.get('expanded_url') and
-                                     'twitter.com' not in u['expanded_url'] and
-                                     'x.com' not in u['expanded_url']]
-                    if external_urls:
-                        lines.append(f"相关链接: {', '.join(external_urls)}")
-                except json.JSONDecodeError:
-                    pass
-
-            lines.append(f"原文: {url}")
-            lines.append("")
+        # 外部链接
+        external_urls = [url for _, url in self.external_links(bm)]
+        if external_urls:
+            lines.append(f"相关链接: {', '.join(external_urls)}")
 
+        lines.append(f"原文: {url}")
+        lines.append("")
         return "\n".join(lines)
 
+    def format_for_summary(self, bookmarks: list) -> str:
+        """格式化为适合 AI 总结的格式"""
+        return "\n".join(self.iter_for_summary(bookmarks))
+
+    def iter_summary_chunks(self, bookmarks: Iterable[dict], max_tokens: int) -> Iterator[dict]:
+        """
+        把 AI 总结格式按 token 预算切块（逐块产出）
+
+        每块是一段独立的提示词，书签编号全局连续；单条书签超出预算时截断其正文。
+        产出 {'chunk', 'bookmarks', 'first', 'last', 'tokens', 'truncated', 'text'}，
+        tokens 为 estimate_tokens 的估算值。
+        """
+        # 按最长的块号估算头部，保证任何一块都不超预算
+        header_tokens = estimate_tokens(self.SUMMARY_CHUNK_HEADER.format(chunk=99999))
+        if max_tokens <= header_tokens:
+            raise ValueError(f"token 预算过小: {max_tokens}")
+
+        chunk = 0
+        entries = []
+        tokens = header_tokens
+        first = truncated = 0
+
+        def make_chunk():
+            return {
+                'chunk': chunk, 'bookmarks': len(entries), 'first': first, 'last': first + len(entries) - 1,
+                'tokens': tokens, 'truncated': truncated,
+                'text': "\n".join([self.SUMMARY_CHUNK_HEADER.format(chunk=chunk)] + entries),
+            }
+
+        for i, bm in enumerate(bookmarks, 1):
+            entry = self.summary_entry(i, bm)
+            # 各条之间以换行连接
+            cost = estimate_tokens(entry) + 1
+            if entries and tokens + cost > max_tokens:
+                yield make_chunk()
+                entries = []
+                tokens = header_tokens
+                first = truncated = 0
+            if not entries:
+                chunk += 1
+                first = i
+                if header_tokens + cost > max_tokens:
+                    entry, cost = self._truncate_entry(i, bm, max_tokens - header_tokens)
+                    truncated += 1
+            entries.append(entry)
+            tokens += cost
+        if entries:
+            yield make_chunk()
+
+    def _truncate_entry(self, i: int, bm: dict, budget: int) -> tuple:
+        """截断正文使一条书签不超过 budget，返回 (文本, token 数)"""
+        text = bm['full_text'].strip()
+        while True:
+            entry = self.summary_entry(i, bm, text + self.TRUNCATED_MARK)
+            cost = estimate_tokens(entry) + 1
+            if cost <= budget or not text:
+                return entry, cost
+            # 按超出比例缩短，留一点余量以免反复试探
+            text = text[:int(len(text) * budget / cost * 0.9)].rstrip()
+
+    def iter_format(self, format: str, bookmarks: Iterable[dict], total: int = None) -> Iterator[str]:
+        """按格式名选择对应的逐条格式化器"""
+        if format == 'markdown':
+            return self.iter_markdown_list(bookmarks, total, include_stats=True)
+        elif format == 'compact':
+            return self.iter_compact_list(bookmarks, total)
+        elif format == 'json':
+            return self.iter_json(bookmarks)
+        elif format == 'summary':
+            return self.iter_for_summary(bookmarks)
+        else:
+            return self.iter_markdown_list(bookmarks, total)
+
+    @staticmethod
+    def write_chunks(chunks: Iterable[str], stream: TextIO):
+        """把格式化器产出的文本块以换行连接写入 stream"""
+        first = True
+        for chunk in chunks:
+            if not first:
+                stream.write("\n")
+            stream.write(chunk)
+            first = False
+
+    def write_formats(self, formats: list, bookmarks: Iterable[dict], total: int,
+                      streams: list) -> int:
+        """
+        一次遍历 bookmarks，同时把每种格式写入对应的 stream，返回书签数
+
+        各格式化器轮流产出一个文本块，tee 只需缓存它们之间相差的几条书签。
+        """
+        exported = 0
+
+        def rows():
+            nonlocal exported
+            for bm in bookmarks:
+                exported += 1
+                yield bm
+
+        writers = []
+        for fmt, copy, stream in zip(formats, itertools.tee(rows(), len(formats)), streams):
+            if fmt == 'json':
+                # json 原样输出查询列，不含为其他格式附带的 external_links
+                copy = ({k: v for k, v in bm.items() if k != 'external_links'} for bm in copy)
+            writers.append([self.iter_format(fmt, copy, total), stream, True])
+        while writers:
+            for writer in list(writers):
+                chunks, stream, first = writer
+                chunk = next(chunks, None)
+                if chunk is None:
+                    writers.remove(writer)
+                    continue
+                if not first:
+                    stream.write("\n")
+                stream.write(chunk)
+                writer[2] = False
+        return exported
+
+    def write_partition(self, formats: list, bookmarks: Iterable[dict], total: int,
+                        paths: list) -> int:
+        """把一个分区写成各格式的文件，返回书签数"""
+        files = []
+        try:
+            for path in paths:
+                files.append(open(path, 'w', encoding='utf-8'))
+            return self.write_formats(formats, bookmarks, total, files)
+        finally:
+            for f in files:
+                f.close()
+
+    @staticmethod
+    def iter_partitions(bookmarks: Iterator[dict], partition) -> Iterator[tuple]:
+        """
+        按分区切分已排好序的书签流 -> (分区名, 书签迭代器)
+
+        partition: None（不分区）、'month'、'user' 或每个分区的条数
+        """
+        if partition is None:
+            yield None, bookmarks
+        elif isinstance(partition, int):
+            for index, group in itertools.groupby(enumerate(bookmarks), lambda p: p[0] // partition):
+                yield f"{index + 1:04d}", (bm for _, bm in group)
+        else:
+            column = 'created_at' if partition == 'month' else 'user_screen_name'
+            width = 7 if partition == 'month' else None
+
+            def key(bm):
+                return partition_name((bm[column] or '')[:width])
+
+            yield from itertools.groupby(bookmarks, key)
+
+    def partition_counts(self, partition, **query_args) -> dict:
+        """各分区的书签数 {分区名: 数量}，供带总数头部的格式使用"""
+        if partition is None or isinstance(partition, int):
+            total = self.count_bookmarks(**query_args)
+            if partition is None:
+                return {None: total}
+            return {f"{i + 1:04d}": min(partition, total - i * partition)
+                    for i in range(math.ceil(total / partition))}
+
+        conn = self._get_connection()
+        try:
+            query, params = self.build_query(conn, **query_args)
+            counts = {}
+            for value, count in conn.execute(
+                    f"SELECT {self.PARTITION_COLUMNS[partition]}, COUNT(*) FROM ({query}) GROUP BY 1",
+                    params):
+                name = partition_name(value)
+                counts[name] = counts.get(name, 0) + count
+            return counts
+        finally:
+            conn.close()
+
+    def export_files(self, formats: list, output: str, partition=None, workers: int = None,
+                     **query_args) -> str:
+        """
+        一次查询导出多种格式，可按分区拆分为多个文件
+
+        文件名为 output 去掉后缀后加上 "-分区名" 与格式后缀（FORMAT_SUFFIXES）。
+        workers > 1 时，不少于 PARALLEL_MIN_ROWS 条的分区整体交给进程池格式化
+        （该分区会先读入内存），其余分区在主进程中边读边写。
+        """
+        base = Path(output)
+        if base.suffix in ('.md', '.json', '.txt'):
+            base = base.with_suffix('')
+        base.parent.mkdir(parents=True, exist_ok=True)
+        workers = workers or os.cpu_count() or 1
+
+        counts = {}
+        if any(fmt in ('markdown', 'compact') for fmt in formats):
+            counts = self.partition_counts(partition, **query_args)
+
+        bookmarks = self.iter_bookmarks(
+            with_links=any(fmt != 'json' for fmt in formats), partition=partition, **query_args)
+        exported = 0
+        files = []
+        pending = []
+        # 不分区时只有一个分区，进程池无从并行
+        pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 and partition is not None else None
+        try:
+            for name, group in self.iter_partitions(bookmarks, partition):
+                stem = f"{base.name}-{name}" if name else base.name
+                paths = [str(base.with_name(stem + self.FORMAT_SUFFIXES.get(fmt, '.md'))) for fmt in formats]
+                files.extend(paths)
+                total = counts.get(name)
+                if pool:
+                    head = list(itertools.islice(group, self.PARALLEL_MIN_ROWS))
+                    if len(head) < self.PARALLEL_MIN_ROWS:
+                        group = iter(head)
+                    else:
+                        # 限制在途分区数，避免读得比写得快时占满内存
+                        if len(pending) >= workers * 2:
+                            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                            for future in done:
+                                exported += future.result()
+                                pending.remove(future)
+                        rows = head + list(group)
+                        pending.append(pool.submit(_write_partition, formats, rows, total, paths))
+                        continue
+                exported += self.write_partition(formats, group, total, paths)
+            for future in pending:
+                exported += future.result()
+        finally:
+            bookmarks.close()
+            if pool:
+                pool.shutdown()
+
+        if not exported:
+            for path in files:
+                os.remove(path)
+            return "没有找到符合条件的书签"
+        return f"已导出 {exported} 条书签到 {len(files)} 个文件 ({base.parent})"
+
+    def export_summary_chunks(self, max_tokens: int, output: str = None, stream: TextIO = None,
+                              **query_args) -> Optional[str]:
+        """
+        按 token 预算分块导出 AI 总结格式，各块可并行交给模型总结
+
+        指定 output 时每块写成一个文件（output 去掉后缀加 "-chunk-编号.summary.md"），
+        并写出清单 output 去掉后缀加 ".chunks.jsonl"（每块一行，不含正文）；
+        否则每块一行 JSONL（含 text）写入 stream，或作为字符串返回。
+        """
+        bookmarks = self.iter_bookmarks(with_links=True, **query_args)
+        try:
+            chunks = self.iter_summary_chunks(bookmarks, max_tokens)
+            if output:
+                base = Path(output)
+                if base.suffix in ('.md', '.json', '.jsonl', '.txt'):
+                    base = base.with_suffix('')
+                base.parent.mkdir(parents=True, exist_ok=True)
+                manifest_path = base.with_name(base.name + '.chunks.jsonl')
+                exported = count = 0
+                with open(manifest_path, 'w', encoding='utf-8') as manifest:
+                    for chunk in chunks:
+                        name = f"{base.name}-chunk-{chunk['chunk']:04d}.summary.md"
+                        base.with_name(name).write_text(chunk.pop('text'), encoding='utf-8')
+                        manifest.write(json.dumps({**chunk, 'file': name}, ensure_ascii=False) + "\n")
+                        exported += chunk['bookmarks']
+                        count += 1
+                if not count:
+                    manifest_path.unlink()
+                    return "没有找到符合条件的书签"
+                return f"已导出 {exported} 条书签，分为 {count} 块到 {base.parent}（清单: {manifest_path.name}）"
+
+            target = stream if stream is not None else io.StringIO()
+            for chunk in chunks:
+                target.write(json.dumps(chunk, ensure_ascii=False) + "\n")
+            return None if stream is not None else target.getvalue()
+        finally:
+            bookmarks.close()
+
     def export(
         self,
-        format: str = 'markdown',
+        format='markdown',
         output: str = None,
+        stream: TextIO = None,
+        partition=None,
+        workers: int = None,
+        max_tokens: int = None,
         **query_args
-    ) -> str:
+    ) -> Optional[str]:
         """
         导出书签
 
+        逐行读取游标并边格式化边写出，内存占用与导出数量无关。
+
         Args:
-            format: 输出格式 (markdown/compact/json/summary)
-            output: 输出文件路径，None 则输出到 stdout
+            format: 输出格式 (markdown/compact/json/summary)，或多种格式的列表
+            output: 输出文件路径
+            stream: 输出流（如 sys.stdout），写完返回 None
+            partition: 分区方式 ('month'/'user'/每个分区的条数)
+            workers: 格式化大分区的进程数 (默认: CPU 核数)
+            max_tokens: summary 格式按此 token 预算分块 (见 export_summary_chunks)
             **query_args: 查询参数
+
+        output 与 stream 都未指定时返回完整内容字符串。
+        多种格式或分区导出见 export_files，此时必须指定 output。
         """
-        bookmarks = self.query_bookmarks(**query_args)
+        formats = [format] if isinstance(format, str) else list(format)
+        if max_tokens:
+            if formats != ['summary'] or partition is not None:
+                raise ValueError("按 token 分块只支持单独的 summary 格式，且不能与分区同时使用")
+            return self.export_summary_chunks(max_tokens, output, stream, **query_args)
+        if len(formats) > 1 or partition is not None:
+            if not output:
+                raise ValueError("多种格式或分区导出需要指定输出文件路径")
+            return self.export_files(formats, output, partition, workers, **query_args)
+        format = formats[0]
 
-        if not bookmarks:
+        # json 原样输出各列，其余格式需要外部链接
+        bookmarks = self.iter_bookmarks(with_links=format != 'json', **query_args)
+        try:
+            return self.write_export(format, bookmarks, lambda: self.count_bookmarks(**query_args),
+                                     output, stream)
+        finally:
+            bookmarks.close()
+
+    def write_export(self, format: str, bookmarks: Iterator[dict], count, output: str = None,
+                     stream: TextIO = None, append: bool = False) -> Optional[str]:
+        """
+        按单一格式写出书签流（export 的输出部分）
+
+        count 为返回总数的函数，只有带总数头部的格式才会调用。
+        append 时接在 output 末尾写入；json 此时改为每行一条的 JSONL，才能不断追加。
+        """
+        first = next(bookmarks, None)
+        if first is None:
             return "没有找到符合条件的书签"
 
-        # 格式化
-        if format == 'markdown':
-            content = self.format_markdown_list(bookmarks, include_stats=True)
-        elif format == 'compact':
-            content = self.format_compact_list(bookmarks)
-        elif format == 'json':
-            content = self.format_json(bookmarks)
-        elif format == 'summary':
-            content = self.format_for_summary(bookmarks)
+        # 只有带总数头部的格式才需要先 COUNT
+        total = None
+        if format not in ('json', 'summary'):
+            total = count()
+
+        exported = 0
+
+        def rows():
+            nonlocal exported
+            for bm in itertools.chain((first,), bookmarks):
+                exported += 1
+                yield bm
+
+        if append and format == 'json':
+            chunks = (json.dumps(bm, ensure_ascii=False) for bm in rows())
         else:
-            content = self.format_markdown_list(bookmarks)
+            chunks = self.iter_format(format, rows(), total)
 
         # 输出
         if output:
             output_path = Path(output)
             output_path.parent.mkdir(parents=True, exist_ok=True)
-            with open(output_path, 'w', encoding='utf-8') as f:
-                f.write(content)
-            return f"已导出 {len(bookmarks)} 条书签到 {output}"
+            with open(output_path, 'a' if append else 'w', encoding='utf-8') as f:
+                if f.tell():
+                    # 接在上次导出的内容后另起一行
+                    f.write("\n")
+                self.write_chunks(chunks, f)
+            return f"已{'追加' if append else '导出'} {exported} 条书签到 {output}"
+        elif stream is not None:
+            self.write_chunks(chunks, stream)
+            return None
         else:
-            return content
+            buffer = io.StringIO()
+            self.write_chunks(chunks, buffer)
+            return buffer.getvalue()
+
+    def get_watermark(self, profile: str) -> Optional[dict]:
+        """增量导出配置的水位线 {'bookmarked_at', 'last_id', 'exported_total', ...}，没有时返回 None"""
+        conn = self._get_connection()
+        try:
+            row = conn.execute(
+                "SELECT * FROM x_export_watermarks WHERE profile = ?", (profile,)
+            ).fetchone()
+            return dict(row) if row else None
+        finally:
+            conn.close()
+
+    def reset_watermark(self, profile: str) -> bool:
+        """清除水位线，下次从头导出；返回是否存在该配置"""
+        conn = self._get_connection(write=True)
+        try:
+            with conn:
+                return conn.execute(
+                    "DELETE FROM x_export_watermarks WHERE profile = ?", (profile,)
+                ).rowcount > 0
+        finally:
+            conn.close()
+
+    def export_incremental(self, profile: str, format: str = 'summary', output: str = None,
+                           stream: TextIO = None, append: bool = False, **query_args) -> Optional[str]:
+        """
+        增量导出：只导出配置 profile 上次导出之后新收藏的书签，按收藏顺序升序
+
+        水位线 (bookmarked_at, id) 记录在 x_export_watermarks，输出完整写出后才推进，
+        中途失败时下次会重新导出这部分。limit 限制单次导出的条数，其余留到下次。
+        筛选条件每次应保持一致，水位线只随实际导出的书签推进。
+        """
+        watermark = self.get_watermark(profile)
+        after = (watermark['bookmarked_at'], watermark['last_id']) if watermark else (None, 0)
+        query_args.pop('order', None)
+        position = {'after': after, 'exported': 0}
+
+        def rows(bookmarks):
+            for bm in bookmarks:
+                position['after'] = (bm.pop('_bookmarked_at'), bm.pop('_id'))
+                position['exported'] += 1
+                yield bm
+
+        bookmarks = self.iter_bookmarks(with_links=format != 'json', after=after, **query_args)
+        try:
+            result = self.write_export(
+                format, rows(bookmarks), lambda: self.count_bookmarks(after=after, **query_args),
+                output, stream, append)
+        finally:
+            bookmarks.close()
+
+        if not position['exported']:
+            return f"没有新的书签（配置 {profile} 已是最新）"
+        conn = self._get_connection(write=True)
+        try:
+            with conn:
+                conn.execute(
+                    """INSERT INTO x_export_watermarks (profile, bookmarked_at, last_id, exported_total)
+                       VALUES (?, ?, ?, ?)
+                       ON CONFLICT(profile) DO UPDATE SET
+                           bookmarked_at = excluded.bookmarked_at,
+                           last_id = excluded.last_id,
+                           exported_total = x_export_watermarks.exported_total + excluded.exported_total,
+                           updated_at = CURRENT_TIMESTAMP""",
+                    (profile, *position['after'], position['exported'])
+                )
+        finally:
+            conn.close()
+        return result
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    快速估算 token 数（不依赖分词器）
+
+    中日韩文字与其他非 ASCII 字符各按 1 个 token 计，ASCII 文本约 4 个字符 1 个；
+    若都按字符数 / 4 估算，中文会被低估到约四分之一。
+    """
+    ascii_chars = len(text.encode('ascii', 'ignore'))
+    return len(text) - ascii_chars + (ascii_chars + ASCII_CHARS_PER_TOKEN - 1) // ASCII_CHARS_PER_TOKEN
+
+
+def partition_name(value: str) -> str:
+    """分区键 -> 可用作文件名的分区名"""
+    return re.sub(r'[^\w.-]', '_', value) if value else 'unknown'
+
+
+def parse_formats(value: str) -> list:
+    """命令行 -f 参数: 逗号分隔的格式名"""
+    formats = [f.strip() for f in value.split(',') if f.strip()]
+    unknown = [f for f in formats if f not in ('markdown', 'compact', 'json', 'summary')]
+    if not formats or unknown:
+        raise argparse.ArgumentTypeError(f"未知的输出格式: {', '.join(unknown) or value}")
+    return list(dict.fromkeys(formats))
+
+
+def parse_partition(value: str):
+    """命令行 --partition 参数: month / user / 正整数"""
+    if value in ('month', 'user'):
+        return value
+    if value.isdigit() and int(value) > 0:
+        return int(value)
+    raise argparse.ArgumentTypeError(f"分区方式应为 month、user 或正整数: {value}")
+
+
+def _write_partition(formats: list, rows: list, total: int, paths: list) -> int:
+    """进程池任务：把一个分区格式化并写入文件"""
+    return BookmarkExporter(None).write_partition(formats, rows, total, paths)
 
 
 def main():
@@ -257,39 +949,85 @@ def main():
   %(prog)s -n 10                     # 导出最近 10 条
   %(prog)s --since 2026-01-01        # 导出指定日期后的书签
   %(prog)s --user elonmusk           # 导出指定用户的书签
+  %(prog)s --domain github.com       # 导出链接到 GitHub 的书签
+  %(prog)s --hashtag sqlite          # 导出带 #sqlite 话题的书签
+  %(prog)s --search '"vector search" rag*' --order relevance
   %(prog)s --format summary          # 导出为 AI 总结格式
+  %(prog)s -f markdown,json,summary --partition month   # 一次查询，按月分文件导出全部书签的三种格式
+  %(prog)s --max-tokens 8000 -o data/exports/digest.md   # 按 8000 token 分块，附 JSONL 清单
+  %(prog)s --profile daily --append  # 增量导出：只追加上次之后的新书签到 data/exports/bookmarks-daily.md
   %(prog)s --stdout                  # 输出到终端而非文件
         """
     )
 
     # 筛选参数
-    parser.add_argument('-n', '--limit', type=int, help='最大导出数量')
+    parser.add_argument('-n', '--limit', type=int, help='最大导出数量 (默认: 20，分区、分块与增量导出默认全部)')
     parser.add_argument('--since', help='开始日期 (YYYY-MM-DD)')
     parser.add_argument('--until', help='结束日期 (YYYY-MM-DD)')
     parser.add_argument('--user', help='筛选用户 (screen_name)')
     parser.add_argument('--lang', help='筛选语言 (zh/en/ja 等)')
-    parser.add_argument('--search', help='全文搜索关键词')
-    parser.add_argument('--order', choices=['asc', 'desc'], default='desc',
-                        help='排序方式 (默认: desc 最新优先)')
+    parser.add_argument('--search', help='全文搜索: 多个词同时匹配，"短语" 整体匹配，前缀* 匹配单词开头')
+    parser.add_argument('--domain', help='筛选包含指向该域名链接的书签 (如 github.com)')
+    parser.add_argument('--hashtag', help='筛选带有该话题的书签')
+    parser.add_argument('--order', choices=['asc', 'desc', 'relevance'], default='desc',
+                        help='排序方式 (默认: desc 最新优先; relevance 按搜索相关度)')
 
     # 输出参数
-    parser.add_argument('-f', '--format',
-                        choices=['markdown', 'compact', 'json', 'summary'],
-                        default='summary',
-                        help='输出格式 (默认: summary)')
+    parser.add_argument('-f', '--format', type=parse_formats,
+                        default=['summary'],
+                        help='输出格式 markdown/compact/json/summary，多种用逗号分隔 (默认: summary)')
+    parser.add_argument('--partition', type=parse_partition,
+                        help='分区导出: month 按月 / user 按用户 / 数字 N 每 N 条一个文件')
+    parser.add_argument('--workers', type=int, help='格式化大分区的进程数 (默认: CPU 核数)')
+    parser.add_argument('--max-tokens', type=int,
+                        help='summary 格式按 token 预算分块: 写出各块文件与 .chunks.jsonl 清单 (--stdout 时输出 JSONL)')
     parser.add_argument('-o', '--output', help='输出文件路径 (默认: data/exports/bookmarks-日期.md)')
     parser.add_argument('--stdout', action='store_true', help='输出到终端而非文件')
 
+    # 增量导出
+    parser.add_argument('--profile',
+                        help='增量导出配置名: 只导出该配置上次导出之后新收藏的书签 (按收藏顺序)，并记录水位线')
+    parser.add_argument('--append', action='store_true',
+                        help='追加到滚动文件 (默认: data/exports/bookmarks-配置名.md，json 为 .jsonl)')
+    parser.add_argument('--reset', action='store_true', help='清除该配置的水位线，从头重新导出')
+
     # 数据库路径
     parser.add_argument('--db', help='数据库路径')
 
     args = parser.parse_args()
+    script_dir = Path(__file__).parent
+
+    for value in (args.since, args.until):
+        if value:
+            try:
+                parse_date(value)
+            except ValueError as e:
+                print(f"错误: {e}")
+                sys.exit(1)
+
+    if args.stdout and (len(args.format) > 1 or args.partition):
+        print("错误: 多种格式或分区导出需要写入文件，不能与 --stdout 同时使用")
+        sys.exit(1)
+    if args.max_tokens is not None and (args.format != ['summary'] or args.partition):
+        print("错误: --max-tokens 只支持单独的 summary 格式，且不能与 --partition 同时使用")
+        sys.exit(1)
+    if args.max_tokens is not None and args.max_tokens < MIN_CHUNK_TOKENS:
+        print(f"错误: --max-tokens 至少为 {MIN_CHUNK_TOKENS}")
+        sys.exit(1)
+    if (args.append or args.reset) and not args.profile:
+        print("错误: --append 与 --reset 需要配合 --profile 使用")
+        sys.exit(1)
+    if args.profile and (len(args.format) > 1 or args.partition or args.max_tokens is not None):
+        print("错误: 增量导出只支持单一格式，不能与 --partition 或 --max-tokens 同时使用")
+        sys.exit(1)
+    if args.append and args.stdout:
+        print("错误: --append 需要写入文件，不能与 --stdout 同时使用")
+        sys.exit(1)
 
     # 确定数据库路径
     if args.db:
         db_path = args.db
     else:
-        script_dir = Path(__file__).parent
         db_path = str(script_dir / '../data/agentnote.db')
 
     if not os.path.exists(db_path):
@@ -298,33 +1036,72 @@ def main():
 
     # 确定输出路径
     output_path = args.output
-    if not args.stdout and not output_path:
+    if args.append and not output_path:
+        # 滚动文件按配置名固定，每次接在末尾追加
+        exports_dir = script_dir / '../data/exports'
+        suffix = '.jsonl' if args.format == ['json'] else '.md'
+        output_path = str(exports_dir / f'bookmarks-{partition_name(args.profile)}{suffix}')
+    elif not args.stdout and not output_path:
         # 默认输出到 data/exports/ 目录
         exports_dir = script_dir / '../data/exports'
         exports_dir.mkdir(parents=True, exist_ok=True)
         timestamp = datetime.now().strftime('%Y%m%d-%H%M')
         output_path = str(exports_dir / f'bookmarks-{timestamp}.md')
 
-    # 创建导出器
+    # 创建导出器（只读，表结构由导入脚本或 x_bookmarks_db.py init 负责）
     exporter = BookmarkExporter(db_path)
+    conn = x_bookmarks_db.connect(db_path, readonly=True)
+    try:
+        exporter.check_schema(conn)
+    except RuntimeError as e:
+        print(f"错误: {e}")
+        sys.exit(1)
+    finally:
+        conn.close()
 
-    # 设置默认 limit
-    limit = args.limit if args.limit else 20
-
-    # 执行导出
-    result = exporter.export(
-        format=args.format,
-        output=None if args.stdout else output_path,
+    # 设置默认 limit（分区、分块与增量导出默认导出全部）
+    limit = args.limit if args.limit else (
+        None if args.partition or args.max_tokens or args.profile else 20)
+    filters = dict(
         limit=limit,
         since=args.since,
         until=args.until,
         user=args.user,
         lang=args.lang,
         search=args.search,
-        order=args.order
+        domain=args.domain,
+        hashtag=args.hashtag,
     )
 
-    print(result)
+    # 执行导出
+    if args.profile:
+        if args.reset and exporter.reset_watermark(args.profile):
+            print(f"已清除配置 {args.profile} 的水位线", file=sys.stderr)
+        result = exporter.export_incremental(
+            args.profile,
+            format=args.format[0],
+            output=None if args.stdout else output_path,
+            stream=sys.stdout if args.stdout else None,
+            append=args.append,
+            **filters
+        )
+    else:
+        result = exporter.export(
+            format=args.format,
+            output=None if args.stdout else output_path,
+            stream=sys.stdout if args.stdout else None,
+            partition=args.partition,
+            workers=args.workers,
+            max_tokens=args.max_tokens,
+            order=args.order,
+            **filters
+        )
+
+    # 输出到终端时内容已直接写出，只补一个换行（JSONL 每行已自带换行）
+    if result is not None:
+        print(result)
+    elif not args.max_tokens:
+        print()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,424 @@
+#!/usr/bin/env python3
+"""
+X Bookmarks Import Tool
+把推特书签导出文件流式导入 x_bookmarks
+
+支持 JSON 数组、JSONL 或多个拼接的 JSON 值，逐条解析，不把整个文件读进内存。
+每条记录可以是 GraphQL 推文（rest_id + legacy）、书签时间线响应页
+（data...instructions...tweet_results）、v1.1 推文（id_str + user），
+或已按 x_bookmarks 列名整理好的行。
+
+按 tweet_id upsert，每批数据与断点（x_sync_state）在同一事务中提交；
+中断后对同一文件再次运行会从断点继续，JSONL 追加的新行也会从上次结束处接着导入。
+"""
+
+import argparse
+import codecs
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterator
+
+sys.path.insert(0, str(Path(__file__).parent))
+import x_bookmarks_db
+
+BATCH_SIZE = 1000               # 每个事务写入的推文数
+READ_CHUNK_SIZE = 1 << 20       # 每次从文件读取的字节数
+HEAD_BYTES = 4096               # 用文件开头这么多字节判断是否还是同一个文件
+PROGRESS_INTERVAL = 2.0         # 进度输出间隔（秒）
+MAX_STRING_CHARS = 16 << 20     # 读到这么长仍未结束的字符串视为文件损坏
+TRUNCATION_SLACK = 16           # 解析错误离缓冲区末尾这么近时，可能只是值被分块截断
+
+_WHITESPACE = ' \t\r\n\ufeff'     # 含 UTF-8 BOM
+_DB_TIME = re.compile(r'\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}$')
+
+
+class JsonStream:
+    """
+    从二进制文件中逐个读出 JSON 值
+
+    顶层数组会被展开一层（逐个产出元素），因此 JSON 数组、JSONL 与拼接的
+    JSON 值都能处理。每产出一个值后，offset / in_array 即为该值之后的位置，
+    可作为断点传回构造函数继续读取。
+    """
+
+    def __init__(self, fileobj, offset: int = 0, in_array: bool = False):
+        self.file = fileobj
+        self.offset = offset
+        self.in_array = in_array
+
+    def __iter__(self) -> Iterator:
+        decoder = json.JSONDecoder()
+        text_decoder = codecs.getincrementaldecoder('utf-8')()
+        buf = ''
+        pos = 0
+        eof = False
+
+        def consume(end: int):
+            nonlocal pos
+            if end > pos:
+                self.offset += len(buf[pos:end].encode('utf-8'))
+                pos = end
+
+        while True:
+            skip = _WHITESPACE + ',' if self.in_array else _WHITESPACE
+            i = pos
+            while i < len(buf) and buf[i] in skip:
+                i += 1
+            consume(i)
+
+            if pos < len(buf) and buf[pos] in '[]':
+                # 顶层数组的开始 / 结束
+                if buf[pos] == '[' and not self.in_array:
+                    self.in_array = True
+                    consume(pos + 1)
+                    continue
+                if buf[pos] == ']' and self.in_array:
+                    self.in_array = False
+                    consume(pos + 1)
+                    continue
+
+            value = None
+            if pos < len(buf):
+                try:
+                    value, end = decoder.raw_decode(buf, pos)
+                except json.JSONDecodeError as e:
+                    # 值被分块截断时错误出现在缓冲区末尾（未结束的字符串报告其开头）；
+                    # 其余位置的错误是文件本身损坏，不再继续读入，内存不随文件增长
+                    if e.msg.startswith('Unterminated string'):
+                        corrupt = len(buf) - e.pos > MAX_STRING_CHARS
+                    else:
+                        corrupt = e.pos < len(buf) - TRUNCATION_SLACK
+                    if eof or corrupt:
+                        raise ValueError(f"JSON 解析失败（文件偏移 {self.offset}）: {e.msg}") from None
+                else:
+                    # 值恰好停在缓冲区末尾时可能被截断（如数字），读入更多再解析
+                    if end < len(buf) or eof:
+                        consume(end)
+                        yield value
+                        continue
+            elif eof:
+                return
+
+            chunk = self.file.read(READ_CHUNK_SIZE)
+            buf = buf[pos:] + text_decoder.decode(chunk, final=not chunk)
+            pos = 0
+            eof = not chunk
+
+
+# === 推文形态归一化 ===
+
+def normalize_time(value) -> str:
+    """推文时间 -> 'YYYY-MM-DD HH:MM:SS'（UTC），无法识别时原样返回"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, str) and _DB_TIME.match(value):
+        return value
+    if isinstance(value, (int, float)):
+        # 秒或毫秒时间戳
+        seconds = value / 1000 if value > 1e11 else value
+        dt = datetime.fromtimestamp(seconds, timezone.utc)
+    else:
+        try:
+            dt = datetime.strptime(value, '%a %b %d %H:%M:%S %z %Y')
+        except ValueError:
+            try:
+                dt = datetime.fromisoformat(value.replace('Z', '+00:00'))
+            except ValueError:
+                return value
+    if dt.tzinfo:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def is_tweet(node: dict) -> bool:
+    if 'tweet_id' in node:
+        return True
+    if 'rest_id' in node and isinstance(node.get('legacy'), dict):
+        return 'full_text' in node['legacy']
+    return 'id_str' in node and 'user' in node and ('full_text' in node or 'text' in node)
+
+
+def iter_tweets(node) -> Iterator[dict]:
+    """取出一条记录中的推文对象；时间线响应页可能包含多条"""
+    if isinstance(node, list):
+        for item in node:
+            yield from iter_tweets(item)
+    elif isinstance(node, dict):
+        if is_tweet(node):
+            yield node
+            return
+        # 不进入推文内部，所以引用 / 转发的推文不会被当作书签
+        for value in node.values():
+            if isinstance(value, (dict, list)):
+                yield from iter_tweets(value)
+
+
+def _dumps(value) -> str:
+    return json.dumps(value, ensure_ascii=False)
+
+
+def _count(value) -> int:
+    try:
+        return int(value or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _entities(legacy: dict) -> dict:
+    """legacy / v1.1 推文的 entities -> urls / media / hashtags / user_mentions JSON"""
+    entities = legacy.get('entities') or {}
+    media = []
+    for m in (legacy.get('extended_entities') or entities).get('media') or []:
+        item = {'type': m.get('type'), 'url': m.get('media_url_https') or m.get('media_url'),
+                'expanded_url': m.get('expanded_url')}
+        variants = [v for v in (m.get('video_info') or {}).get('variants') or []
+                    if v.get('content_type') == 'video/mp4']
+        if variants:
+            item['video_url'] = max(variants, key=lambda v: v.get('bitrate') or 0)['url']
+        media.append(item)
+    return {
+        'urls': _dumps([{'display_url': u.get('display_url'), 'expanded_url': u.get('expanded_url') or u.get('url')}
+                        for u in entities.get('urls') or []]),
+        'media': _dumps(media),
+        'hashtags': _dumps([h.get('text') if isinstance(h, dict) else h
+                            for h in entities.get('hashtags') or []]),
+        'user_mentions': _dumps([{'screen_name': u.get('screen_name'), 'name': u.get('name')}
+                                 for u in entities.get('user_mentions') or []]),
+    }
+
+
+def normalize_tweet(tweet: dict) -> dict:
+    """GraphQL / v1.1 推文或已整理的行 -> x_bookmarks 行（不含 raw_json / sync_cursor）"""
+    if 'tweet_id' in tweet:
+        row = {c: tweet.get(c) for c in x_bookmarks_db.BOOKMARK_COLUMNS}
+        for column in ('urls', 'media', 'hashtags', 'user_mentions'):
+            if isinstance(row[column], (list, dict)):
+                row[column] = _dumps(row[column])
+        row['tweet_id'] = str(row['tweet_id'])
+        row['full_text'] = row['full_text'] or ''
+        row['created_at'] = normalize_time(row['created_at'])
+        row['bookmarked_at'] = normalize_time(row['bookmarked_at'])
+        for column in ('bookmark_count', 'favorite_count', 'retweet_count', 'reply_count',
+                       'quote_count', 'view_count', 'is_quote_status', 'is_retweet'):
+            row[column] = _count(row[column])
+        return row
+
+    if 'rest_id' in tweet:
+        # GraphQL：推文字段在 legacy 中，用户在 core.user_results.result
+        legacy = tweet['legacy']
+        user = ((tweet.get('core') or {}).get('user_results') or {}).get('result') or {}
+        user_legacy = user.get('legacy') or {}
+        user_core = user.get('core') or {}
+        tweet_id = tweet['rest_id']
+        note = ((tweet.get('note_tweet') or {}).get('note_tweet_results') or {}).get('result') or {}
+        text = note.get('text') or legacy.get('full_text')
+        user_id = user.get('rest_id')
+        user_name = user_core.get('name') or user_legacy.get('name')
+        screen_name = user_core.get('screen_name') or user_legacy.get('screen_name')
+        avatar = (user.get('avatar') or {}).get('image_url') or user_legacy.get('profile_image_url_https')
+        view_count = (tweet.get('views') or {}).get('count')
+        is_retweet = 'retweeted_status_result' in legacy
+    else:
+        # v1.1
+        legacy = tweet
+        user = tweet.get('user') or {}
+        tweet_id = tweet['id_str']
+        text = (tweet.get('extended_tweet') or {}).get('full_text') or tweet.get('full_text') or tweet.get('text')
+        user_id = user.get('id_str')
+        user_name = user.get('name')
+        screen_name = user.get('screen_name')
+        avatar = user.get('profile_image_url_https')
+        view_count = None
+        is_retweet = 'retweeted_status' in tweet
+
+    return {
+        'tweet_id': str(tweet_id),
+        'tweet_url': f"https://x.com/{screen_name or 'i'}/status/{tweet_id}",
+        'full_text': text or '',
+        'lang': legacy.get('lang'),
+        'created_at': normalize_time(legacy.get('created_at')),
+        'bookmarked_at': None,
+        'user_id': user_id,
+        'user_name': user_name,
+        'user_screen_name': screen_name,
+        'user_avatar_url': avatar,
+        'bookmark_count': _count(legacy.get('bookmark_count')),
+        'favorite_count': _count(legacy.get('favorite_count')),
+        'retweet_count': _count(legacy.get('retweet_count')),
+        'reply_count': _count(legacy.get('reply_count')),
+        'quote_count': _count(legacy.get('quote_count')),
+        'view_count': _count(view_count),
+        **_entities(legacy),
+        'is_quote_status': int(bool(legacy.get('is_quote_status'))),
+        'is_retweet': int(is_retweet),
+        'quoted_tweet_id': legacy.get('quoted_status_id_str'),
+    }
+
+
+# === 导入 ===
+
+def file_head(path: str, length: int = HEAD_BYTES) -> str:
+    """文件开头 length 字节的指纹（追加内容不会改变它）"""
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read(length)).hexdigest()
+
+
+class BookmarkImporter:
+    """书签导入器"""
+
+    def __init__(self, db_path: str, batch_size: int = BATCH_SIZE, raw: str = 'plain'):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.raw = raw
+
+    def import_file(self, path: str, restart: bool = False, progress=None) -> dict:
+        """
+        导入一个文件（'-' 为标准输入，不记录断点）
+
+        返回统计 {'records', 'tweets', 'inserted', 'updated', 'unchanged',
+                  'resumed_from', 'offset', 'seconds'}
+        """
+        conn = x_bookmarks_db.connect(self.db_path)
+        # WAL 下 NORMAL 足够：断点与数据同事务提交，掉电最多丢最后几批，重跑即可补上
+        conn.execute("PRAGMA synchronous = NORMAL")
+        try:
+            x_bookmarks_db.init_schema(conn)
+            if path == '-':
+                return self._run(conn, sys.stdin.buffer, None, {}, progress)
+
+            source = f"import:{Path(path).resolve()}"
+            if restart:
+                x_bookmarks_db.clear_checkpoint(conn, source)
+            size = os.path.getsize(path)
+            checkpoint = x_bookmarks_db.load_checkpoint(conn, source)
+            cursor = checkpoint['cursor'] if checkpoint else {}
+            if cursor and (cursor.get('offset', 0) > size or cursor.get('head_len', 0) > size
+                           or cursor.get('head') != file_head(path, cursor.get('head_len', 0))):
+                # 同一路径换成了别的文件：断点失效，从头导入
+                cursor = {}
+            if not cursor:
+                cursor = {'head_len': min(HEAD_BYTES, size)}
+                cursor['head'] = file_head(path, cursor['head_len'])
+            with open(path, 'rb') as f:
+                f.seek(cursor.get('offset', 0))
+                return self._run(conn, f, source, cursor, progress, size)
+        finally:
+            conn.close()
+
+    def _run(self, conn, fileobj, source, cursor: dict, progress, total_bytes: int = None) -> dict:
+        start = time.perf_counter()
+        stream = JsonStream(fileobj, cursor.get('offset', 0), cursor.get('in_array', False))
+        stats = {'records': 0, 'tweets': 0, 'inserted': 0, 'updated': 0, 'unchanged': 0,
+                 'resumed_from': stream.offset}
+        # 导出文件通常不带收藏时间，用导入开始时间补齐；已存在的书签保留原值
+        imported_at = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+        compress = self.raw == 'zlib'
+        batch = []
+        last_report = start
+
+        def flush():
+            with conn:
+                if batch:
+                    for key, value in x_bookmarks_db.upsert_bookmarks(conn, batch).items():
+                        stats[key] += value
+                if source:
+                    x_bookmarks_db.save_checkpoint(conn, source, {
+                        'offset': stream.offset, 'in_array': stream.in_array,
+                        'head': cursor['head'], 'head_len': cursor['head_len'],
+                    }, len(batch))
+            stats['tweets'] += len(batch)
+            batch.clear()
+
+        try:
+            for record in stream:
+                stats['records'] += 1
+                for tweet in iter_tweets(record):
+                    row = normalize_tweet(tweet)
+                    row['bookmarked_at'] = row['bookmarked_at'] or imported_at
+                    raw = row['raw_json'] if 'tweet_id' in tweet else tweet
+                    if isinstance(raw, (dict, list)):
+                        raw = json.dumps(raw, ensure_ascii=False, separators=(',', ':'))
+                    row['raw_json'] = None if self.raw == 'none' else x_bookmarks_db.encode_raw_json(raw, compress)
+                    row['sync_cursor'] = str(stream.offset)
+                    batch.append(row)
+                # 只在记录之间提交，断点之前的记录一定已完整写入
+                if len(batch) >= self.batch_size:
+                    flush()
+                    now = time.perf_counter()
+                    if progress and now - last_report >= PROGRESS_INTERVAL:
+                        progress(stats, stream.offset, total_bytes)
+                        last_report = now
+        finally:
+            # 遇到损坏的记录时也先保存已解析的部分，修复文件后从出错处继续
+            flush()
+
+        stats['offset'] = stream.offset
+        stats['seconds'] = round(time.perf_counter() - start, 3)
+        return stats
+
+
+def print_progress(stats: dict, offset: int, total_bytes: int):
+    percent = f" ({offset * 100 / total_bytes:.1f}%)" if total_bytes else ""
+    print(f"  已导入 {stats['tweets']} 条推文{percent}", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='X 书签导入工具',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+示例:
+  %(prog)s bookmarks.json                # 导入 JSON 数组（中断后再次运行会续传）
+  %(prog)s dump.jsonl --raw zlib         # 原始 JSON 压缩存储
+  %(prog)s dump.jsonl --restart          # 忽略断点，从头导入
+  cat dump.jsonl | %(prog)s -            # 从标准输入导入（不记录断点）
+        """
+    )
+    parser.add_argument('input', help="书签导出文件（JSON / JSONL），'-' 表示标准输入")
+    parser.add_argument('--db', help='数据库路径')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                        help=f'每个事务写入的推文数 (默认: {BATCH_SIZE})')
+    parser.add_argument('--raw', choices=['plain', 'zlib', 'none'], default='plain',
+                        help='raw_json 的保存方式 (默认: plain; zlib 压缩; none 不保存)')
+    parser.add_argument('--restart', action='store_true', help='忽略已有断点，从头导入')
+    parser.add_argument('-q', '--quiet', action='store_true', help='不输出进度')
+
+    args = parser.parse_args()
+
+    script_dir = Path(__file__).parent
+    db_path = args.db or str(script_dir.parent / "data" / "agentnote.db")
+
+    if args.input != '-' and not os.path.exists(args.input):
+        print(f"错误: 文件不存在: {args.input}")
+        sys.exit(1)
+    if args.batch_size < 1:
+        print("错误: --batch-size 必须大于 0")
+        sys.exit(1)
+
+    importer = BookmarkImporter(db_path, args.batch_size, args.raw)
+    try:
+        stats = importer.import_file(args.input, args.restart,
+                                     None if args.quiet else print_progress)
+    except ValueError as e:
+        print(f"错误: {e}")
+        sys.exit(1)
+
+    if stats['resumed_from'] and not stats['records']:
+        print("没有新记录: 该文件此前已全部导入 (--restart 可重新导入)")
+        return
+    if stats['resumed_from']:
+        print(f"从断点继续（文件偏移 {stats['resumed_from']}）")
+    rate = stats['tweets'] / stats['seconds'] if stats['seconds'] else 0
+    print(f"✅ 已导入 {stats['tweets']} 条推文: 新增 {stats['inserted']}, "
+          f"更新 {stats['updated']}, 未变 {stats['unchanged']} "
+          f"({stats['seconds']}s, {rate:.0f} 条/秒)")
+
+
+if __name__ == '__main__':
+    main()
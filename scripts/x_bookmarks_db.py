@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+"""
+X Bookmarks Database
+x_bookmarks 相关表的初始化与维护
+
+  python scripts/x_bookmarks_db.py init [--db path]               # 建表 / 补建新表与触发器
+  python scripts/x_bookmarks_db.py backfill-entities [--db path]  # 从 JSON 列重建实体子表
+  python scripts/x_bookmarks_db.py rebuild-fts [--db path]        # 重建全文索引
+
+书签的写入（upsert）与导入断点（x_sync_state）也在这里，供 x-bookmarks-import.py 使用
+"""
+
+import argparse
+import json
+import os
+import re
+import sqlite3
+import sys
+import zlib
+from pathlib import Path
+from urllib.parse import urlsplit
+
+SCRIPT_DIR = Path(__file__).parent
+SCHEMA_PATH = SCRIPT_DIR / "x_bookmarks_schema.sql"
+DEFAULT_DB_PATH = SCRIPT_DIR.parent / "data" / "agentnote.db"
+
+# 由 urls / media / hashtags / user_mentions 展开的子表
+ENTITY_TABLES = ('x_bookmark_urls', 'x_bookmark_media', 'x_bookmark_hashtags', 'x_bookmark_mentions')
+
+# 与 x_bookmark_urls.is_external 的判定保持一致
+INTERNAL_DOMAINS = ('x.com', 'twitter.com', 't.co')
+
+BACKFILL_BATCH_SIZE = 5000
+
+FTS_MIN_CHARS = 3                       # trigram 分词器能索引的最短关键词
+FTS_WEIGHTS = "1.0, 3.0, 3.0"           # bm25 列权重: full_text, user_name, user_screen_name
+
+_SEARCH_TOKEN = re.compile(r'"([^"]*)"|(\S+)')
+
+# 后加的列: (表, 列, 定义)。CREATE TABLE IF NOT EXISTS 不会给已有的表加列，
+# 所以在执行 schema 之前用 ALTER TABLE 补齐
+MIGRATION_COLUMNS = (
+    ('x_sync_state', 'source', 'TEXT'),
+)
+
+# 导入时写入的列（id 与 created_in_db / updated_in_db 由数据库维护）
+BOOKMARK_COLUMNS = (
+    'tweet_id', 'tweet_url', 'full_text', 'lang', 'created_at', 'bookmarked_at',
+    'user_id', 'user_name', 'user_screen_name', 'user_avatar_url',
+    'bookmark_count', 'favorite_count', 'retweet_count', 'reply_count', 'quote_count', 'view_count',
+    'urls', 'media', 'hashtags', 'user_mentions',
+    'is_quote_status', 'is_retweet', 'quoted_tweet_id', 'raw_json', 'sync_cursor',
+)
+
+# 内容未变的行不更新：避免重复导入时无谓地重写子表与全文索引。
+# bookmarked_at 保留第一次收藏的时间，sync_cursor 只是记录，不参与比较
+_UPSERT_SET = [c for c in BOOKMARK_COLUMNS if c not in ('tweet_id', 'bookmarked_at', 'sync_cursor')]
+UPSERT_SQL = f"""
+    INSERT INTO x_bookmarks ({', '.join(BOOKMARK_COLUMNS)})
+    VALUES ({', '.join(':' + c for c in BOOKMARK_COLUMNS)})
+    ON CONFLICT(tweet_id) DO UPDATE SET
+        {', '.join(f'{c} = excluded.{c}' for c in _UPSERT_SET)},
+        bookmarked_at = COALESCE(x_bookmarks.bookmarked_at, excluded.bookmarked_at),
+        sync_cursor = excluded.sync_cursor,
+        updated_in_db = CURRENT_TIMESTAMP
+    WHERE ({', '.join('x_bookmarks.' + c for c in _UPSERT_SET)})
+       IS NOT ({', '.join('excluded.' + c for c in _UPSERT_SET)})
+"""
+
+
+def connect(db_path, readonly: bool = False) -> sqlite3.Connection:
+    """打开书签数据库（Row 工厂，等待写锁而不是立即报 locked）；readonly 时以只读模式打开"""
+    if readonly:
+        conn = sqlite3.connect(Path(db_path).resolve().as_uri() + '?mode=ro', uri=True)
+    else:
+        conn = sqlite3.connect(str(db_path))
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA busy_timeout = 5000")
+    return conn
+
+
+def table_exists(conn: sqlite3.Connection, name: str) -> bool:
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+    ).fetchone() is not None
+
+
+def missing_schema(conn: sqlite3.Connection) -> list:
+    """返回尚未由 init_schema 建好的表与列（只读检查，不做迁移）"""
+    missing = [t for t in ('x_bookmarks', 'x_export_watermarks', *ENTITY_TABLES, 'x_bookmarks_fts')
+               if not table_exists(conn, t)]
+    for table, column, definition in MIGRATION_COLUMNS:
+        columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+        if column not in columns:
+            missing.append(f"{table}.{column}")
+    return missing
+
+
+def init_schema(conn: sqlite3.Connection) -> dict:
+    """
+    应用 x_bookmarks_schema.sql（幂等）
+
+    实体子表是新建的且已有书签时，顺带从 JSON 列回填。
+    全文索引是新建的时同样重建索引。
+    返回 {'entities_backfilled': 回填的书签数, 'fts_indexed': 索引的书签数}
+    """
+    had_entities = table_exists(conn, ENTITY_TABLES[0])
+    had_fts = table_exists(conn, 'x_bookmarks_fts')
+    for table, column, definition in MIGRATION_COLUMNS:
+        columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+        if columns and column not in columns:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+    conn.executescript(SCHEMA_PATH.read_text(encoding='utf-8'))
+
+    backfilled = indexed = 0
+    if not had_entities:
+        backfilled = backfill_entities(conn)
+    if not had_fts:
+        indexed = rebuild_fts(conn)
+    return {'entities_backfilled': backfilled, 'fts_indexed': indexed}
+
+
+def backfill_entities(conn: sqlite3.Connection, batch_size: int = BACKFILL_BATCH_SIZE) -> int:
+    """
+    重建实体子表，返回处理的书签数
+
+    借助 x_bookmarks_entities_au 触发器（SET urls = urls 也会触发），
+    展开逻辑只在 schema 中维护一份；按 id 区间分批提交，避免长时间持有写锁。
+    """
+    with conn:
+        for table in ENTITY_TABLES:
+            # 清理 INSERT OR REPLACE 等方式留下的孤儿记录
+            conn.execute(f"DELETE FROM {table} WHERE bookmark_id NOT IN (SELECT id FROM x_bookmarks)")
+
+    processed = 0
+    last_id = 0
+    while True:
+        with conn:
+            row = conn.execute(
+                "SELECT MAX(id), COUNT(*) FROM (SELECT id FROM x_bookmarks WHERE id > ? ORDER BY id LIMIT ?)",
+                (last_id, batch_size)
+            ).fetchone()
+            if not row[1]:
+                break
+            conn.execute(
+                "UPDATE x_bookmarks SET urls = urls WHERE id > ? AND id <= ?",
+                (last_id, row[0])
+            )
+        processed += row[1]
+        last_id = row[0]
+    return processed
+
+
+def rebuild_fts(conn: sqlite3.Connection) -> int:
+    """重建全文索引（为已有数据库回填 x_bookmarks_fts），返回索引的书签数"""
+    with conn:
+        conn.execute("INSERT INTO x_bookmarks_fts (x_bookmarks_fts) VALUES ('rebuild')")
+        return conn.execute("SELECT COUNT(*) FROM x_bookmarks").fetchone()[0]
+
+
+def upsert_bookmarks(conn: sqlite3.Connection, rows: list) -> dict:
+    """
+    按 tweet_id 写入一批书签（不提交，由调用方控制事务）
+
+    rows 为含 BOOKMARK_COLUMNS 全部键的字典。
+    返回 {'inserted': 新增, 'updated': 内容有变化, 'unchanged': 已存在且未变}
+    """
+    ids = {row['tweet_id'] for row in rows}
+    existing = set()
+    id_list = list(ids)
+    for i in range(0, len(id_list), 500):
+        chunk = id_list[i:i + 500]
+        existing.update(r[0] for r in conn.execute(
+            f"SELECT tweet_id FROM x_bookmarks WHERE tweet_id IN ({', '.join('?' * len(chunk))})", chunk
+        ))
+    # rowcount 不含触发器的写入，只计 INSERT / DO UPDATE 实际生效的行
+    changed = conn.executemany(UPSERT_SQL, rows).rowcount
+    inserted = len(ids - existing)
+    updated = max(changed - inserted, 0)
+    return {'inserted': inserted, 'updated': updated, 'unchanged': len(rows) - inserted - updated}
+
+
+def encode_raw_json(text: str, compress: bool = False):
+    """原始 JSON -> raw_json 列的值；压缩时存为 zlib BLOB"""
+    if text is None or not compress:
+        return text
+    return zlib.compress(text.encode('utf-8'), 6)
+
+
+def decode_raw_json(value) -> str:
+    """raw_json 列的值（TEXT 或 zlib BLOB）-> JSON 文本"""
+    if isinstance(value, bytes):
+        return zlib.decompress(value).decode('utf-8')
+    return value
+
+
+def load_checkpoint(conn: sqlite3.Connection, source: str) -> dict:
+    """读取同步来源的断点 {'cursor': dict, 'total_synced': int}，没有时返回 None"""
+    row = conn.execute(
+        "SELECT last_cursor, total_synced FROM x_sync_state WHERE source = ?", (source,)
+    ).fetchone()
+    if row is None:
+        return None
+    return {'cursor': json.loads(row[0]) if row[0] else {}, 'total_synced': row[1] or 0}
+
+
+def save_checkpoint(conn: sqlite3.Connection, source: str, cursor: dict, synced: int):
+    """记录断点并累加同步数量（不提交，与数据写入放在同一事务）"""
+    conn.execute(
+        """INSERT INTO x_sync_state (source, last_cursor, last_sync_at, total_synced)
+           VALUES (?, ?, CURRENT_TIMESTAMP, ?)
+           ON CONFLICT(source) DO UPDATE SET
+               last_cursor = excluded.last_cursor,
+               last_sync_at = excluded.last_sync_at,
+               total_synced = x_sync_state.total_synced + excluded.total_synced""",
+        (source, json.dumps(cursor), synced)
+    )
+
+
+def clear_checkpoint(conn: sqlite3.Connection, source: str):
+    with conn:
+        conn.execute("DELETE FROM x_sync_state WHERE source = ?", (source,))
+
+
+def parse_search(text: str) -> list:
+    """
+    解析搜索语法 -> [(kind, term)]，各项之间为 AND
+
+      词语          子串匹配（与 trigram 索引语义一致，中文无需分词）
+      "完整短语"     短语（含空格）整体作为子串匹配
+      前缀*         英文单词前缀：必须出现在单词开头
+    """
+    terms = []
+    for phrase, word in _SEARCH_TOKEN.findall(text or ''):
+        if phrase:
+            terms.append(('phrase', phrase))
+        elif word.endswith('*') and len(word) > 1:
+            terms.append(('prefix', word.rstrip('*')))
+        elif word.strip('"*'):
+            terms.append(('term', word.strip('"*')))
+    return terms
+
+
+def fts_phrase(term: str) -> str:
+    """FTS5 短语查询（转义双引号）"""
+    return '"' + term.replace('"', '""') + '"'
+
+
+def glob_escape(term: str) -> str:
+    """转义 GLOB 通配符"""
+    return re.sub(r'([*?\[])', r'[\1]', term)
+
+
+def normalize_domain(value: str) -> str:
+    """域名或 URL -> 与 x_bookmark_urls.domain 相同形式（小写，无端口、无 www.）"""
+    value = (value or '').strip()
+    if '://' not in value:
+        value = '//' + value
+    host = (urlsplit(value).hostname or '').lower()
+    return host[4:] if host.startswith('www.') else host
+
+
+def is_external_url(url: str) -> bool:
+    """链接是否指向 X / Twitter 以外的站点"""
+    domain = normalize_domain(url)
+    return (bool(domain) and domain not in INTERNAL_DOMAINS
+            and not domain.endswith(('.x.com', '.twitter.com')))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='X 书签数据库维护',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__
+    )
+    parser.add_argument('command', choices=['init', 'backfill-entities', 'rebuild-fts'])
+    parser.add_argument('--db', default=str(DEFAULT_DB_PATH), help='数据库路径')
+    args = parser.parse_args()
+
+    if args.command != 'init' and not os.path.exists(args.db):
+        print(f"错误: 数据库不存在: {args.db}")
+        sys.exit(1)
+
+    conn = connect(args.db)
+    try:
+        if args.command == 'init':
+            result = init_schema(conn)
+            print(f"✅ 书签表已初始化: {args.db}")
+            if result['entities_backfilled']:
+                print(f"   已从 JSON 回填 {result['entities_backfilled']} 条书签的实体子表")
+            if result['fts_indexed']:
+                print(f"   已为 {result['fts_indexed']} 条书签建立全文索引")
+        elif args.command == 'backfill-entities':
+            count = backfill_entities(conn)
+            print(f"✅ 已重建 {count} 条书签的实体子表")
+        elif args.command == 'rebuild-fts':
+            count = rebuild_fts(conn)
+            print(f"✅ 全文索引已重建: {count} 条书签")
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -50,7 +50,8 @@ CREATE TABLE IF NOT EXISTS x_sync_state (
     id INTEGER PRIMARY KEY,
     last_cursor TEXT, -- 最后同步的游标
     last_sync_at DATETIME, -- 最后同步时间
-    total_synced INTEGER DEFAULT 0 -- 总同步数量
+    total_synced INTEGER DEFAULT 0, -- 总同步数量
+    source TEXT -- 同步来源（如 import:/path/dump.jsonl），每个来源一行断点
 );
 
 -- 索引
@@ -58,8 +59,194 @@ CREATE INDEX IF NOT EXISTS idx_x_bookmarks_tweet_id ON x_bookmarks (tweet_id);
 
 CREATE INDEX IF NOT EXISTS idx_x_bookmarks_created ON x_bookmarks (created_at);
 
-CREATE INDEX IF NOT EXISTS idx_x_bookmarks_user ON x_bookmarks (user_screen_name);
+-- (筛选列, created_at) 复合索引：按用户 / 语言筛选并按时间排序、限定时间范围时
+-- 无需回表排序；同时覆盖原先的单列索引
+DROP INDEX IF EXISTS idx_x_bookmarks_user;
+CREATE INDEX IF NOT EXISTS idx_x_bookmarks_user_created ON x_bookmarks (user_screen_name, created_at);
 
-CREATE INDEX IF NOT EXISTS idx_x_bookmarks_lang ON x_bookmarks (lang);
+DROP INDEX IF EXISTS idx_x_bookmarks_lang;
+CREATE INDEX IF NOT EXISTS idx_x_bookmarks_lang_created ON x_bookmarks (lang, created_at);
 
-CREATE INDEX IF NOT EXISTS idx_x_bookmarks_bookmarked ON x_bookmarks (bookmarked_at);
\ No newline at end of file
+CREATE INDEX IF NOT EXISTS idx_x_bookmarks_bookmarked ON x_bookmarks (bookmarked_at);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_x_sync_state_source ON x_sync_state (source);
+
+-- 增量导出的水位线：每个导出配置（profile）已导出的最后一条书签，
+-- 按 (bookmarked_at, id) 排序，下次只导出其后的书签（走 idx_x_bookmarks_bookmarked）
+CREATE TABLE IF NOT EXISTS x_export_watermarks (
+    profile TEXT PRIMARY KEY,
+    bookmarked_at DATETIME, -- 最后导出书签的收藏时间
+    last_id INTEGER NOT NULL DEFAULT 0, -- 最后导出书签的 id（同一收藏时间内的先后）
+    exported_total INTEGER NOT NULL DEFAULT 0, -- 累计导出数量
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+-- 规范化的实体子表：由下方触发器从 urls / media / hashtags / user_mentions JSON 展开，
+-- 导出时直接 JOIN，并支持按域名、话题筛选。
+-- 写入 x_bookmarks 请用 INSERT ... ON CONFLICT(tweet_id) DO UPDATE，
+-- INSERT OR REPLACE 在关闭 recursive_triggers 时不会清理旧行的子表记录。
+
+-- 链接
+CREATE TABLE IF NOT EXISTS x_bookmark_urls (
+    bookmark_id INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    url TEXT NOT NULL, -- expanded_url
+    display_url TEXT,
+    -- 主机部分：去掉协议、路径、查询和片段
+    authority TEXT GENERATED ALWAYS AS (
+        substr(
+            replace(replace(CASE WHEN instr(url, '://') > 0 THEN substr(url, instr(url, '://') + 3) ELSE url END, '?', '/'), '#', '/'),
+            1,
+            instr(replace(replace(CASE WHEN instr(url, '://') > 0 THEN substr(url, instr(url, '://') + 3) ELSE url END, '?', '/'), '#', '/') || '/', '/') - 1
+        )
+    ) VIRTUAL,
+    -- 小写域名，去掉端口和 www. 前缀
+    domain TEXT GENERATED ALWAYS AS (
+        lower(substr(
+            authority,
+            CASE WHEN authority LIKE 'www.%' THEN 5 ELSE 1 END,
+            instr(authority || ':', ':') - CASE WHEN authority LIKE 'www.%' THEN 5 ELSE 1 END
+        ))
+    ) STORED,
+    -- 指向 X / Twitter 自身以外的链接
+    is_external INTEGER GENERATED ALWAYS AS (
+        domain <> ''
+        AND domain NOT IN ('x.com', 'twitter.com', 't.co')
+        AND domain NOT LIKE '%.x.com'
+        AND domain NOT LIKE '%.twitter.com'
+    ) STORED,
+    PRIMARY KEY (bookmark_id, position)
+);
+
+-- 媒体
+CREATE TABLE IF NOT EXISTS x_bookmark_media (
+    bookmark_id INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    type TEXT,
+    url TEXT,
+    PRIMARY KEY (bookmark_id, position)
+);
+
+-- 话题
+CREATE TABLE IF NOT EXISTS x_bookmark_hashtags (
+    bookmark_id INTEGER NOT NULL,
+    tag TEXT NOT NULL COLLATE NOCASE,
+    PRIMARY KEY (bookmark_id, tag)
+);
+
+-- 提及的用户
+CREATE TABLE IF NOT EXISTS x_bookmark_mentions (
+    bookmark_id INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    screen_name TEXT NOT NULL COLLATE NOCASE,
+    name TEXT,
+    PRIMARY KEY (bookmark_id, position)
+);
+
+CREATE INDEX IF NOT EXISTS idx_x_bookmark_urls_domain ON x_bookmark_urls (domain, bookmark_id);
+
+CREATE INDEX IF NOT EXISTS idx_x_bookmark_hashtags_tag ON x_bookmark_hashtags (tag, bookmark_id);
+
+CREATE INDEX IF NOT EXISTS idx_x_bookmark_mentions_user ON x_bookmark_mentions (screen_name, bookmark_id);
+
+-- 实体同步触发器（JSON 无效时按空数组处理；元素既可以是对象也可以是字符串）
+CREATE TRIGGER IF NOT EXISTS x_bookmarks_entities_ai AFTER INSERT ON x_bookmarks BEGIN
+    INSERT INTO x_bookmark_urls (bookmark_id, position, url, display_url)
+        SELECT NEW.id, key, url, display_url FROM (
+            SELECT key,
+                   CASE type WHEN 'object' THEN coalesce(json_extract(value, '$.expanded_url'), json_extract(value, '$.url'))
+                             WHEN 'text' THEN value END AS url,
+                   CASE type WHEN 'object' THEN json_extract(value, '$.display_url') END AS display_url
+            FROM json_each(CASE WHEN json_valid(NEW.urls) THEN NEW.urls END)
+        ) WHERE url IS NOT NULL;
+    INSERT INTO x_bookmark_media (bookmark_id, position, type, url)
+        SELECT NEW.id, key, json_extract(value, '$.type'),
+               coalesce(json_extract(value, '$.media_url_https'), json_extract(value, '$.url'), json_extract(value, '$.media_url'))
+        FROM json_each(CASE WHEN json_valid(NEW.media) THEN NEW.media END)
+        WHERE type = 'object';
+    INSERT OR IGNORE INTO x_bookmark_hashtags (bookmark_id, tag)
+        SELECT NEW.id, tag FROM (
+            SELECT ltrim(CASE type WHEN 'object' THEN json_extract(value, '$.text')
+                                   WHEN 'text' THEN value END, '#') AS tag
+            FROM json_each(CASE WHEN json_valid(NEW.hashtags) THEN NEW.hashtags END)
+        ) WHERE tag <> '';
+    INSERT INTO x_bookmark_mentions (bookmark_id, position, screen_name, name)
+        SELECT NEW.id, key, screen_name, name FROM (
+            SELECT key,
+                   CASE type WHEN 'object' THEN json_extract(value, '$.screen_name')
+                             WHEN 'text' THEN ltrim(value, '@') END AS screen_name,
+                   CASE type WHEN 'object' THEN json_extract(value, '$.name') END AS name
+            FROM json_each(CASE WHEN json_valid(NEW.user_mentions) THEN NEW.user_mentions END)
+        ) WHERE screen_name <> '';
+END;
+
+CREATE TRIGGER IF NOT EXISTS x_bookmarks_entities_au AFTER UPDATE OF urls, media, hashtags, user_mentions ON x_bookmarks BEGIN
+    DELETE FROM x_bookmark_urls WHERE bookmark_id = OLD.id;
+    DELETE FROM x_bookmark_media WHERE bookmark_id = OLD.id;
+    DELETE FROM x_bookmark_hashtags WHERE bookmark_id = OLD.id;
+    DELETE FROM x_bookmark_mentions WHERE bookmark_id = OLD.id;
+    INSERT INTO x_bookmark_urls (bookmark_id, position, url, display_url)
+        SELECT NEW.id, key, url, display_url FROM (
+            SELECT key,
+                   CASE type WHEN 'object' THEN coalesce(json_extract(value, '$.expanded_url'), json_extract(value, '$.url'))
+                             WHEN 'text' THEN value END AS url,
+                   CASE type WHEN 'object' THEN json_extract(value, '$.display_url') END AS display_url
+            FROM json_each(CASE WHEN json_valid(NEW.urls) THEN NEW.urls END)
+        ) WHERE url IS NOT NULL;
+    INSERT INTO x_bookmark_media (bookmark_id, position, type, url)
+        SELECT NEW.id, key, json_extract(value, '$.type'),
+               coalesce(json_extract(value, '$.media_url_https'), json_extract(value, '$.url'), json_extract(value, '$.media_url'))
+        FROM json_each(CASE WHEN json_valid(NEW.media) THEN NEW.media END)
+        WHERE type = 'object';
+    INSERT OR IGNORE INTO x_bookmark_hashtags (bookmark_id, tag)
+        SELECT NEW.id, tag FROM (
+            SELECT ltrim(CASE type WHEN 'object' THEN json_extract(value, '$.text')
+                                   WHEN 'text' THEN value END, '#') AS tag
+            FROM json_each(CASE WHEN json_valid(NEW.hashtags) THEN NEW.hashtags END)
+        ) WHERE tag <> '';
+    INSERT INTO x_bookmark_mentions (bookmark_id, position, screen_name, name)
+        SELECT NEW.id, key, screen_name, name FROM (
+            SELECT key,
+                   CASE type WHEN 'object' THEN json_extract(value, '$.screen_name')
+                             WHEN 'text' THEN ltrim(value, '@') END AS screen_name,
+                   CASE type WHEN 'object' THEN json_extract(value, '$.name') END AS name
+            FROM json_each(CASE WHEN json_valid(NEW.user_mentions) THEN NEW.user_mentions END)
+        ) WHERE screen_name <> '';
+END;
+
+CREATE TRIGGER IF NOT EXISTS x_bookmarks_entities_ad AFTER DELETE ON x_bookmarks BEGIN
+    DELETE FROM x_bookmark_urls WHERE bookmark_id = OLD.id;
+    DELETE FROM x_bookmark_media WHERE bookmark_id = OLD.id;
+    DELETE FROM x_bookmark_hashtags WHERE bookmark_id = OLD.id;
+    DELETE FROM x_bookmark_mentions WHERE bookmark_id = OLD.id;
+END;
+
+-- 全文索引 (FTS5, trigram 分词以支持中文子串检索; 需要 SQLite 3.34+)
+CREATE VIRTUAL TABLE IF NOT EXISTS x_bookmarks_fts USING fts5(
+    full_text,
+    user_name,
+    user_screen_name,
+    content='x_bookmarks',
+    content_rowid='id',
+    tokenize='trigram'
+);
+
+CREATE TRIGGER IF NOT EXISTS x_bookmarks_fts_ai AFTER INSERT ON x_bookmarks BEGIN
+    INSERT INTO x_bookmarks_fts (rowid, full_text, user_name, user_screen_name)
+    VALUES (new.id, new.full_text, new.user_name, new.user_screen_name);
+END;
+
+CREATE TRIGGER IF NOT EXISTS x_bookmarks_fts_ad AFTER DELETE ON x_bookmarks BEGIN
+    INSERT INTO x_bookmarks_fts (x_bookmarks_fts, rowid, full_text, user_name, user_screen_name)
+    VALUES ('delete', old.id, old.full_text, old.user_name, old.user_screen_name);
+END;
+
+CREATE TRIGGER IF NOT EXISTS x_bookmarks_fts_au AFTER UPDATE OF full_text, user_name, user_screen_name ON x_bookmarks
+WHEN old.full_text IS NOT new.full_text OR old.user_name IS NOT new.user_name
+     OR old.user_screen_name IS NOT new.user_screen_name
+BEGIN
+    INSERT INTO x_bookmarks_fts (x_bookmarks_fts, rowid, full_text, user_name, user_screen_name)
+    VALUES ('delete', old.id, old.full_text, old.user_name, old.user_screen_name);
+    INSERT INTO x_bookmarks_fts (rowid, full_text, user_name, user_screen_name)
+    VALUES (new.id, new.full_text, new.user_name, new.user_screen_name);
+END;
@@ -2,6 +2,8 @@
 """
 AgentNote Skill: save_doc
 Save Markdown documents to knowledge base
+
+Batch mode: pipe JSONL (one document per line) with --jsonl
 """
 
 import sys
@@ -10,7 +12,24 @@ from pathlib import Path
 
 # Add utils to path
 sys.path.insert(0, str(Path(__file__).parent.parent.parent / "utils"))
-from db import add_document, init_database, DB_PATH
+from db import add_document, import_jsonl, init_database, DB_PATH
+
+
+def save_jsonl(stream, allow_duplicates=False):
+    """Stream JSONL documents into the database, one result line per row"""
+    saved = failed = 0
+    for result in import_jsonl(stream, skip_duplicates=not allow_duplicates):
+        if result["success"]:
+            saved += 1
+        else:
+            failed += 1
+        print(json.dumps(result, ensure_ascii=False), flush=True)
+
+    print(json.dumps({
+        "success": failed == 0,
+        "saved": saved,
+        "failed": failed
+    }, ensure_ascii=False))
 
 
 def main():
@@ -18,9 +37,18 @@ def main():
     if not DB_PATH.exists():
         init_database()
 
+    # Exact duplicates (same content as an existing document) are skipped unless asked
+    args = sys.argv[1:]
+    allow_duplicates = "--allow-duplicates" in args
+    args = [a for a in args if a != "--allow-duplicates"]
+
+    if args and args[0] == "--jsonl":
+        save_jsonl(sys.stdin, allow_duplicates)
+        return
+
     # Read input
-    if len(sys.argv) > 1:
-        input_data = sys.argv[1]
+    if args:
+        input_data = args[0]
     else:
         input_data = sys.stdin.read().strip()
 
@@ -56,9 +84,20 @@ def main():
             category=data.get("category"),
             tags=data.get("tags", []),
             summary=data.get("summary"),
-            source=data.get("source", "chat")
+            source=data.get("source", "chat"),
+            skip_duplicates=not allow_duplicates
         )
 
+        if result.get("duplicate"):
+            print(json.dumps({
+                "success": True,
+                "duplicate": True,
+                "id": result["id"],
+                "slug": result["slug"],
+                "message": f"Duplicate of existing document, not saved: {result['title']}"
+            }, ensure_ascii=False))
+            return
+
         print(json.dumps({
             "success": True,
             "id": result["id"],
@@ -6,37 +6,668 @@ Markdown 文档知识库数据库工具
 
 import sqlite3
 import re
+import os
 import json
+import queue
+import base64
+import hashlib
+import copy
+import functools
+import zlib
+import atexit
+import threading
+import time
+from collections import Counter, OrderedDict
 from pathlib import Path
 from datetime import datetime
 from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import zstandard  # 可选: 启用 zstd 压缩
+except ImportError:
+    zstandard = None
+
+import metrics
+from render import RENDERER_VERSION, render_markdown, render_document
 
 # 数据库路径
 DB_DIR = Path(__file__).parent.parent / "data"
 DB_PATH = DB_DIR / "agentnote.db"
 SCHEMA_PATH = Path(__file__).parent.parent / "schema.sql"
 
+# 连接池配置
+POOL_SIZE = 8                      # 每个数据库文件最多保持的连接数
+POOL_TIMEOUT = 30                  # 连接池耗尽时最长等待秒数
+BUSY_TIMEOUT_MS = 5000             # 遇到写锁时的重试时间
+MMAP_SIZE = 256 * 1024 * 1024      # 内存映射读取上限 (256 MiB)
+CACHE_SIZE_KIB = 64 * 1024         # 每个连接的页缓存 (64 MiB)
+
+# 每个连接创建时只执行一次的 PRAGMA
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}",
+    f"PRAGMA mmap_size = {MMAP_SIZE}",
+    f"PRAGMA cache_size = -{CACHE_SIZE_KIB}",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA foreign_keys = ON",
+)
+
+# 只读连接：journal_mode 由写连接设置（WAL 是持久的），这里只做调优并禁止写入
+READ_CONNECTION_PRAGMAS = (
+    f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}",
+    f"PRAGMA mmap_size = {MMAP_SIZE}",
+    f"PRAGMA cache_size = -{CACHE_SIZE_KIB}",
+    "PRAGMA query_only = ON",
+)
+
+# 全文检索配置
+FTS_MIN_CHARS = 3                  # trigram 分词器能索引的最短关键词
+FTS_WEIGHTS = "10.0, 1.0, 5.0"     # bm25 列权重: title, content, summary
+SNIPPET_TOKENS = 24                # 搜索结果高亮片段的 token 数（trigram 下约等于字符数）
+
+# 列表查询的字段投影: card 为列表视图默认字段（不含 content）
+DOCUMENT_FIELDS = ('id', 'slug', 'title', 'content', 'category', 'summary',
+                   'source', 'created_at', 'updated_at')
+PROJECTIONS = {
+    'card': ('id', 'slug', 'title', 'category', 'summary', 'created_at', 'tags'),
+    'full': DOCUMENT_FIELDS + ('tags',),
+}
+
+# 毫秒精度的 UTC 时间戳，updated_at 用它作为文档 ETag 的版本号
+TIMESTAMP_SQL = "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+
+# 查询结果缓存配置
+QUERY_CACHE_ENABLED = True
+QUERY_CACHE_MAX_ENTRIES = 256      # LRU 上限
+QUERY_CACHE_TTL = 300              # 秒；data_version 之外的兜底过期时间
+
+# 批量渲染时每个工作进程一次处理的文档数
+RENDER_BATCH_SIZE = 50
+
+# 正文压缩配置（db.py compress 开启，之后新写入的大正文也会压缩）
+COMPRESS_MIN_BYTES = 4096          # 小于该字节数的正文保持明文
+COMPRESS_DICT_SIZE = 32 * 1024     # 训练字典大小（zlib 预设字典最多用到 32 KiB）
+COMPRESS_SAMPLE_DOCS = 2000        # 训练字典时抽样的文档数
+ZLIB_LEVEL = 9
+ZSTD_LEVEL = 19
+
+# 读取正文的 SQL 表达式：按 content_format 透明解压
+CONTENT_SQL = "agentnote_text(d.content, d.content_format, d.content_dict_id)"
+
+# 批量写入配置
+BULK_CHUNK_SIZE = 500              # 每个事务写入的文档数
+MAX_SQL_PARAMS = 900               # IN (...) 参数上限（兼容旧版 SQLite 的 999 限制）
+
 
 def ensure_db_dir():
     """确保数据目录存在"""
     DB_DIR.mkdir(parents=True, exist_ok=True)
 
 
-@contextmanager
-def get_connection():
-    """获取数据库连接的上下文管理器"""
-    ensure_db_dir()
-    conn = sqlite3.connect(DB_PATH)
+def set_database_path(db_path):
+    """切换数据库文件（供 --db 参数使用）"""
+    global DB_DIR, DB_PATH
+    DB_PATH = Path(db_path).resolve()
+    DB_DIR = DB_PATH.parent
+
+
+def compress_content(algorithm: str, data: bytes, zdict: bytes = None) -> bytes:
+    """用 zlib（raw deflate）或 zstd 压缩，可带预设字典"""
+    if algorithm == 'zstd':
+        dict_data = zstandard.ZstdCompressionDict(zdict) if zdict else None
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL, dict_data=dict_data).compress(data)
+    compressor = zlib.compressobj(ZLIB_LEVEL, zlib.DEFLATED, -15, zdict=zdict or b'')
+    return compressor.compress(data) + compressor.flush()
+
+
+def decompress_content(algorithm: str, data: bytes, zdict: bytes = None) -> bytes:
+    if algorithm == 'zstd':
+        if zstandard is None:
+            raise RuntimeError("zstd-compressed content requires: pip install zstandard")
+        dict_data = zstandard.ZstdCompressionDict(zdict) if zdict else None
+        return zstandard.ZstdDecompressor(dict_data=dict_data).decompress(data)
+    decompressor = zlib.decompressobj(-15, zdict=zdict or b'')
+    return decompressor.decompress(data) + decompressor.flush()
+
+
+class AgentNoteConnection(sqlite3.Connection):
+    """注册了 agentnote_text() 的连接，并按 id 缓存压缩字典（字典行只增不改）"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.dictionaries = {}
+        self.create_function('agentnote_text', 3, self.decode_text, deterministic=True)
+
+    def dictionary(self, dict_id: int) -> bytes:
+        if dict_id not in self.dictionaries:
+            row = self.execute(
+                "SELECT dict FROM compression_dicts WHERE id = ?", (dict_id,)
+            ).fetchone()
+            if row is None:
+                raise ValueError(f"unknown compression dictionary: {dict_id}")
+            self.dictionaries[dict_id] = row[0]
+        return self.dictionaries[dict_id]
+
+    def decode_text(self, content, content_format, dict_id):
+        """agentnote_text(content, content_format, content_dict_id)：返回明文正文"""
+        if content is None or content_format in (None, 'plain'):
+            return content
+        zdict = self.dictionary(dict_id) if dict_id is not None else None
+        return decompress_content(content_format, content, zdict).decode('utf-8')
+
+
+def open_connection(db_path, readonly: bool = False) -> sqlite3.Connection:
+    """打开并调优一个新连接；readonly 时以 mode=ro 打开"""
+    if readonly:
+        uri = Path(db_path).resolve().as_uri() + "?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False,
+                               factory=AgentNoteConnection)
+        pragmas = READ_CONNECTION_PRAGMAS
+    else:
+        conn = sqlite3.connect(str(db_path), check_same_thread=False,
+                               factory=AgentNoteConnection)
+        pragmas = CONNECTION_PRAGMAS
     conn.row_factory = sqlite3.Row
-    conn.execute("PRAGMA foreign_keys = ON")
+    for pragma in pragmas:
+        conn.execute(pragma)
+    return conn
+
+
+def encode_content(conn, content: str) -> tuple:
+    """按当前启用的压缩字典编码正文，返回 (存储值, content_format, content_dict_id)
+
+    未开启压缩、正文小于阈值或压缩后没有变小时原样存储。
+    """
+    codec = conn.execute(
+        "SELECT id, algorithm, min_size FROM compression_dicts WHERE active = 1"
+    ).fetchone()
+    if codec is None:
+        return content, 'plain', None
+    data = content.encode('utf-8')
+    dict_id, algorithm, min_size = codec[0], codec[1], codec[2]
+    if len(data) < min_size or (algorithm == 'zstd' and zstandard is None):
+        return content, 'plain', None
+    blob = compress_content(algorithm, data, conn.dictionary(dict_id))
+    if len(blob) >= len(data):
+        return content, 'plain', None
+    return blob, algorithm, dict_id
+
+
+class ConnectionPool:
+    """有界只读连接池：连接在进程内长期复用，PRAGMA 只在创建时执行一次
+
+    WAL 模式下读连接读取快照，不会被写事务阻塞，也不会阻塞写入。
+    """
+
+    def __init__(self, db_path, size: int = POOL_SIZE, timeout: float = POOL_TIMEOUT,
+                 readonly: bool = True):
+        self.db_path = Path(db_path)
+        self.size = size
+        self.timeout = timeout
+        self.readonly = readonly
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._opened = 0
+        self._pid = os.getpid()
+        self.hits = 0           # 直接复用空闲连接
+        self.misses = 0         # 新建连接
+        self.waits = 0          # 池耗尽后等待归还
+        self.wait_time = 0.0    # 累计等待秒数
+
+    def _check_fork(self):
+        """fork 出的子进程不能复用父进程的连接，直接丢弃"""
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._idle = queue.LifoQueue()
+                    self._opened = 0
+                    self._pid = os.getpid()
+
+    def acquire(self) -> sqlite3.Connection:
+        """借出一个连接，池满时阻塞等待"""
+        self._check_fork()
+        try:
+            conn = self._idle.get_nowait()
+            with self._lock:
+                self.hits += 1
+            return conn
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            can_open = self._opened < self.size
+            if can_open:
+                self._opened += 1
+                self.misses += 1
+
+        if can_open:
+            try:
+                return open_connection(self.db_path, readonly=self.readonly)
+            except Exception:
+                with self._lock:
+                    self._opened -= 1
+                raise
+
+        start = time.perf_counter()
+        try:
+            conn = self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise sqlite3.OperationalError(
+                f"connection pool exhausted after {self.timeout}s: {self.db_path}"
+            )
+        with self._lock:
+            self.waits += 1
+            self.wait_time += time.perf_counter() - start
+        return conn
+
+    def release(self, conn: sqlite3.Connection):
+        """归还连接；已损坏的连接关闭后丢弃"""
+        if self._pid != os.getpid():
+            return
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+            with self._lock:
+                self._opened -= 1
+            return
+        self._idle.put(conn)
+
+    def resize(self, size: int):
+        """调整容量；缩小时已打开的连接不会被关闭"""
+        with self._lock:
+            self.size = size
+
+    def close_all(self):
+        """关闭所有空闲连接"""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._opened -= 1
+
+    def stats(self) -> dict:
+        """连接池计数器"""
+        with self._lock:
+            return {
+                'db_path': str(self.db_path),
+                'size': self.size,
+                'open': self._opened,
+                'idle': self._idle.qsize(),
+                'hits': self.hits,
+                'misses': self.misses,
+                'waits': self.waits,
+                'wait_time': round(self.wait_time, 6),
+            }
+
+
+class WriterConnection:
+    """单一写连接：进程内所有写事务在锁上排队，而不是在 SQLite 里争抢写锁
+
+    同一线程内可以嵌套使用，只有最外层提交或回滚。记录锁竞争：
+    waits / wait_time 为等待其他写事务的次数与秒数，busy_errors 为
+    SQLite 返回 "database is locked"（通常是其他进程在写）的次数。
+    """
+
+    def __init__(self, db_path):
+        self.db_path = Path(db_path)
+        self._lock = threading.RLock()
+        self._conn = None
+        self._depth = 0
+        self._pid = os.getpid()
+        self.transactions = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self.max_wait = 0.0
+        self.busy_errors = 0
+        self.hold_time = 0.0    # 累计持有写锁的秒数
+
+    def _check_fork(self):
+        """fork 出的子进程重新创建锁与连接"""
+        if self._pid != os.getpid():
+            self._lock = threading.RLock()
+            self._conn = None
+            self._depth = 0
+            self._pid = os.getpid()
+
+    def connect(self) -> sqlite3.Connection:
+        """返回写连接，首次调用时打开（需在持有锁时调用，或仅用于初始化）"""
+        if self._conn is None:
+            self._conn = open_connection(self.db_path)
+        return self._conn
+
+    def _acquire(self, blocking: bool):
+        if self._lock.acquire(blocking=False):
+            return
+        if not blocking:
+            self.busy_errors += 1
+            raise sqlite3.OperationalError(f"writer busy: {self.db_path}")
+        start = time.perf_counter()
+        self._lock.acquire()
+        waited = time.perf_counter() - start
+        self.waits += 1
+        self.wait_time += waited
+        self.max_wait = max(self.max_wait, waited)
+
+    @contextmanager
+    def transaction(self, blocking: bool = True):
+        """持有写锁执行一个事务；blocking=False 时写锁被占用立即失败"""
+        self._check_fork()
+        self._acquire(blocking)
+        start = time.perf_counter()
+        self._depth += 1
+        try:
+            conn = self.connect()
+            if self._depth > 1:
+                yield conn
+                return
+            if not blocking:
+                conn.execute("PRAGMA busy_timeout = 0")
+            try:
+                yield conn
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                if isinstance(e, sqlite3.OperationalError) and 'locked' in str(e):
+                    self.busy_errors += 1
+                raise
+            finally:
+                if not blocking:
+                    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+        finally:
+            self._depth -= 1
+            if self._depth == 0:
+                self.transactions += 1
+                self.hold_time += time.perf_counter() - start
+            self._lock.release()
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None and self._pid == os.getpid():
+                self._conn.close()
+            self._conn = None
+
+    def stats(self) -> dict:
+        """写锁竞争计数器"""
+        with self._lock:
+            return {
+                'db_path': str(self.db_path),
+                'transactions': self.transactions,
+                'waits': self.waits,
+                'wait_time': round(self.wait_time, 6),
+                'max_wait': round(self.max_wait, 6),
+                'busy_errors': self.busy_errors,
+                'hold_time': round(self.hold_time, 6),
+            }
+
+
+_pools = {}
+_writers = {}
+_pools_lock = threading.Lock()
+
+
+def get_writer() -> WriterConnection:
+    """获取当前 DB_PATH 对应的写连接"""
+    key = str(DB_PATH)
+    writer = _writers.get(key)
+    if writer is None:
+        with _pools_lock:
+            writer = _writers.get(key)
+            if writer is None:
+                ensure_db_dir()
+                writer = _writers[key] = WriterConnection(DB_PATH)
+    return writer
+
+
+def get_pool() -> ConnectionPool:
+    """获取当前 DB_PATH 对应的只读连接池"""
+    key = str(DB_PATH)
+    pool = _pools.get(key)
+    if pool is None:
+        # 只读连接无法创建数据库文件或切换 WAL，先由写连接完成
+        writer = get_writer()
+        with writer.transaction():
+            pass
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = _pools[key] = ConnectionPool(DB_PATH, size=POOL_SIZE)
+    return pool
+
+
+def set_pool_size(size: int):
+    """设置只读连接池容量，已经创建的连接池（如 init_database 用过的）一并调整"""
+    global POOL_SIZE
+    POOL_SIZE = size
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.resize(size)
+
+
+def warm_pool(connections: int = None) -> int:
+    """预先打开只读连接（最多到池容量），返回池中已打开的连接数"""
+    pool = get_pool()
+    count = min(connections or pool.size, pool.size)
+    conns = [pool.acquire() for _ in range(count)]
+    for conn in conns:
+        pool.release(conn)
+    return pool.stats()['open']
+
+
+def get_pool_stats() -> list:
+    """所有只读连接池的计数器"""
+    return [pool.stats() for pool in list(_pools.values())]
+
+
+def get_writer_stats() -> list:
+    """所有写连接的锁竞争计数器"""
+    return [writer.stats() for writer in list(_writers.values())]
+
+
+def close_connections():
+    """关闭所有连接池中的空闲连接与写连接"""
+    for pool in list(_pools.values()):
+        pool.close_all()
+    for writer in list(_writers.values()):
+        writer.close()
+
+
+atexit.register(close_connections)
+
+
+class QueryCache:
+    """进程内查询结果缓存
+
+    以一个只读的"观察"连接上的 PRAGMA data_version 作为版本号：任何其他连接
+    （本进程的连接池或 scripts/save-doc.py 这类外部写入者）提交后版本号都会变化，
+    缓存随之失效。条目数有上限（LRU），并带 TTL 兜底。
+    """
+
+    def __init__(self, max_entries: int = QUERY_CACHE_MAX_ENTRIES,
+                 ttl: float = QUERY_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()   # key -> (version, expires_at, value)
+        self._watchers = {}             # db_path -> (pid, connection)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0          # 因数据变化或过期而丢弃
+        self.evictions = 0              # 因超出容量而丢弃
+
+    def data_version(self, db_path: str) -> int:
+        """观察连接看到的数据版本号（需在持有 _lock 时调用）"""
+        watcher = self._watchers.get(db_path)
+        if watcher is None or watcher[0] != os.getpid():
+            watcher = (os.getpid(), sqlite3.connect(db_path, check_same_thread=False))
+            self._watchers[db_path] = watcher
+        return watcher[1].execute("PRAGMA data_version").fetchone()[0]
+
+    def get_or_compute(self, key, compute):
+        db_path = key[0]
+        with self._lock:
+            version = self.data_version(db_path)
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] == version and entry[1] > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return copy.deepcopy(entry[2])
+                del self._entries[key]
+                self.invalidations += 1
+            self.misses += 1
+
+        value = compute()
+
+        with self._lock:
+            self._entries[key] = (version, time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return copy.deepcopy(value)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'invalidations': self.invalidations,
+                'evictions': self.evictions,
+            }
+
+
+query_cache = QueryCache()
+
+
+def cached_query(func):
+    """缓存只读查询函数的结果，写入后自动失效"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not QUERY_CACHE_ENABLED:
+            return func(*args, **kwargs)
+        key = (str(DB_PATH), func.__name__, args, tuple(sorted(kwargs.items())))
+        try:
+            hash(key)
+        except TypeError:
+            # 参数不可哈希（如列表）时不缓存，直接查询
+            return func(*args, **kwargs)
+        ensure_db_dir()
+        return query_cache.get_or_compute(key, lambda: func(*args, **kwargs))
+    return wrapper
+
+
+def get_cache_stats() -> dict:
+    """查询结果缓存的命中率等计数器"""
+    return query_cache.stats()
+
+
+@contextmanager
+def get_connection(blocking: bool = True):
+    """写连接的上下文管理器：独占写锁，正常退出时提交，异常时回滚"""
+    with get_writer().transaction(blocking=blocking) as conn:
+        if metrics.ENABLED:
+            with metrics.query_span(conn):
+                yield conn
+        else:
+            yield conn
+
+
+@contextmanager
+def get_read_connection():
+    """从只读连接池借用连接的上下文管理器（用于所有查询）"""
+    pool = get_pool()
+    conn = pool.acquire()
     try:
-        yield conn
-        conn.commit()
-    except Exception as e:
-        conn.rollback()
-        raise e
+        if metrics.ENABLED:
+            with metrics.query_span(conn):
+                yield conn
+        else:
+            yield conn
     finally:
-        conn.close()
+        pool.release(conn)
+
+
+# 后加的列: (表, 列, 定义)。CREATE TABLE IF NOT EXISTS 不会给已有的表加列，
+# 所以在执行 schema.sql 之前用 ALTER TABLE 补齐
+MIGRATION_COLUMNS = (
+    ('documents', 'content_hash', 'TEXT'),
+    ('documents', 'content_format', "TEXT NOT NULL DEFAULT 'plain'"),
+    ('documents', 'content_dict_id', 'INTEGER'),
+)
+
+# 按 content_format 区分明文行的触发器，旧版本的定义由 schema.sql 重建
+_FORMAT_AWARE_TRIGGERS = ('documents_fts_ai', 'documents_fts_ad', 'documents_fts_au',
+                          'document_renders_au')
+
+
+def _apply_migrations(conn) -> bool:
+    """升级旧数据库的结构，返回全文索引是否需要重建
+
+    - 补齐 MIGRATION_COLUMNS 中缺少的列
+    - 删除不区分压缩行、或调用 agentnote_text() 的旧触发器
+    - 曾建在解压视图 documents_text 上的 documents_fts 删除后重建
+    - 还没有 documents_fts 的旧库，由 schema.sql 建出的空索引需要回填
+    """
+    for table, column, definition in MIGRATION_COLUMNS:
+        columns = {row['name'] for row in conn.execute(f"PRAGMA table_info({table})")}
+        if columns and column not in columns:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+    placeholders = ", ".join("?" * len(_FORMAT_AWARE_TRIGGERS))
+    for row in conn.execute(
+        f"SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND name IN ({placeholders})",
+        _FORMAT_AWARE_TRIGGERS
+    ).fetchall():
+        if 'content_format' not in row['sql'] or 'agentnote_text' in row['sql']:
+            conn.execute(f"DROP TRIGGER {row['name']}")
+
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'documents_text'").fetchone():
+        conn.execute("DROP VIEW documents_text")
+        conn.execute("DROP TABLE IF EXISTS documents_fts")
+        return True
+
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'documents_fts'").fetchone():
+        return False
+    has_documents = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'documents'"
+    ).fetchone()
+    return bool(has_documents) and conn.execute(
+        "SELECT EXISTS (SELECT 1 FROM documents)"
+    ).fetchone()[0] == 1
+
+
+def backfill_content_hashes(conn, batch_size: int = BULK_CHUNK_SIZE) -> int:
+    """为 content_hash 为空的文档（旧数据或外部写入）计算哈希，返回处理数量"""
+    filled = 0
+    while True:
+        rows = conn.execute(
+            f"SELECT d.id, {CONTENT_SQL} AS content FROM documents d WHERE d.content_hash IS NULL LIMIT ?",
+            (batch_size,)
+        ).fetchall()
+        if not rows:
+            return filled
+        conn.executemany(
+            "UPDATE documents SET content_hash = ? WHERE id = ?",
+            [(content_hash(row['content']), row['id']) for row in rows]
+        )
+        filled += len(rows)
 
 
 def init_database():
@@ -47,7 +678,20 @@ def init_database():
         schema_sql = f.read()
 
     with get_connection() as conn:
+        rebuild_fts = _apply_migrations(conn)
         conn.executescript(schema_sql)
+        if rebuild_fts:
+            rebuild_fts_index(conn)
+        backfill_content_hashes(conn)
+        # 计数表是后加的：旧库首次升级时回填
+        needs_backfill = conn.execute(
+            """SELECT EXISTS (SELECT 1 FROM documents)
+                      AND NOT EXISTS (SELECT 1 FROM category_counts)
+                      AND NOT EXISTS (SELECT 1 FROM tag_counts)"""
+        ).fetchone()[0]
+
+    if needs_backfill:
+        rebuild_counters()
 
     print(f"✅ 数据库初始化完成: {DB_PATH}")
     return True
@@ -78,48 +722,165 @@ def generate_slug(title: str) -> str:
     return f"{slug}-{timestamp}" if slug else timestamp
 
 
+def generate_summary(content: str) -> str:
+    """从内容提取前100字作为摘要"""
+    # 去除 markdown 标记提取纯文本摘要
+    plain = re.sub(r'[#*`\[\]()>-]', '', content)
+    return plain[:100].strip() + ('...' if len(plain) > 100 else '')
+
+
+def content_hash(content: str) -> str:
+    """正文的 sha256（十六进制）"""
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def find_duplicate(content: str = None, digest: str = None, conn=None) -> dict:
+    """按 content_hash 查找正文完全相同的文档，返回 {'id', 'slug', 'title'} 或 None"""
+    digest = digest or content_hash(content)
+    sql = "SELECT id, slug, title FROM documents WHERE content_hash = ? ORDER BY id LIMIT 1"
+    if conn is not None:
+        return row_to_dict(conn.execute(sql, (digest,)).fetchone())
+    with get_read_connection() as conn:
+        return row_to_dict(conn.execute(sql, (digest,)).fetchone())
+
+
+def clean_tags(tags) -> list:
+    """标签统一小写，去除空白与重复标签，保持原有顺序"""
+    seen = {}
+    for tag_name in tags or []:
+        tag_name = tag_name.strip().lower()
+        if tag_name:
+            seen.setdefault(tag_name, None)
+    return list(seen)
+
+
+def chunked(items, size: int):
+    """把可迭代对象按 size 切分为列表"""
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def resolve_tag_ids(conn, names) -> dict:
+    """一次性获取或创建多个标签，返回 {标签名: id}"""
+    names = list(dict.fromkeys(names))
+    if not names:
+        return {}
+    conn.executemany(
+        "INSERT OR IGNORE INTO tags (name) VALUES (?)",
+        [(name,) for name in names]
+    )
+    tag_ids = {}
+    for batch in chunked(names, MAX_SQL_PARAMS):
+        placeholders = ", ".join("?" * len(batch))
+        rows = conn.execute(
+            f"SELECT id, name FROM tags WHERE name IN ({placeholders})", batch
+        ).fetchall()
+        tag_ids.update((row['name'], row['id']) for row in rows)
+    return tag_ids
+
+
+_STORE_RENDER_SQL = """
+    INSERT OR REPLACE INTO document_renders
+        (document_id, renderer_version, content_html, outline, rendered_at)
+    VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+"""
+
+
+def store_render(conn, doc_id: int, title: str, content: str) -> dict:
+    """渲染文档并写入 document_renders，返回 {'html', 'outline'}"""
+    result = render_markdown(content, title=title)
+    conn.execute(
+        _STORE_RENDER_SQL,
+        (doc_id, RENDERER_VERSION, result['html'],
+         json.dumps(result['outline'], ensure_ascii=False))
+    )
+    return result
+
+
+# 压缩行的全文索引条目（明文行由 schema.sql 的触发器维护）
+_FTS_INSERT_SQL = "INSERT INTO documents_fts (rowid, title, content, summary) VALUES (?, ?, ?, ?)"
+_FTS_DELETE_SQL = """INSERT INTO documents_fts (documents_fts, rowid, title, content, summary)
+                     VALUES ('delete', ?, ?, ?, ?)"""
+
+
+def index_entry(conn, doc_id: int):
+    """文档的全文索引内容 (title, 明文 content, summary, content_format)，不存在时返回 None"""
+    row = conn.execute(
+        f"""SELECT d.title, {CONTENT_SQL} AS content, d.summary, d.content_format
+            FROM documents d WHERE d.id = ?""",
+        (doc_id,)
+    ).fetchone()
+    return tuple(row) if row else None
+
+
+def reindex_document(conn, doc_id: int, before=None):
+    """写入涉及压缩行时，补做触发器跳过的全文索引维护
+
+    触发器只处理写入前后都是明文的行。before 为写入前的 index_entry()
+    （新插入时为 None）；写入后调用，按明文删除旧条目、写入新条目。
+    只改变存储格式时索引内容不变，不做任何事。
+    """
+    after = index_entry(conn, doc_id)
+    if all(entry is None or entry[3] == 'plain' for entry in (before, after)):
+        return
+    if before is not None and after is not None and before[:3] == after[:3]:
+        return
+    if before is not None:
+        conn.execute(_FTS_DELETE_SQL, (doc_id, *before[:3]))
+    if after is not None:
+        conn.execute(_FTS_INSERT_SQL, (doc_id, *after[:3]))
+
+
 # === 文档 CRUD ===
 
 def add_document(title: str, content: str, category: str = None,
                  tags: list = None, summary: str = None,
-                 source: str = "chat", slug: str = None) -> dict:
-    """添加新文档"""
+                 source: str = "chat", slug: str = None,
+                 skip_duplicates: bool = False) -> dict:
+    """添加新文档
+
+    skip_duplicates 为 True 时，若已有正文完全相同的文档则不写入，
+    直接返回该文档（带 'duplicate': True）。
+    """
     if not slug:
         slug = generate_slug(title)
 
     # 如果没有摘要，从内容提取前100字
     if not summary:
-        # 去除 markdown 标记提取纯文本摘要
-        plain = re.sub(r'[#*`\[\]()>-]', '', content)
-        summary = plain[:100].strip() + ('...' if len(plain) > 100 else '')
+        summary = generate_summary(content)
+
+    digest = content_hash(content)
 
     with get_connection() as conn:
+        if skip_duplicates:
+            duplicate = find_duplicate(digest=digest, conn=conn)
+            if duplicate:
+                return {**duplicate, 'duplicate': True}
+
+        stored, content_format, dict_id = encode_content(conn, content)
         cursor = conn.execute(
-            """INSERT INTO documents (slug, title, content, category, summary, source)
-               VALUES (?, ?, ?, ?, ?, ?)""",
-            (slug, title, content, category, summary, source)
+            """INSERT INTO documents (slug, title, content, category, summary, source,
+                                      content_hash, content_format, content_dict_id)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            (slug, title, stored, category, summary, source, digest, content_format, dict_id)
         )
         doc_id = cursor.lastrowid
+        if content_format != 'plain':
+            reindex_document(conn, doc_id)
+        store_render(conn, doc_id, title, content)
 
         # 添加标签
-        if tags:
-            for tag_name in tags:
-                tag_name = tag_name.strip()
-                if not tag_name:
-                    continue
-                # 获取或创建标签
-                conn.execute(
-                    "INSERT OR IGNORE INTO tags (name) VALUES (?)",
-                    (tag_name,)
-                )
-                tag_row = conn.execute(
-                    "SELECT id FROM tags WHERE name = ?", (tag_name,)
-                ).fetchone()
-                if tag_row:
-                    conn.execute(
-                        "INSERT OR IGNORE INTO document_tags (document_id, tag_id) VALUES (?, ?)",
-                        (doc_id, tag_row['id'])
-                    )
+        tag_ids = resolve_tag_ids(conn, clean_tags(tags))
+        conn.executemany(
+            "INSERT OR IGNORE INTO document_tags (document_id, tag_id) VALUES (?, ?)",
+            [(doc_id, tag_id) for tag_id in tag_ids.values()]
+        )
 
         return {
             'id': doc_id,
@@ -128,172 +889,915 @@ def add_document(title: str, content: str, category: str = None,
         }
 
 
-def get_document(doc_id: int = None, slug: str = None) -> dict:
-    """获取单个文档"""
+def _prepare_bulk_row(doc) -> dict:
+    """校验并补全一条批量写入的文档，失败时抛出 ValueError"""
+    if not isinstance(doc, dict):
+        raise ValueError("document must be a JSON object")
+    title, content = doc.get('title'), doc.get('content')
+    if not title or not content:
+        raise ValueError("title and content are required")
+    for key in ('title', 'content', 'slug', 'category', 'summary', 'source'):
+        if doc.get(key) is not None and not isinstance(doc[key], str):
+            raise ValueError(f"{key} must be a string")
+    tags = doc.get('tags')
+    if tags is not None and not (isinstance(tags, list)
+                                 and all(isinstance(t, str) for t in tags)):
+        raise ValueError("tags must be a list of strings")
+
+    return {
+        'slug': doc.get('slug') or generate_slug(title),
+        'explicit_slug': bool(doc.get('slug')),
+        'title': title,
+        'content': content,
+        'category': doc.get('category'),
+        'summary': doc.get('summary') or generate_summary(content),
+        'source': doc.get('source', 'chat'),
+        'content_hash': content_hash(content),
+        'tags': clean_tags(tags),
+    }
+
+
+def _existing_slugs(conn, slugs) -> set:
+    """返回 slugs 中已存在于数据库的部分"""
+    existing = set()
+    for batch in chunked(slugs, MAX_SQL_PARAMS):
+        placeholders = ", ".join("?" * len(batch))
+        rows = conn.execute(
+            f"SELECT slug FROM documents WHERE slug IN ({placeholders})", batch
+        ).fetchall()
+        existing.update(row['slug'] for row in rows)
+    return existing
+
+
+def _existing_hashes(conn, digests) -> dict:
+    """返回 digests 中已存在的正文哈希 {content_hash: {'id', 'slug', 'title'}}"""
+    existing = {}
+    for batch in chunked(digests, MAX_SQL_PARAMS):
+        placeholders = ", ".join("?" * len(batch))
+        rows = conn.execute(
+            f"""SELECT id, slug, title, content_hash FROM documents
+                WHERE content_hash IN ({placeholders}) ORDER BY id DESC""",
+            batch
+        ).fetchall()
+        existing.update((r['content_hash'], {'id': r['id'], 'slug': r['slug'], 'title': r['title']})
+                        for r in rows)
+    return existing
+
+
+def _insert_bulk_rows(rows: list) -> list:
+    """在一个事务内写入已校验的文档，返回每条的结果"""
     with get_connection() as conn:
+        for row in rows:
+            row['stored'], row['content_format'], row['content_dict_id'] = \
+                encode_content(conn, row['content'])
+        conn.executemany(
+            """INSERT INTO documents (slug, title, content, category, summary, source,
+                                      content_hash, content_format, content_dict_id)
+               VALUES (:slug, :title, :stored, :category, :summary, :source,
+                       :content_hash, :content_format, :content_dict_id)""",
+            rows
+        )
+
+        doc_ids = {}
+        for batch in chunked([r['slug'] for r in rows], MAX_SQL_PARAMS):
+            placeholders = ", ".join("?" * len(batch))
+            found = conn.execute(
+                f"SELECT id, slug FROM documents WHERE slug IN ({placeholders})", batch
+            ).fetchall()
+            doc_ids.update((r['slug'], r['id']) for r in found)
+
+        conn.executemany(
+            _FTS_INSERT_SQL,
+            [(doc_ids[r['slug']], r['title'], r['content'], r['summary'])
+             for r in rows if r['content_format'] != 'plain']
+        )
+
+        tag_ids = resolve_tag_ids(conn, (t for r in rows for t in r['tags']))
+        conn.executemany(
+            "INSERT OR IGNORE INTO document_tags (document_id, tag_id) VALUES (?, ?)",
+            [(doc_ids[r['slug']], tag_ids[t]) for r in rows for t in r['tags']]
+        )
+
+        renders = (render_document((doc_ids[r['slug']], r['title'], r['content'])) for r in rows)
+        conn.executemany(
+            _STORE_RENDER_SQL,
+            [(doc_id, RENDERER_VERSION, html, json.dumps(outline, ensure_ascii=False))
+             for doc_id, html, outline in renders]
+        )
+
+    return [
+        {'success': True, 'id': doc_ids[r['slug']], 'slug': r['slug'], 'title': r['title']}
+        for r in rows
+    ]
+
+
+def add_documents_bulk(docs, chunk_size: int = BULK_CHUNK_SIZE,
+                       skip_duplicates: bool = False) -> list:
+    """批量添加文档
+
+    docs 为文档字典的可迭代对象（字段同 add_document），按 chunk_size
+    分块，每块一个事务、用 executemany 写入，标签在块内一次性解析。
+    返回与输入顺序一致的结果列表，单条失败不影响其他文档。
+    skip_duplicates 同 add_document（批内正文相同的文档也只写入第一篇）。
+    """
+    results = []
+    used_slugs = set()
+    seen_hashes = {}
+    for chunk in chunked(docs, chunk_size):
+        chunk_results = [None] * len(chunk)
+        prepared = []
+        repeats = []
+        for i, doc in enumerate(chunk):
+            try:
+                prepared.append((i, _prepare_bulk_row(doc)))
+            except ValueError as e:
+                chunk_results[i] = {'success': False, 'error': str(e)}
+
+        with get_read_connection() as conn:
+            if skip_duplicates:
+                seen_hashes.update(_existing_hashes(
+                    conn, list({row['content_hash'] for _, row in prepared} - seen_hashes.keys())
+                ))
+                unique = []
+                for i, row in prepared:
+                    if row['content_hash'] in seen_hashes:
+                        repeats.append((i, row['content_hash']))
+                    else:
+                        # 占位：写入成功后指向新文档，供之后正文相同的行引用
+                        seen_hashes[row['content_hash']] = None
+                        unique.append((i, row))
+                prepared = unique
+            existing = _existing_slugs(conn, [row['slug'] for _, row in prepared])
+            # 已被占用的自动 slug 还要取出库中已有的 "<slug>-N" 序号
+            for base in {row['slug'] for _, row in prepared
+                         if not row['explicit_slug'] and row['slug'] in existing}:
+                rows = conn.execute(
+                    "SELECT slug FROM documents WHERE slug > ? AND slug < ?",
+                    (base + '-', base + '.')
+                ).fetchall()
+                existing.update(r['slug'] for r in rows)
+
+        # 分配 slug：自定义 slug 冲突即失败，自动生成的（同一秒内会重复）追加序号
+        def taken(slug):
+            return slug in existing or slug in used_slugs
+
+        pending = []
+        for i, row in prepared:
+            if row.pop('explicit_slug'):
+                if taken(row['slug']):
+                    chunk_results[i] = {
+                        'success': False, 'title': row['title'],
+                        'error': f"slug already exists: {row['slug']}"
+                    }
+                    continue
+            else:
+                base, n = row['slug'], 2
+                while taken(row['slug']):
+                    row['slug'] = f"{base}-{n}"
+                    n += 1
+            used_slugs.add(row['slug'])
+            pending.append((i, row))
+
+        if pending:
+            try:
+                inserted = _insert_bulk_rows([row for _, row in pending])
+            except sqlite3.Error:
+                # 整块失败时逐条重试，定位具体出错的文档
+                inserted = []
+                for _, row in pending:
+                    try:
+                        inserted.extend(_insert_bulk_rows([row]))
+                    except sqlite3.Error as e:
+                        inserted.append({'success': False, 'title': row['title'], 'error': str(e)})
+            for (i, row), result in zip(pending, inserted):
+                chunk_results[i] = result
+                if skip_duplicates and result['success']:
+                    seen_hashes[row['content_hash']] = {
+                        'id': result['id'], 'slug': result['slug'], 'title': result['title']
+                    }
+
+        for i, digest in repeats:
+            duplicate = seen_hashes.get(digest)
+            chunk_results[i] = (
+                {'success': True, 'duplicate': True, **duplicate} if duplicate else
+                {'success': False, 'error': 'duplicate of a document that failed to save'}
+            )
+
+        results.extend(chunk_results)
+    return results
+
+
+def import_jsonl(lines, chunk_size: int = BULK_CHUNK_SIZE, skip_duplicates: bool = False):
+    """流式导入 JSONL（每行一个文档），逐条产出带行号的结果"""
+    def flush(pending):
+        saved = add_documents_bulk([doc for _, doc in pending], chunk_size, skip_duplicates)
+        for (line_no, _), result in zip(pending, saved):
+            yield {'line': line_no, **result}
+
+    pending = []
+    for line_no, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            pending.append((line_no, json.loads(line)))
+        except json.JSONDecodeError as e:
+            # 先落盘已缓冲的文档，保证结果按行号顺序输出
+            yield from flush(pending)
+            pending = []
+            yield {'line': line_no, 'success': False, 'error': f"JSON parse error: {e}"}
+            continue
+        if len(pending) >= chunk_size:
+            yield from flush(pending)
+            pending = []
+    if pending:
+        yield from flush(pending)
+
+
+def get_document(doc_id: int = None, slug: str = None) -> dict:
+    """获取单个文档（含预渲染的 content_html 与 outline）"""
+    columns = ", ".join(CONTENT_SQL + " AS content" if f == 'content' else f"d.{f}"
+                        for f in DOCUMENT_FIELDS)
+    query = f"""SELECT {columns}, r.renderer_version, r.content_html, r.outline
+                FROM documents d
+                LEFT JOIN document_renders r ON r.document_id = d.id"""
+    with get_read_connection() as conn:
+        if doc_id:
+            row = conn.execute(f"{query} WHERE d.id = ?", (doc_id,)).fetchone()
+        elif slug:
+            row = conn.execute(f"{query} WHERE d.slug = ?", (slug,)).fetchone()
+        else:
+            return None
+
+        result = row_to_dict(row)
+        if not result:
+            return None
+
+        # 获取标签
+        tags = conn.execute(
+            """SELECT t.name FROM tags t
+               JOIN document_tags dt ON t.id = dt.tag_id
+               WHERE dt.document_id = ?""",
+            (result['id'],)
+        ).fetchall()
+        result['tags'] = [t['name'] for t in tags]
+
+    # 缓存缺失或渲染器版本升级后按需重新渲染
+    if result.pop('renderer_version') != RENDERER_VERSION:
+        try:
+            # 尽力写回缓存：写锁被占用时不等待，下次读取再试
+            with get_connection(blocking=False) as conn:
+                rendered = store_render(conn, result['id'], result['title'], result['content'])
+        except sqlite3.OperationalError:
+            rendered = render_markdown(result['content'], title=result['title'])
+        result['content_html'] = rendered['html']
+        result['outline'] = rendered['outline']
+    else:
+        result['outline'] = json.loads(result['outline'] or '[]')
+
+    return result
+
+
+def get_document_version(doc_id: int = None, slug: str = None) -> dict:
+    """只读取文档的 id 与 updated_at（用于 HTTP 条件请求，不读正文）"""
+    with get_read_connection() as conn:
         if doc_id:
             row = conn.execute(
-                "SELECT * FROM documents WHERE id = ?", (doc_id,)
+                "SELECT id, updated_at FROM documents WHERE id = ?", (doc_id,)
             ).fetchone()
         elif slug:
             row = conn.execute(
-                "SELECT * FROM documents WHERE slug = ?", (slug,)
+                "SELECT id, updated_at FROM documents WHERE slug = ?", (slug,)
             ).fetchone()
         else:
             return None
+        return row_to_dict(row)
+
+
+def get_write_generation() -> dict:
+    """全库写入代数 {'generation', 'changed_at'}，任何文档/标签写入都会递增"""
+    with get_read_connection() as conn:
+        row = conn.execute(
+            "SELECT generation, changed_at FROM db_generation WHERE id = 1"
+        ).fetchone()
+        return row_to_dict(row) or {'generation': 0, 'changed_at': None}
 
-        result = row_to_dict(row)
-        if result:
-            # 获取标签
-            tags = conn.execute(
-                """SELECT t.name FROM tags t
-                   JOIN document_tags dt ON t.id = dt.tag_id
-                   WHERE dt.document_id = ?""",
-                (result['id'],)
-            ).fetchall()
-            result['tags'] = [t['name'] for t in tags]
 
-        return result
+def sync_document_tags(conn, doc_id: int, tags) -> bool:
+    """把文档标签同步为 tags，只增删有变化的关联，返回是否有变化"""
+    current = {
+        row['name']: row['tag_id'] for row in conn.execute(
+            """SELECT t.name, dt.tag_id FROM document_tags dt
+               JOIN tags t ON t.id = dt.tag_id
+               WHERE dt.document_id = ?""",
+            (doc_id,)
+        )
+    }
+    wanted = clean_tags(tags)
+    removed = [tag_id for name, tag_id in current.items() if name not in wanted]
+    added = [name for name in wanted if name not in current]
+
+    if removed:
+        conn.executemany(
+            "DELETE FROM document_tags WHERE document_id = ? AND tag_id = ?",
+            [(doc_id, tag_id) for tag_id in removed]
+        )
+    if added:
+        tag_ids = resolve_tag_ids(conn, added)
+        conn.executemany(
+            "INSERT OR IGNORE INTO document_tags (document_id, tag_id) VALUES (?, ?)",
+            [(doc_id, tag_ids[name]) for name in added]
+        )
+    return bool(removed or added)
+
 
+def update_document(doc_id: int, **kwargs) -> str:
+    """更新文档，只写入有变化的字段；传入 tags 时只改动增删的标签
 
-def update_document(doc_id: int, **kwargs) -> bool:
-    """更新文档"""
+    返回 'updated' 或 'unchanged'（与现有值完全相同，不写库也不刷新
+    updated_at）；没有可更新字段或文档不存在时返回 None。
+    """
     allowed_fields = {'title', 'content', 'category', 'summary', 'source'}
     updates = {k: v for k, v in kwargs.items() if k in allowed_fields}
 
-    if not updates:
-        return False
+    if not updates and 'tags' not in kwargs:
+        return None
 
-    updates['updated_at'] = datetime.now().isoformat()
+    with get_connection() as conn:
+        current = conn.execute(
+            """SELECT title, category, summary, source, content_hash, content_format
+               FROM documents WHERE id = ?""",
+            (doc_id,)
+        ).fetchone()
+        if not current:
+            return None
 
-    set_clause = ", ".join(f"{k} = ?" for k in updates.keys())
-    values = list(updates.values()) + [doc_id]
+        # 正文只比较哈希，不读出旧正文
+        content = updates.pop('content', None)
+        updates = {k: v for k, v in updates.items() if v != current[k]}
+        if content is not None:
+            digest = content_hash(content)
+            if digest != current['content_hash']:
+                updates['content'], updates['content_format'], updates['content_dict_id'] = \
+                    encode_content(conn, content)
+                updates['content_hash'] = digest
 
-    with get_connection() as conn:
-        cursor = conn.execute(
-            f"UPDATE documents SET {set_clause} WHERE id = ?", values
+        tags_changed = False
+        if 'tags' in kwargs:
+            tags_changed = sync_document_tags(conn, doc_id, kwargs['tags'])
+
+        if not updates and not tags_changed:
+            return 'unchanged'
+
+        # 标签变化也刷新 updated_at，使文档的 ETag 失效
+        packed = any(f != 'plain' for f in (
+            current['content_format'], updates.get('content_format', current['content_format'])))
+        before = index_entry(conn, doc_id) if packed else None
+        set_clause = ", ".join(f"{k} = ?" for k in updates.keys())
+        set_clause += (", " if updates else "") + f"updated_at = {TIMESTAMP_SQL}"
+        conn.execute(
+            f"UPDATE documents SET {set_clause} WHERE id = ?",
+            list(updates.values()) + [doc_id]
         )
+        if packed:
+            reindex_document(conn, doc_id, before)
 
-        # 更新标签
-        if 'tags' in kwargs:
-            # 清除旧标签
-            conn.execute(
-                "DELETE FROM document_tags WHERE document_id = ?", (doc_id,)
-            )
-            # 添加新标签
-            for tag_name in kwargs['tags']:
-                tag_name = tag_name.strip()
-                if not tag_name:
-                    continue
-                conn.execute(
-                    "INSERT OR IGNORE INTO tags (name) VALUES (?)",
-                    (tag_name,)
-                )
-                tag_row = conn.execute(
-                    "SELECT id FROM tags WHERE name = ?", (tag_name,)
-                ).fetchone()
-                if tag_row:
-                    conn.execute(
-                        "INSERT OR IGNORE INTO document_tags (document_id, tag_id) VALUES (?, ?)",
-                        (doc_id, tag_row['id'])
-                    )
+        if 'title' in updates or 'content' in updates:
+            row = conn.execute(
+                f"SELECT d.title, {CONTENT_SQL} AS content FROM documents d WHERE d.id = ?",
+                (doc_id,)
+            ).fetchone()
+            store_render(conn, doc_id, row['title'], row['content'])
 
-        return cursor.rowcount > 0
+        return 'updated'
 
 
 def delete_document(doc_id: int) -> bool:
     """删除文档"""
     with get_connection() as conn:
-        cursor = conn.execute("DELETE FROM documents WHERE id = ?", (doc_id,))
-        return cursor.rowcount > 0
+        row = conn.execute(
+            "SELECT content_format FROM documents WHERE id = ?", (doc_id,)
+        ).fetchone()
+        if row is None:
+            return False
+        before = index_entry(conn, doc_id) if row['content_format'] != 'plain' else None
+        conn.execute("DELETE FROM documents WHERE id = ?", (doc_id,))
+        if before is not None:
+            reindex_document(conn, doc_id, before)
+        return True
 
 
-def search_documents(keyword: str = None, category: str = None,
-                     tag: str = None, limit: int = 20, offset: int = 0) -> list:
-    """搜索文档"""
-    conditions = []
-    params = []
-
-    if keyword:
-        conditions.append(
-            "(d.title LIKE ? OR d.content LIKE ? OR d.summary LIKE ?)"
-        )
-        like_pattern = f"%{keyword}%"
-        params.extend([like_pattern, like_pattern, like_pattern])
-
-    if category:
-        conditions.append("d.category = ?")
-        params.append(category)
-
-    if tag:
-        conditions.append("""
-            d.id IN (
-                SELECT dt.document_id FROM document_tags dt
-                JOIN tags t ON dt.tag_id = t.id
-                WHERE t.name = ?
+def fts_query(keyword: str) -> str:
+    """把关键词转换为 FTS5 短语查询（整体作为子串匹配，与 LIKE 语义一致）"""
+    return '"' + keyword.replace('"', '""') + '"'
+
+
+def encode_cursor(key, doc_id: int) -> str:
+    """把排序键编码为不透明的翻页游标"""
+    raw = json.dumps([key, doc_id], ensure_ascii=False, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """解析翻页游标，格式错误时抛出 ValueError"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        key, doc_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"invalid cursor: {cursor}") from e
+    if not isinstance(doc_id, int) or not isinstance(key, (str, int, float)):
+        raise ValueError(f"invalid cursor: {cursor}")
+    return key, doc_id
+
+
+def text_snippet(texts, keyword: str, size: int = SNIPPET_TOKENS) -> str:
+    """在第一个包含关键词的文本中截取约 size 个字符并高亮，格式同 FTS5 snippet()"""
+    needle = keyword.lower()
+    for text in texts:
+        pos = (text or '').lower().find(needle)
+        if pos < 0:
+            continue
+        start = max(0, min(pos - (size - len(keyword)) // 2, len(text) - size))
+        end = min(len(text), max(start + size, pos + len(keyword)))
+        marked = re.sub(re.escape(keyword), lambda m: f"<mark>{m.group(0)}</mark>",
+                        text[start:end], flags=re.IGNORECASE)
+        return ("…" if start else "") + marked + ("…" if end < len(text) else "")
+    return None
+
+
+def resolve_fields(fields=None) -> tuple:
+    """解析字段投影: 投影名 (card/full)、逗号分隔字符串或字段列表"""
+    if not fields:
+        return PROJECTIONS['card']
+    if isinstance(fields, str):
+        if fields in PROJECTIONS:
+            return PROJECTIONS[fields]
+        fields = fields.split(',')
+    fields = tuple(dict.fromkeys(f.strip() for f in fields if f.strip()))
+    unknown = [f for f in fields if f not in DOCUMENT_FIELDS and f != 'tags']
+    if unknown or not fields:
+        raise ValueError(f"unknown fields: {', '.join(unknown) or '(empty)'}")
+    return fields
+
+
+class DocumentStream:
+    """搜索结果流：迭代时逐行读取 SQLite 游标，不物化整个列表
+
+    关键词不少于 FTS_MIN_CHARS 个字符时走全文索引并按 bm25 排序，
+    结果附带 snippet 高亮；更短的关键词（trigram 无法索引）回退到 LIKE。
+    其余情况按 (created_at, id) 倒序。传入 cursor 时用键集翻页代替 OFFSET，
+    深翻页不再需要扫描并丢弃前面的所有行。
+
+    fields 控制返回字段（见 resolve_fields），默认 card 投影不含 content；
+    未请求 tags 时也不会查询标签。迭代结束后 next_cursor 指向下一页。
+
+    documents_fts 的 snippet() 直接读取 documents 的列，压缩行的高亮片段
+    改为在 Python 中用解压后的正文生成（见 text_snippet）。
+    """
+
+    def __init__(self, keyword: str = None, category: str = None,
+                 tag: str = None, limit: int = 20, offset: int = 0,
+                 cursor: str = None, fields=None):
+        self.fields = resolve_fields(fields)
+        self.limit = limit
+        self.keyword = keyword
+        self.use_fts = bool(keyword) and len(keyword) >= FTS_MIN_CHARS
+        self.next_cursor = None
+        self.sql, self.params = self._build_query(keyword, category, tag,
+                                                  limit, offset, cursor)
+
+    def _build_query(self, keyword, category, tag, limit, offset, cursor):
+        conditions = []
+        params = []
+
+        if keyword and not self.use_fts:
+            # 压缩的正文经 agentnote_text() 解压后再匹配
+            conditions.append(
+                f"(d.title LIKE ? OR {CONTENT_SQL} LIKE ? OR d.summary LIKE ?)"
             )
-        """)
-        params.append(tag)
+            like_pattern = f"%{keyword}%"
+            params.extend([like_pattern, like_pattern, like_pattern])
 
-    where_clause = " AND ".join(conditions) if conditions else "1=1"
+        if category:
+            conditions.append("d.category = ?")
+            params.append(category)
 
-    with get_connection() as conn:
+        if tag:
+            conditions.append("""
+                d.id IN (
+                    SELECT dt.document_id FROM document_tags dt
+                    JOIN tags t ON dt.tag_id = t.id
+                    WHERE t.name = ?
+                )
+            """)
+            params.append(tag)
+
+        if cursor:
+            key, last_id = decode_cursor(cursor)
+            if self.use_fts:
+                conditions.append("(hits.rank > ? OR (hits.rank = ? AND d.id < ?))")
+                params.extend([key, key, last_id])
+            else:
+                conditions.append("(d.created_at, d.id) < (?, ?)")
+                params.extend([key, last_id])
+            offset = 0
+
+        where_clause = " AND ".join(conditions) if conditions else "1=1"
+
+        # id 与 created_at 是排序和游标所需的列，始终查询
+        columns = [f for f in DOCUMENT_FIELDS
+                   if f in self.fields or f in ('id', 'created_at')]
+        # 只有请求了 content 时才解压正文
+        doc_columns = ", ".join(CONTENT_SQL + " AS content" if f == 'content' else f"d.{f}"
+                                for f in columns)
+
+        # 先按索引取出一页，再只为这一页的文档拼接标签
+        tags_column = ""
+        if 'tags' in self.fields:
+            tags_column = """, (SELECT GROUP_CONCAT(t.name) FROM document_tags dt
+                                JOIN tags t ON dt.tag_id = t.id
+                                WHERE dt.document_id = p.id) as tags_str"""
+
+        if self.use_fts:
+            # snippet 代价高，只为当前页的文档生成，而不是所有命中
+            sql = f"""WITH hits AS MATERIALIZED (
+                          SELECT rowid AS id,
+                                 bm25(documents_fts, {FTS_WEIGHTS}) AS rank
+                          FROM documents_fts
+                          WHERE documents_fts MATCH ?
+                      )
+                      SELECT p.*,
+                             CASE WHEN p.storage_format = 'plain' THEN
+                                 (SELECT snippet(documents_fts, -1, '<mark>', '</mark>', '…',
+                                                 {SNIPPET_TOKENS})
+                                  FROM documents_fts
+                                  WHERE documents_fts MATCH ? AND rowid = p.id)
+                             END AS snippet{tags_column}
+                      FROM (
+                          SELECT {doc_columns}, d.content_format AS storage_format, hits.rank
+                          FROM hits
+                          JOIN documents d ON d.id = hits.id
+                          WHERE {where_clause}
+                          ORDER BY hits.rank, d.id DESC
+                          LIMIT ? OFFSET ?
+                      ) p
+                      ORDER BY p.rank, p.id DESC"""
+            match = fts_query(keyword)
+            return sql, [match, match] + params + [limit, offset]
+
+        sql = f"""SELECT p.*{tags_column}
+                  FROM (
+                      SELECT {doc_columns} FROM documents d
+                      WHERE {where_clause}
+                      ORDER BY d.created_at DESC, d.id DESC
+                      LIMIT ? OFFSET ?
+                  ) p
+                  ORDER BY p.created_at DESC, p.id DESC"""
+        return sql, params + [limit, offset]
+
+    def __iter__(self):
+        count = 0
+        last = None
+        with get_read_connection() as conn:
+            for row in conn.execute(self.sql, self.params):
+                doc = row_to_dict(row)
+                if 'tags' in self.fields:
+                    doc['tags'] = doc['tags_str'].split(',') if doc.get('tags_str') else []
+                    del doc['tags_str']
+                if self.use_fts and doc.pop('storage_format') != 'plain':
+                    doc['snippet'] = text_snippet(index_entry(conn, doc['id'])[:3], self.keyword)
+                count += 1
+                last = (doc.pop('rank', None) if self.use_fts else doc['created_at'], doc['id'])
+                for key in ('id', 'created_at'):
+                    if key not in self.fields:
+                        del doc[key]
+                yield doc
+
+        if last and count >= self.limit:
+            self.next_cursor = encode_cursor(*last)
+
+
+def search_documents_page(keyword: str = None, category: str = None,
+                          tag: str = None, limit: int = 20, offset: int = 0,
+                          cursor: str = None, fields=None) -> dict:
+    """搜索文档并返回一页结果: {'data': [...], 'next_cursor': str|None}
+
+    参数与排序规则见 DocumentStream。
+    """
+    stream = DocumentStream(keyword=keyword, category=category, tag=tag,
+                            limit=limit, offset=offset, cursor=cursor,
+                            fields=fields)
+    data = list(stream)
+    return {'data': data, 'next_cursor': stream.next_cursor}
+
+
+def search_documents(keyword: str = None, category: str = None,
+                     tag: str = None, limit: int = 20, offset: int = 0,
+                     cursor: str = None, fields=None) -> list:
+    """搜索文档（只返回文档列表，参数同 search_documents_page）"""
+    return search_documents_page(keyword=keyword, category=category, tag=tag,
+                                 limit=limit, offset=offset, cursor=cursor,
+                                 fields=fields)['data']
+
+
+def render_all(force: bool = False, workers: int = None,
+               batch_size: int = RENDER_BATCH_SIZE) -> int:
+    """用进程池批量（重新）渲染文档，默认只处理缺失或版本落后的，返回渲染数量"""
+    with get_read_connection() as conn:
+        if force:
+            rows = conn.execute("SELECT id FROM documents").fetchall()
+        else:
+            rows = conn.execute(
+                """SELECT d.id FROM documents d
+                   LEFT JOIN document_renders r ON r.document_id = d.id
+                   WHERE r.document_id IS NULL OR r.renderer_version != ?""",
+                (RENDERER_VERSION,)
+            ).fetchall()
+    ids = [row['id'] for row in rows]
+
+    workers = workers or os.cpu_count() or 1
+    rendered = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # 按窗口读取正文，避免一次性把整个语料载入内存
+        for window in chunked(ids, batch_size * workers):
+            docs = []
+            with get_read_connection() as conn:
+                for batch in chunked(window, MAX_SQL_PARAMS):
+                    placeholders = ", ".join("?" * len(batch))
+                    docs.extend(
+                        (r['id'], r['title'], r['content']) for r in conn.execute(
+                            f"""SELECT d.id, d.title, {CONTENT_SQL} AS content
+                                FROM documents d WHERE d.id IN ({placeholders})""",
+                            batch
+                        )
+                    )
+            results = pool.map(render_document, docs, chunksize=batch_size)
+            with get_connection() as conn:
+                conn.executemany(
+                    _STORE_RENDER_SQL,
+                    [(doc_id, RENDERER_VERSION, html, json.dumps(outline, ensure_ascii=False))
+                     for doc_id, html, outline in results]
+                )
+            rendered += len(docs)
+    return rendered
+
+
+def rebuild_fts_index(conn, batch_size: int = BULK_CHUNK_SIZE):
+    """在 conn 的事务内重建 documents_fts：明文行直接读列，压缩行解压后写入
+
+    FTS5 自带的 'rebuild' 会把压缩行的 BLOB 当作正文索引，所以不用它。
+    """
+    conn.execute("INSERT INTO documents_fts (documents_fts) VALUES ('delete-all')")
+    conn.execute(
+        """INSERT INTO documents_fts (rowid, title, content, summary)
+           SELECT id, title, content, summary FROM documents WHERE content_format = 'plain'"""
+    )
+    last_id = 0
+    while True:
         rows = conn.execute(
-            f"""SELECT d.*, GROUP_CONCAT(t.name) as tags_str
-                FROM documents d
-                LEFT JOIN document_tags dt ON d.id = dt.document_id
-                LEFT JOIN tags t ON dt.tag_id = t.id
-                WHERE {where_clause}
-                GROUP BY d.id
-                ORDER BY d.created_at DESC
-                LIMIT ? OFFSET ?""",
-            params + [limit, offset]
+            f"""SELECT d.id, d.title, {CONTENT_SQL} AS content, d.summary FROM documents d
+                WHERE d.content_format != 'plain' AND d.id > ? ORDER BY d.id LIMIT ?""",
+            (last_id, batch_size)
         ).fetchall()
+        if not rows:
+            return
+        conn.executemany(_FTS_INSERT_SQL, [tuple(row) for row in rows])
+        last_id = rows[-1]['id']
 
-        results = []
-        for row in rows:
-            doc = row_to_dict(row)
-            doc['tags'] = doc['tags_str'].split(',') if doc.get('tags_str') else []
-            del doc['tags_str']
-            results.append(doc)
 
-        return results
+def rebuild_search_index() -> int:
+    """重建全文索引（为已有数据库回填 documents_fts），返回索引的文档数"""
+    with get_connection() as conn:
+        rebuild_fts_index(conn)
+        row = conn.execute("SELECT COUNT(*) as count FROM documents").fetchone()
+        return row['count']
+
+
+def train_dictionary(algorithm: str, samples: list, size: int = COMPRESS_DICT_SIZE) -> bytes:
+    """从正文样本训练预设字典，样本不足时返回 None
+
+    zstd 使用 zstandard 自带的训练器；zlib 取多篇文档中重复出现的行，
+    出现越多越靠近字典末尾（deflate 对末尾的匹配距离最短）。
+    """
+    if algorithm == 'zstd':
+        try:
+            return zstandard.train_dictionary(size, [t.encode('utf-8') for t in samples]).as_bytes()
+        except zstandard.ZstdError:
+            return None
+
+    counts = Counter()
+    for text in samples:
+        counts.update({line.strip() for line in text.splitlines() if len(line.strip()) >= 8})
+    picked, used = [], 0
+    for line, count in counts.most_common():
+        if count < 2 or used >= size:
+            break
+        data = (line + "\n").encode('utf-8')
+        if used + len(data) <= size:
+            picked.append(data)
+            used += len(data)
+    return b"".join(reversed(picked)) or None
+
+
+def _storage_size(conn) -> dict:
+    row = conn.execute(
+        """SELECT COUNT(*) AS docs, COALESCE(SUM(length(CAST(content AS BLOB))), 0) AS bytes
+           FROM documents"""
+    ).fetchone()
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    pages = conn.execute("PRAGMA page_count").fetchone()[0]
+    free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    return {'docs': row['docs'], 'content_bytes': row['bytes'],
+            'file_bytes': pages * page_size, 'free_bytes': free * page_size}
+
+
+def compress_documents(algorithm: str = 'zlib', min_size: int = COMPRESS_MIN_BYTES,
+                       use_dict: bool = True, vacuum: bool = False,
+                       batch_size: int = BULK_CHUNK_SIZE) -> dict:
+    """开启正文压缩并原地压缩已有的大正文
+
+    训练字典并设为启用（之后的新写入也会压缩），然后分批压缩 min_size
+    以上的明文正文，每批一个事务。返回压缩前后的正文字节数与文件大小。
+    """
+    if algorithm not in ('zlib', 'zstd'):
+        raise ValueError(f"unknown algorithm: {algorithm}")
+    if algorithm == 'zstd' and zstandard is None:
+        raise RuntimeError("zstd compression requires: pip install zstandard")
+
+    with get_read_connection() as conn:
+        before = _storage_size(conn)
+        samples = [row[0] for row in conn.execute(
+            f"""SELECT {CONTENT_SQL} FROM documents d
+                WHERE length(CAST(d.content AS BLOB)) >= ?
+                ORDER BY random() LIMIT ?""",
+            (min_size, COMPRESS_SAMPLE_DOCS)
+        )] if use_dict else []
+    zdict = train_dictionary(algorithm, samples) if samples else None
+
+    # 字典单独提交：行的 id 不会因后续批次回滚而被复用
+    with get_connection() as conn:
+        conn.execute("UPDATE compression_dicts SET active = 0 WHERE active = 1")
+        dict_id = conn.execute(
+            """INSERT INTO compression_dicts (algorithm, dict, min_size, active)
+               VALUES (?, ?, ?, 1)""",
+            (algorithm, zdict, min_size)
+        ).lastrowid
+
+    compressed = bytes_in = bytes_out = 0
+    last_id = 0
+    while True:
+        with get_connection() as conn:
+            rows = conn.execute(
+                """SELECT id, content FROM documents
+                   WHERE content_format = 'plain' AND id > ?
+                     AND length(CAST(content AS BLOB)) >= ?
+                   ORDER BY id LIMIT ?""",
+                (last_id, min_size, batch_size)
+            ).fetchall()
+            if not rows:
+                break
+            last_id = rows[-1]['id']
+            updates = []
+            for row in rows:
+                data = row['content'].encode('utf-8')
+                blob = compress_content(algorithm, data, zdict)
+                if len(blob) < len(data):
+                    updates.append((blob, algorithm, dict_id, row['id']))
+                    bytes_in += len(data)
+                    bytes_out += len(blob)
+            conn.executemany(
+                """UPDATE documents SET content = ?, content_format = ?, content_dict_id = ?
+                   WHERE id = ?""",
+                updates
+            )
+            compressed += len(updates)
+
+    if vacuum:
+        with get_connection() as conn:
+            conn.execute("VACUUM")
+    with get_read_connection() as conn:
+        after = _storage_size(conn)
 
+    return {
+        'algorithm': algorithm,
+        'dict_id': dict_id,
+        'dict_bytes': len(zdict or b''),
+        'compressed': compressed,
+        'content_bytes_before': bytes_in,
+        'content_bytes_after': bytes_out,
+        'before': before,
+        'after': after,
+    }
 
-def get_recent_documents(limit: int = 10) -> list:
+
+def decompress_documents(batch_size: int = BULK_CHUNK_SIZE) -> int:
+    """关闭正文压缩并把所有压缩的正文还原为明文，返回还原的数量"""
+    restored = 0
+    with get_connection() as conn:
+        conn.execute("UPDATE compression_dicts SET active = 0 WHERE active = 1")
+    while True:
+        with get_connection() as conn:
+            count = conn.execute(
+                """UPDATE documents
+                   SET content = agentnote_text(content, content_format, content_dict_id),
+                       content_format = 'plain', content_dict_id = NULL
+                   WHERE id IN (SELECT id FROM documents WHERE content_format != 'plain' LIMIT ?)""",
+                (batch_size,)
+            ).rowcount
+        if not count:
+            return restored
+        restored += count
+
+
+def get_recent_documents(limit: int = 10, fields=None) -> list:
     """获取最近文档"""
-    return search_documents(limit=limit)
+    # 先把 fields 规范成元组，列表等写法也能命中缓存
+    return _recent_documents(limit, resolve_fields(fields))
+
 
+@cached_query
+def _recent_documents(limit: int, fields: tuple) -> list:
+    return search_documents(limit=limit, fields=fields)
 
+
+@cached_query
 def get_categories() -> list:
-    """获取所有分类及计数"""
-    with get_connection() as conn:
+    """获取所有分类及计数（读取触发器维护的 category_counts）"""
+    with get_read_connection() as conn:
         rows = conn.execute(
-            """SELECT category, COUNT(*) as count
-               FROM documents
-               WHERE category IS NOT NULL AND category != ''
-               GROUP BY category
+            """SELECT category, count
+               FROM category_counts
+               WHERE count > 0
                ORDER BY count DESC"""
         ).fetchall()
         return rows_to_list(rows)
 
 
+@cached_query
 def get_all_tags() -> list:
-    """获取所有标签及计数"""
-    with get_connection() as conn:
+    """获取所有标签及计数（读取触发器维护的 tag_counts）"""
+    with get_read_connection() as conn:
         rows = conn.execute(
-            """SELECT t.name, COUNT(dt.document_id) as count
+            """SELECT t.name, COALESCE(tc.count, 0) as count
                FROM tags t
-               LEFT JOIN document_tags dt ON t.id = dt.tag_id
-               GROUP BY t.id
+               LEFT JOIN tag_counts tc ON t.id = tc.tag_id
                ORDER BY count DESC"""
         ).fetchall()
         return rows_to_list(rows)
 
 
+# 计数表的真实值，用于一致性检查与重建
+_CATEGORY_COUNTS_SQL = """
+    SELECT category, COUNT(*) as count
+    FROM documents
+    WHERE category IS NOT NULL AND category != ''
+    GROUP BY category
+"""
+_TAG_COUNTS_SQL = """
+    SELECT tag_id, COUNT(*) as count
+    FROM document_tags
+    GROUP BY tag_id
+"""
+
+
+def check_counters() -> list:
+    """对比计数表与实际数据，返回偏差列表 [{'kind', 'key', 'stored', 'actual'}]"""
+    drift = []
+    with get_read_connection() as conn:
+        for kind, actual_sql, stored_sql in (
+            ('category', _CATEGORY_COUNTS_SQL,
+             "SELECT category, count FROM category_counts WHERE count > 0"),
+            ('tag', _TAG_COUNTS_SQL,
+             "SELECT tag_id, count FROM tag_counts WHERE count > 0"),
+        ):
+            actual = {row[0]: row[1] for row in conn.execute(actual_sql)}
+            stored = {row[0]: row[1] for row in conn.execute(stored_sql)}
+            for key in actual.keys() | stored.keys():
+                if actual.get(key, 0) != stored.get(key, 0):
+                    drift.append({
+                        'kind': kind,
+                        'key': key,
+                        'stored': stored.get(key, 0),
+                        'actual': actual.get(key, 0),
+                    })
+    return drift
+
+
+def rebuild_counters() -> int:
+    """从 documents / document_tags 重建计数表，返回修正的条目数"""
+    drift = check_counters()
+    with get_connection() as conn:
+        conn.execute("DELETE FROM category_counts")
+        conn.execute(f"INSERT INTO category_counts (category, count) {_CATEGORY_COUNTS_SQL}")
+        conn.execute("DELETE FROM tag_counts")
+        conn.execute(f"INSERT INTO tag_counts (tag_id, count) {_TAG_COUNTS_SQL}")
+    return len(drift)
+
+
+@cached_query
 def get_documents_count() -> int:
     """获取文档总数"""
-    with get_connection() as conn:
+    with get_read_connection() as conn:
         row = conn.execute("SELECT COUNT(*) as count FROM documents").fetchone()
         return row['count'] if row else 0
 
@@ -303,8 +1807,56 @@ def get_documents_count() -> int:
 if __name__ == "__main__":
     import sys
 
-    if len(sys.argv) > 1 and sys.argv[1] == "init":
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+
+    if command == "init":
         init_database()
+    elif command == "rebuild-fts":
+        count = rebuild_search_index()
+        print(f"✅ 全文索引重建完成: {count} 篇文档")
+    elif command == "render-all":
+        workers = None
+        if "--workers" in sys.argv:
+            workers = int(sys.argv[sys.argv.index("--workers") + 1])
+        count = render_all(force="--force" in sys.argv, workers=workers)
+        print(f"✅ 渲染完成: {count} 篇文档")
+    elif command == "check-counts":
+        drift = check_counters()
+        for item in drift:
+            print(f"✗ {item['kind']} {item['key']}: stored={item['stored']} actual={item['actual']}")
+        if drift:
+            print(f"发现 {len(drift)} 处计数偏差，运行 rebuild-counts 修复")
+            sys.exit(1)
+        print("✅ 计数表一致")
+    elif command == "compress":
+        algorithm = "zlib"
+        if "--algorithm" in sys.argv:
+            algorithm = sys.argv[sys.argv.index("--algorithm") + 1]
+        min_size = COMPRESS_MIN_BYTES
+        if "--min-size" in sys.argv:
+            min_size = int(sys.argv[sys.argv.index("--min-size") + 1])
+        try:
+            report = compress_documents(algorithm, min_size, use_dict="--no-dict" not in sys.argv,
+                                        vacuum="--vacuum" in sys.argv)
+        except (ValueError, RuntimeError) as e:
+            print(f"✗ {e}")
+            sys.exit(1)
+        saved = report['content_bytes_before'] - report['content_bytes_after']
+        print(f"✅ 压缩完成: {report['compressed']} 篇文档 ({report['algorithm']}, "
+              f"字典 {report['dict_bytes']} 字节)")
+        print(f"  正文: {report['content_bytes_before']:,} → {report['content_bytes_after']:,} 字节"
+              f" (节省 {saved:,})")
+        print(f"  数据库文件: {report['before']['file_bytes']:,} → {report['after']['file_bytes']:,} 字节")
+        if "--vacuum" not in sys.argv:
+            print(f"  可回收空间 {report['after']['free_bytes']:,} 字节，运行时加 --vacuum 缩小文件")
+    elif command == "decompress":
+        count = decompress_documents()
+        print(f"✅ 已关闭压缩并还原 {count} 篇文档")
+    elif command == "rebuild-counts":
+        fixed = rebuild_counters()
+        print(f"✅ 计数表重建完成: 修正 {fixed} 处偏差")
     else:
-        print("Usage: python db.py init")
+        print("Usage: python db.py init|rebuild-fts|check-counts|rebuild-counts|"
+              "render-all [--force] [--workers N]|"
+              "compress [--algorithm zlib|zstd] [--min-size N] [--no-dict] [--vacuum]|decompress")
         print(f"Database path: {DB_PATH}")
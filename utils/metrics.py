@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+AgentNote Metrics
+查询级埋点与 Prometheus 文本格式导出
+
+默认关闭；设置环境变量 AGENTNOTE_METRICS=1（或调用 enable()）后，
+db.get_connection() / get_read_connection() 借出的连接会挂上 sqlite3 的
+trace 与 progress 回调，按调用函数记录每条语句的耗时与虚拟机步数。
+超过慢查询阈值的语句连同 EXPLAIN QUERY PLAN 写入 agentnote.slow_query 日志。
+"""
+
+import collections
+import contextlib
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+ENABLED = os.environ.get('AGENTNOTE_METRICS', '') not in ('', '0')
+SLOW_QUERY_MS = float(os.environ.get('AGENTNOTE_SLOW_QUERY_MS', 100))
+PROGRESS_INTERVAL = 1000            # 每执行这么多条 VM 指令调用一次 progress 回调
+SLOW_QUERY_HISTORY = 50             # 内存中保留的最近慢查询条数
+SLOW_QUERY_SQL_CHARS = 500          # 慢查询记录保留的 SQL 长度（trace 给出的 SQL 已代入参数，可能含整篇正文）
+
+# 秒
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+slow_query_log = logging.getLogger('agentnote.slow_query')
+if os.environ.get('AGENTNOTE_SLOW_QUERY_LOG'):
+    slow_query_log.addHandler(logging.FileHandler(os.environ['AGENTNOTE_SLOW_QUERY_LOG']))
+
+
+def enable(slow_query_ms: float = None):
+    """开启埋点（供命令行参数使用）"""
+    global ENABLED, SLOW_QUERY_MS
+    ENABLED = True
+    if slow_query_ms is not None:
+        SLOW_QUERY_MS = slow_query_ms
+
+
+class Histogram:
+    """累积分桶直方图（Prometheus histogram 语义）"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """进程内的直方图与计数器，按 (指标名, 标签) 区分"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}       # name -> {labels: Histogram}
+        self._counters = {}         # name -> {labels: value}
+        self._help = {}
+        self.slow_queries = collections.deque(maxlen=SLOW_QUERY_HISTORY)
+
+    def describe(self, name: str, help_text: str):
+        self._help[name] = help_text
+
+    def observe(self, name: str, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram()
+            histogram.observe(value)
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+            self.slow_queries.clear()
+
+    def render(self) -> str:
+        """导出为 Prometheus 文本格式"""
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._histograms.items()):
+                lines.extend(family_header(name, 'histogram', self._help.get(name)))
+                for key, h in sorted(series.items()):
+                    labels = dict(key)
+                    cumulative = 0
+                    for bound, count in zip(h.buckets, h.counts):
+                        cumulative += count
+                        lines.append(sample(f"{name}_bucket", {**labels, 'le': repr(bound)}, cumulative))
+                    lines.append(sample(f"{name}_bucket", {**labels, 'le': '+Inf'}, h.count))
+                    lines.append(sample(f"{name}_sum", labels, h.sum))
+                    lines.append(sample(f"{name}_count", labels, h.count))
+            for name, series in sorted(self._counters.items()):
+                lines.extend(family_header(name, 'counter', self._help.get(name)))
+                for key, value in sorted(series.items()):
+                    lines.append(sample(name, dict(key), value))
+        return "\n".join(lines) + "\n" if lines else ""
+
+
+def escape_label(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def sample(name: str, labels: dict, value) -> str:
+    """一行样本: name{k="v",...} value"""
+    if labels:
+        label_text = ",".join(f'{k}="{escape_label(v)}"' for k, v in labels.items())
+        return f"{name}{{{label_text}}} {value}"
+    return f"{name} {value}"
+
+
+def family_header(name: str, kind: str, help_text: str = None) -> list:
+    lines = [f"# HELP {name} {help_text}"] if help_text else []
+    lines.append(f"# TYPE {name} {kind}")
+    return lines
+
+
+def family(name: str, kind: str, help_text: str, samples) -> str:
+    """格式化一个指标族，samples 为 [(labels, value), ...]"""
+    lines = family_header(name, kind, help_text)
+    lines.extend(sample(name, labels, value) for labels, value in samples)
+    return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+registry.describe('agentnote_db_query_seconds', 'SQLite statement latency by calling function')
+registry.describe('agentnote_db_query_vm_steps_total',
+                  'Approximate SQLite VM instructions executed by calling function')
+registry.describe('agentnote_db_slow_queries_total', 'Statements slower than the slow-query threshold')
+
+
+# === 查询埋点 ===
+
+_SKIP_FRAMES = {'query_span', 'get_connection', 'get_read_connection', 'transaction'}
+
+
+def caller_name() -> str:
+    """借用连接的业务函数名（跳过 contextlib 与连接工厂本身的帧）"""
+    frame = sys._getframe(1)
+    while frame is not None and (frame.f_code.co_filename == contextlib.__file__
+                                 or frame.f_code.co_name in _SKIP_FRAMES):
+        frame = frame.f_back
+    if frame is None:
+        return 'unknown'
+    return getattr(frame.f_code, 'co_qualname', frame.f_code.co_name)
+
+
+class QuerySpan:
+    """一次连接借用期间执行的语句: [sql, 开始时间, VM 步数]"""
+
+    __slots__ = ('function', 'statements')
+
+    def __init__(self, function: str):
+        self.function = function
+        self.statements = []
+
+    def trace(self, sql: str):
+        # 触发器内的语句以 "-- TRIGGER" 形式回调，计入外层语句
+        if not sql.startswith('--'):
+            self.statements.append([sql, time.perf_counter(), 0])
+
+    def progress(self) -> int:
+        if self.statements:
+            self.statements[-1][2] += PROGRESS_INTERVAL
+        return 0
+
+
+def explain(conn, sql: str) -> str:
+    """EXPLAIN QUERY PLAN 的文本形式，失败时返回错误信息"""
+    try:
+        rows = conn.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall()
+    except Exception as e:
+        return f"(no plan: {e})"
+    return "\n".join(f"{row[0]}|{row[1]}|{row[3]}" for row in rows)
+
+
+@contextmanager
+def query_span(conn, function: str = None):
+    """在借出的连接上记录每条语句的耗时
+
+    sqlite3 只在语句开始时回调 trace，因此一条语句的耗时按"到下一条语句开始
+    （或连接归还）为止"计算；流式读取时包含调用方处理结果行的时间。
+    """
+    span = QuerySpan(function or caller_name())
+    conn.set_trace_callback(span.trace)
+    conn.set_progress_handler(span.progress, PROGRESS_INTERVAL)
+    try:
+        yield conn
+    finally:
+        end = time.perf_counter()
+        conn.set_trace_callback(None)
+        conn.set_progress_handler(None, 0)
+        record_span(conn, span, end)
+
+
+def truncate_sql(sql: str, limit: int = SLOW_QUERY_SQL_CHARS) -> str:
+    if len(sql) <= limit:
+        return sql
+    return f"{sql[:limit]}… ({len(sql)} chars)"
+
+
+def record_span(conn, span: QuerySpan, end: float):
+    statements = span.statements
+    for i, (sql, start, steps) in enumerate(statements):
+        stop = statements[i + 1][1] if i + 1 < len(statements) else end
+        elapsed = stop - start
+        registry.observe('agentnote_db_query_seconds', elapsed, function=span.function)
+        if steps:
+            registry.inc('agentnote_db_query_vm_steps_total', steps, function=span.function)
+        if elapsed * 1000 >= SLOW_QUERY_MS and not sql.lstrip().upper().startswith(
+                ('BEGIN', 'COMMIT', 'ROLLBACK', 'PRAGMA', 'EXPLAIN')):
+            registry.inc('agentnote_db_slow_queries_total', function=span.function)
+            plan = explain(conn, sql)
+            sql = truncate_sql(sql)
+            registry.slow_queries.append({
+                'function': span.function,
+                'ms': round(elapsed * 1000, 3),
+                'sql': sql,
+                'plan': plan,
+            })
+            slow_query_log.warning("slow query %.1fms in %s: %s\n%s",
+                                   elapsed * 1000, span.function, sql, plan)
+
+
+def recent_slow_queries() -> list:
+    """最近的慢查询 [{'function', 'ms', 'sql', 'plan'}]"""
+    return list(registry.slow_queries)
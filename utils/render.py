@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+AgentNote Markdown Renderer
+服务端 Markdown 渲染（与 web/static/js/app.js 中的 md.parse 输出一致）
+"""
+
+import re
+
+# 渲染规则变化时递增，旧缓存会在读取时重新渲染
+RENDERER_VERSION = 1
+
+_TABLE_RE = re.compile(r'^\|(.+)\|\s*\n\|[-:\s|]+\|\s*\n((?:\|.+\|\s*\n?)+)', re.M)
+_HEADING_RE = re.compile(r'<h([1-4]) id="(heading-\d+)">(.*?)</h\1>')
+
+
+def _parse_table(table_text: str) -> str:
+    """解析单个 Markdown 表格"""
+    lines = table_text.strip().split('\n')
+    if len(lines) < 3:
+        return table_text
+
+    headers = [h.strip() for h in lines[0].split('|') if h.strip()]
+    rows = [
+        [cell.strip() for cell in row.split('|') if cell.strip() != '']
+        for row in lines[2:]
+    ]
+
+    html = '<table>\n<thead>\n<tr>\n'
+    for h in headers:
+        html += f'<th>{h}</th>\n'
+    html += '</tr>\n</thead>\n<tbody>\n'
+    for row in rows:
+        html += '<tr>\n'
+        for cell in row:
+            html += f'<td>{cell}</td>\n'
+        html += '</tr>\n'
+    html += '</tbody>\n</table>'
+    return html
+
+
+def _strip_title_h1(text: str, title: str) -> str:
+    """文档以与标题相同的 H1 开头时去掉它，避免重复显示"""
+    match = re.search(r'^# (.+)$', text, re.M)
+    if match:
+        h1_text = match.group(1).strip()
+        title = title.strip()
+        if h1_text == title or \
+                re.sub(r'[（）()]', '', h1_text) == re.sub(r'[（）()]', '', title):
+            text = re.sub(r'^# .+\n+', '', text, count=1)
+    return text
+
+
+def render_markdown(text: str, title: str = None) -> dict:
+    """
+    渲染 Markdown
+
+    Returns:
+        {'html': 渲染后的 HTML, 'outline': [{'level', 'title', 'id'}, ...]}
+        outline 按文档顺序排列，供前端生成目录
+    """
+    if not text:
+        return {'html': '', 'outline': []}
+
+    if title:
+        text = _strip_title_h1(text, title)
+
+    heading_id = 0
+
+    def heading(level):
+        def replace(m):
+            nonlocal heading_id
+            hid = f'heading-{heading_id}'
+            heading_id += 1
+            return f'<h{level} id="{hid}">{m.group(1)}</h{level}>'
+        return replace
+
+    # 先用占位符保存表格
+    tables = []
+
+    def stash_table(m):
+        tables.append(_parse_table(m.group(0)))
+        return f'__TABLE_{len(tables) - 1}__'
+
+    text = _TABLE_RE.sub(stash_table, text)
+
+    html = text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+    # 代码块（必须先于其他替换）
+    html = re.sub(
+        r'```(\w*)\n([\s\S]*?)```',
+        lambda m: f'<pre><code class="language-{m.group(1)}">{m.group(2).strip()}</code></pre>',
+        html
+    )
+    # 行内代码
+    html = re.sub(r'`([^`]+)`', r'<code>\1</code>', html)
+
+    # 标题（带 id 供目录跳转）
+    html = re.sub(r'^#### (.+)$', heading(4), html, flags=re.M)
+    html = re.sub(r'^### (.+)$', heading(3), html, flags=re.M)
+    html = re.sub(r'^## (.+)$', heading(2), html, flags=re.M)
+    html = re.sub(r'^# (.+)$', heading(1), html, flags=re.M)
+
+    # 粗体与斜体
+    html = re.sub(r'\*\*\*(.+?)\*\*\*', r'<strong><em>\1</em></strong>', html)
+    html = re.sub(r'\*\*(.+?)\*\*', r'<strong>\1</strong>', html)
+    html = re.sub(r'\*(.+?)\*', r'<em>\1</em>', html)
+
+    # 图片与链接
+    html = re.sub(r'!\[([^\]]*)\]\(([^)]+)\)', r'<img src="\2" alt="\1">', html)
+    html = re.sub(r'\[([^\]]+)\]\(([^)]+)\)', r'<a href="\2" target="_blank">\1</a>', html)
+
+    # 引用、分隔线、列表
+    html = re.sub(r'^> (.+)$', r'<blockquote>\1</blockquote>', html, flags=re.M)
+    html = re.sub(r'^---$', '<hr>', html, flags=re.M)
+    html = re.sub(r'^- (.+)$', r'<li>\1</li>', html, flags=re.M)
+    html = re.sub(r'^\d+\. (.+)$', r'<li>\1</li>', html, flags=re.M)
+
+    # 段落（尚未被标签包裹的行）
+    html = re.sub(r'^(?!<[hpuolbic]|</|<hr|<pre|<block)(.+)$', r'<p>\1</p>', html, flags=re.M)
+
+    html = html.replace('</blockquote>\n<blockquote>', '\n')
+    html = re.sub(
+        r'(<li>.*</li>\n?)+',
+        lambda m: f'<ol>{m.group(0)}</ol>' if '1.' in m.group(0) else f'<ul>{m.group(0)}</ul>',
+        html
+    )
+    html = html.replace('\n\n', '\n')
+
+    # 还原表格
+    for i, table_html in enumerate(tables):
+        html = html.replace(f'__TABLE_{i}__', table_html, 1)
+
+    outline = [
+        {'level': int(m.group(1)), 'title': m.group(3), 'id': m.group(2)}
+        for m in _HEADING_RE.finditer(html)
+    ]
+    return {'html': html, 'outline': outline}
+
+
+def render_document(doc: tuple) -> tuple:
+    """渲染 (id, title, content)，返回 (id, html, outline)；供进程池批量调用"""
+    doc_id, title, content = doc
+    result = render_markdown(content, title=title)
+    return doc_id, result['html'], result['outline']
@@ -9,6 +9,9 @@ import os
 import signal
 import subprocess
 import time
+import hashlib
+import zlib
+from datetime import datetime, timezone
 from pathlib import Path
 
 # Add utils to path
@@ -46,16 +49,214 @@ def kill_port(port):
     except Exception:
         pass  # No process on port or lsof not available
 
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, render_template, request, jsonify, stream_with_context, g
+
+try:
+    import brotli  # optional: enables Content-Encoding: br
+except ImportError:
+    brotli = None
+
+import db
+import metrics
 from db import (
-    init_database, DB_PATH,
+    init_database, warm_pool, close_connections,
+    get_pool_stats, get_writer_stats, get_cache_stats,
     add_document, get_document, update_document, delete_document,
-    search_documents, get_recent_documents, get_categories, get_all_tags,
-    get_documents_count
+    DocumentStream, get_recent_documents, get_categories, get_all_tags,
+    get_documents_count, get_document_version, get_write_generation,
+    RENDERER_VERSION
 )
 
 app = Flask(__name__)
 
+# Responses smaller than this are sent uncompressed
+COMPRESS_MIN_SIZE = 1024
+COMPRESS_LEVEL = 6
+COMPRESSIBLE_MIMETYPES = {
+    'application/json', 'text/html', 'text/css', 'text/plain',
+    'application/javascript', 'text/javascript',
+}
+
+
+# === Response Compression ===
+
+def negotiate_encoding():
+    """Pick the best content coding the client accepts (br > gzip)"""
+    offered = ['br', 'gzip'] if brotli else ['gzip']
+    return request.accept_encodings.best_match(offered)
+
+
+def compress_body(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data)
+    return zlib.compress(data, COMPRESS_LEVEL, wbits=31)
+
+
+def compress_stream(chunks, encoding):
+    """Compress a streamed body chunk by chunk"""
+    if encoding == 'br':
+        compressor = brotli.Compressor()
+        compress, finish = compressor.process, compressor.finish
+    else:
+        compressor = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, 31)
+        compress, finish = compressor.compress, compressor.flush
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        out = compress(chunk)
+        if out:
+            yield out
+    yield finish()
+
+
+@app.after_request
+def compress_response(response):
+    """gzip/brotli-encode text responses according to Accept-Encoding"""
+    if (response.status_code < 200 or response.status_code in (204, 304)
+            or response.direct_passthrough
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = negotiate_encoding()
+    if not encoding:
+        return response
+
+    if response.is_streamed:
+        response.response = compress_stream(response.response, encoding)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < COMPRESS_MIN_SIZE:
+            return response
+        response.set_data(compress_body(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+
+# === Request Metrics ===
+
+metrics.registry.describe('agentnote_http_request_duration_seconds',
+                          'Request latency by route (time to first byte for streamed bodies)')
+
+
+@app.before_request
+def start_request_timer():
+    if metrics.ENABLED:
+        g.request_start = time.perf_counter()
+
+
+@app.after_request
+def record_request_latency(response):
+    """Per-route latency histogram, labelled by the URL rule rather than the raw path"""
+    start = g.pop('request_start', None)
+    if start is not None:
+        metrics.registry.observe(
+            'agentnote_http_request_duration_seconds', time.perf_counter() - start,
+            route=request.url_rule.rule if request.url_rule else 'unmatched',
+            method=request.method, status=response.status_code,
+        )
+    return response
+
+
+def connection_metrics():
+    """Pool, writer and query-cache counters in Prometheus text format"""
+    pools = get_pool_stats()
+    writers = get_writer_stats()
+    cache = get_cache_stats()
+    families = []
+    for name, kind, help_text, source, key in (
+        ('agentnote_db_read_pool_open', 'gauge', 'Open read-only connections', pools, 'open'),
+        ('agentnote_db_read_pool_idle', 'gauge', 'Idle read-only connections', pools, 'idle'),
+        ('agentnote_db_read_pool_hits_total', 'counter', 'Acquires served by an idle connection', pools, 'hits'),
+        ('agentnote_db_read_pool_misses_total', 'counter', 'Acquires that opened a connection', pools, 'misses'),
+        ('agentnote_db_read_pool_waits_total', 'counter', 'Acquires that waited for a free connection', pools, 'waits'),
+        ('agentnote_db_read_pool_wait_seconds_total', 'counter', 'Time spent waiting for a read connection', pools, 'wait_time'),
+        ('agentnote_db_writer_transactions_total', 'counter', 'Write transactions', writers, 'transactions'),
+        ('agentnote_db_writer_waits_total', 'counter', 'Write transactions that waited for the writer lock', writers, 'waits'),
+        ('agentnote_db_writer_wait_seconds_total', 'counter', 'Time spent waiting for the writer lock', writers, 'wait_time'),
+        ('agentnote_db_writer_busy_errors_total', 'counter', 'Writes that failed with database is locked / writer busy', writers, 'busy_errors'),
+        ('agentnote_db_writer_hold_seconds_total', 'counter', 'Time the writer lock was held', writers, 'hold_time'),
+    ):
+        families.append(metrics.family(name, kind, help_text,
+                                       [({'db': s['db_path']}, s[key]) for s in source]))
+    for key, kind in (('hits', 'counter'), ('misses', 'counter'), ('invalidations', 'counter'),
+                      ('evictions', 'counter'), ('entries', 'gauge')):
+        name = f'agentnote_query_cache_{key}' + ('_total' if kind == 'counter' else '')
+        families.append(metrics.family(name, kind, f'Query cache {key}', [({}, cache[key])]))
+    return "".join(families)
+
+
+def stream_json_list(docs, extra=None):
+    """Stream {"success": true, "data": [...], ...} while rows come off the cursor
+
+    extra is called after the last row, so it can report values such as
+    next_cursor that are only known once the cursor is exhausted.
+    """
+    def generate():
+        yield '{"success": true, "data": ['
+        for i, doc in enumerate(docs):
+            yield (',' if i else '') + app.json.dumps(doc)
+        yield ']'
+        for key, value in (extra() if extra else {}).items():
+            yield f', {app.json.dumps(key)}: {app.json.dumps(value)}'
+        yield '}'
+
+    return app.response_class(stream_with_context(generate()), mimetype='application/json')
+
+
+# === Conditional Requests ===
+
+def parse_db_timestamp(value):
+    """Parse a SQLite UTC timestamp into an aware datetime"""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value).replace(tzinfo=timezone.utc)
+    except ValueError:
+        return None
+
+
+def add_validators(response, etag, last_modified=None):
+    """Attach ETag / Last-Modified and ask clients to always revalidate"""
+    response.set_etag(etag, weak=True)
+    if last_modified:
+        response.last_modified = last_modified
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def not_modified(etag, last_modified=None):
+    """Return a 304 response if the client's cached copy is still current"""
+    if request.if_none_match:
+        fresh = request.if_none_match.contains_weak(etag)
+    elif last_modified and request.if_modified_since:
+        fresh = last_modified.replace(microsecond=0) <= request.if_modified_since
+    else:
+        fresh = False
+    if fresh:
+        return add_validators(app.response_class(status=304), etag, last_modified)
+    return None
+
+
+def document_validators(version):
+    """ETag and Last-Modified for a single document"""
+    # updated_at contains a space, which is not allowed in an entity-tag. The
+    # renderer version is included so a renderer upgrade invalidates the cached content_html
+    key = f"{version['id']}:{version['updated_at']}:{RENDERER_VERSION}"
+    digest = hashlib.sha1(key.encode('utf-8')).hexdigest()[:12]
+    etag = f"doc-{version['id']}-{digest}"
+    return etag, parse_db_timestamp(version['updated_at'])
+
+
+def generation_validators():
+    """ETag and Last-Modified for list endpoints, keyed on the DB write generation"""
+    generation = get_write_generation()
+    digest = hashlib.sha1(request.full_path.encode('utf-8')).hexdigest()[:12]
+    etag = f"gen-{generation['generation']}-{digest}"
+    return etag, parse_db_timestamp(generation['changed_at'])
+
 
 # === Page Routes ===
 
@@ -75,38 +276,77 @@ def api_get_docs():
     tag = request.args.get('tag', '')
     limit = request.args.get('limit', 20, type=int)
     offset = request.args.get('offset', 0, type=int)
+    cursor = request.args.get('cursor', '')
+    fields = request.args.get('fields', '')
 
-    docs = search_documents(
-        keyword=keyword if keyword else None,
-        category=category if category else None,
-        tag=tag if tag else None,
-        limit=limit,
-        offset=offset
-    )
+    etag, last_modified = generation_validators()
+    cached = not_modified(etag, last_modified)
+    if cached:
+        return cached
+
+    try:
+        stream = DocumentStream(
+            keyword=keyword if keyword else None,
+            category=category if category else None,
+            tag=tag if tag else None,
+            limit=limit,
+            offset=offset,
+            cursor=cursor if cursor else None,
+            fields=fields if fields else None
+        )
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     total = get_documents_count()
 
-    return jsonify({
+    if request.args.get('stream', type=int):
+        response = stream_json_list(
+            stream, lambda: {'next_cursor': stream.next_cursor, 'total': total}
+        )
+        return add_validators(response, etag, last_modified)
+
+    page = {'data': list(stream), 'next_cursor': stream.next_cursor}
+
+    return add_validators(jsonify({
         'success': True,
-        'data': docs,
+        'data': page['data'],
+        'next_cursor': page['next_cursor'],
         'total': total
-    })
+    }), etag, last_modified)
 
 
 @app.route('/api/docs/<int:doc_id>', methods=['GET'])
 def api_get_doc_by_id(doc_id):
     """Get document by ID"""
+    version = get_document_version(doc_id=doc_id)
+    if not version:
+        return jsonify({'success': False, 'error': 'Document not found'}), 404
+
+    etag, last_modified = document_validators(version)
+    cached = not_modified(etag, last_modified)
+    if cached:
+        return cached
+
     doc = get_document(doc_id=doc_id)
     if doc:
-        return jsonify({'success': True, 'data': doc})
+        return add_validators(jsonify({'success': True, 'data': doc}), etag, last_modified)
     return jsonify({'success': False, 'error': 'Document not found'}), 404
 
 
 @app.route('/api/docs/slug/<slug>', methods=['GET'])
 def api_get_doc_by_slug(slug):
     """Get document by slug"""
-    doc = get_document(slug=slug)
+    version = get_document_version(slug=slug)
+    if not version:
+        return jsonify({'success': False, 'error': 'Document not found'}), 404
+
+    etag, last_modified = document_validators(version)
+    cached = not_modified(etag, last_modified)
+    if cached:
+        return cached
+
+    doc = get_document(doc_id=version['id'])
     if doc:
-        return jsonify({'success': True, 'data': doc})
+        return add_validators(jsonify({'success': True, 'data': doc}), etag, last_modified)
     return jsonify({'success': False, 'error': 'Document not found'}), 404
 
 
@@ -128,8 +368,17 @@ def api_add_doc():
             category=data.get('category'),
             tags=data.get('tags', []),
             summary=data.get('summary'),
-            source=data.get('source', 'web')
+            source=data.get('source', 'web'),
+            skip_duplicates=not data.get('allow_duplicates', False)
         )
+        if result.get('duplicate'):
+            return jsonify({
+                'success': True,
+                'duplicate': True,
+                'id': result['id'],
+                'slug': result['slug'],
+                'message': f'Duplicate of existing document, not saved: {result["title"]}'
+            })
         return jsonify({
             'success': True,
             'id': result['id'],
@@ -149,9 +398,11 @@ def api_update_doc(doc_id):
         return jsonify({'success': False, 'error': 'No data provided'}), 400
 
     try:
-        success = update_document(doc_id, **data)
-        if success:
-            return jsonify({'success': True, 'message': 'Document updated'})
+        action = update_document(doc_id, **data)
+        if action == 'unchanged':
+            return jsonify({'success': True, 'action': action, 'message': 'Document unchanged'})
+        if action:
+            return jsonify({'success': True, 'action': action, 'message': 'Document updated'})
         return jsonify({'success': False, 'error': 'Document not found'}), 404
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -172,22 +423,38 @@ def api_delete_doc(doc_id):
 @app.route('/api/categories', methods=['GET'])
 def api_get_categories():
     """Get all categories"""
+    etag, last_modified = generation_validators()
+    cached = not_modified(etag, last_modified)
+    if cached:
+        return cached
+
     categories = get_categories()
-    return jsonify({'success': True, 'data': categories})
+    return add_validators(jsonify({'success': True, 'data': categories}), etag, last_modified)
 
 
 @app.route('/api/tags', methods=['GET'])
 def api_get_tags():
     """Get all tags"""
+    etag, last_modified = generation_validators()
+    cached = not_modified(etag, last_modified)
+    if cached:
+        return cached
+
     tags = get_all_tags()
-    return jsonify({'success': True, 'data': tags})
+    return add_validators(jsonify({'success': True, 'data': tags}), etag, last_modified)
 
 
 @app.route('/api/recent', methods=['GET'])
 def api_get_recent():
     """Get recent documents"""
     limit = request.args.get('limit', 10, type=int)
-    docs = get_recent_documents(limit=limit)
+    fields = request.args.get('fields', '')
+    try:
+        if request.args.get('stream', type=int):
+            return stream_json_list(DocumentStream(limit=limit, fields=fields if fields else None))
+        docs = get_recent_documents(limit=limit, fields=fields if fields else None)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     return jsonify({'success': True, 'data': docs})
 
 
@@ -199,11 +466,27 @@ def api_get_stats():
         'data': {
             'total_docs': get_documents_count(),
             'categories': get_categories(),
-            'tags': get_all_tags()
+            'tags': get_all_tags(),
+            # Per-process connection counters: read pool and writer lock contention
+            'connections': {
+                'read_pools': get_pool_stats(),
+                'writers': get_writer_stats(),
+            }
         }
     })
 
 
+@app.route('/api/metrics', methods=['GET'])
+def api_get_metrics():
+    """Prometheus text exposition (query/route histograms need AGENTNOTE_METRICS=1 or --metrics)"""
+    body = metrics.family('agentnote_metrics_enabled', 'gauge',
+                          'Whether query and route instrumentation is on',
+                          [({}, int(metrics.ENABLED))])
+    body += connection_metrics() + metrics.registry.render()
+    return app.response_class(body, content_type='text/plain; version=0.0.4; charset=utf-8',
+                              headers={'Cache-Control': 'no-store'})
+
+
 # === Error Handlers ===
 
 @app.errorhandler(404)
@@ -216,6 +499,64 @@ def server_error(e):
     return jsonify({'success': False, 'error': 'Internal server error'}), 500
 
 
+# === Production Serving ===
+
+def warm_up(connections=None):
+    """Open this worker's DB connections and prime the query cache"""
+    warm_pool(connections)
+    get_documents_count()
+    get_categories()
+    get_all_tags()
+    get_recent_documents()
+
+
+def serve_production(host, port, workers, threads, graceful_timeout=30):
+    """Serve the app with a multi-process (gunicorn) or multi-threaded (waitress) WSGI server"""
+    # Every request thread should be able to hold its own pooled connection. The
+    # pool may already exist (init_database reads through it), so resize it too
+    db.set_pool_size(max(db.POOL_SIZE, threads))
+
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        BaseApplication = None
+
+    if BaseApplication is not None:
+        class GunicornServer(BaseApplication):
+            def load_config(self):
+                options = {
+                    'bind': f'{host}:{port}',
+                    'workers': workers,
+                    'threads': threads,
+                    'worker_class': 'gthread',
+                    'graceful_timeout': graceful_timeout,
+                    # Connections are per process: warm them after fork, close on exit
+                    'post_fork': lambda server, worker: warm_up(threads),
+                    'worker_exit': lambda server, worker: close_connections(),
+                }
+                for key, value in options.items():
+                    self.cfg.set(key, value)
+
+            def load(self):
+                return app
+
+        GunicornServer().run()
+        return
+
+    if workers > 1:
+        sys.exit("Multi-process serving requires gunicorn: pip install gunicorn")
+
+    try:
+        from waitress import serve
+    except ImportError:
+        sys.exit("Production serving requires gunicorn or waitress: pip install gunicorn")
+
+    # Let SIGTERM unwind normally so atexit closes the connection pool
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    warm_up(threads)
+    serve(app, host=host, port=port, threads=threads)
+
+
 # === Main ===
 
 if __name__ == '__main__':
@@ -223,15 +564,31 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument('--debug', action='store_true', help='Run in debug mode')
     parser.add_argument('--port', type=int, default=5000, help='Port number')
+    parser.add_argument('--workers', type=int, default=0,
+                        help='Serve with N worker processes (production mode, needs gunicorn)')
+    parser.add_argument('--threads', type=int, default=0,
+                        help='Request threads per worker (production mode, gunicorn or waitress)')
+    parser.add_argument('--metrics', action='store_true',
+                        help='Record query and route latency for /api/metrics')
+    parser.add_argument('--slow-query-ms', type=float,
+                        help='Log statements slower than this with their query plan (implies --metrics)')
     args = parser.parse_args()
 
+    if args.metrics or args.slow_query_ms is not None:
+        metrics.enable(args.slow_query_ms)
+
     # Kill any existing process on the port
     kill_port(args.port)
 
-    # Ensure database exists
-    if not DB_PATH.exists():
-        init_database()
+    # Ensure database and schema objects (FTS index, triggers) exist
+    init_database()
 
     print("Starting AgentNote Blog Viewer...")
     print(f"Open http://localhost:{args.port} in your browser")
-    app.run(host='0.0.0.0', port=args.port, debug=args.debug, use_reloader=False)
+    if args.workers or args.threads:
+        workers = max(args.workers, 1)
+        threads = max(args.threads, 1)
+        print(f"Production mode: {workers} worker(s) x {threads} thread(s)")
+        serve_production('0.0.0.0', args.port, workers, threads)
+    else:
+        app.run(host='0.0.0.0', port=args.port, debug=args.debug, use_reloader=False)
@@ -15,6 +15,9 @@ const state = {
     keyword: ''
   },
   isDark: false,
+  // Keyset pagination for the document list
+  nextCursor: null,
+  loadingMore: false,
   // Document cache for preloading
   docCache: new Map(),
   preloadQueue: new Set()
@@ -271,6 +274,12 @@ const ui = {
     // Theme toggle
     $('#theme-btn')?.addEventListener('click', () => this.toggleTheme());
 
+    // Infinite scroll: fetch the next page near the bottom of the list
+    window.addEventListener('scroll', debounce(() => {
+      const nearBottom = window.innerHeight + window.scrollY >= document.body.offsetHeight - 400;
+      if (nearBottom && !state.currentDoc) this.loadMoreDocs();
+    }, 100));
+
     // Search
     $('#search-input')?.addEventListener('input', debounce((e) => {
       state.filter.keyword = e.target.value;
@@ -309,16 +318,20 @@ const ui = {
     }
   },
 
-  async loadDocs() {
+  docParams() {
     const params = { limit: 50 };
     if (state.filter.category) params.category = state.filter.category;
     if (state.filter.tag) params.tag = state.filter.tag;
     if (state.filter.keyword) params.keyword = state.filter.keyword;
+    return params;
+  },
 
+  async loadDocs() {
     try {
-      const res = await api.getDocs(params);
+      const res = await api.getDocs(this.docParams());
       if (res.success) {
         state.docs = res.data;
+        state.nextCursor = res.next_cursor;
         this.renderDocs();
       }
     } catch (err) {
@@ -326,6 +339,23 @@ const ui = {
     }
   },
 
+  async loadMoreDocs() {
+    if (!state.nextCursor || state.loadingMore) return;
+    state.loadingMore = true;
+    try {
+      const res = await api.getDocs({ ...this.docParams(), cursor: state.nextCursor });
+      if (res.success) {
+        state.docs = state.docs.concat(res.data);
+        state.nextCursor = res.next_cursor;
+        this.renderDocs();
+      }
+    } catch (err) {
+      console.error('Failed to load more docs:', err);
+    } finally {
+      state.loadingMore = false;
+    }
+  },
+
   renderCategories() {
     const container = $('#category-list');
     if (!container) return;
@@ -389,7 +419,7 @@ const ui = {
           <div class="doc-card-title">${escapeHtml(doc.title)}</div>
           ${doc.category ? `<span class="doc-card-category">${escapeHtml(doc.category)}</span>` : ''}
         </div>
-        <div class="doc-card-summary">${escapeHtml(doc.summary || '')}</div>
+        <div class="doc-card-summary">${doc.snippet ? highlightSnippet(doc.snippet) : escapeHtml(doc.summary || '')}</div>
         <div class="doc-card-meta">
           <span>${formatDate(doc.created_at)}</span>
           ${doc.tags && doc.tags.length > 0 ? `
@@ -417,8 +447,15 @@ const ui = {
       $('#doc-view-category').textContent = state.currentDoc.category || 'Uncategorized';
       $('#doc-view-date').textContent = formatDate(state.currentDoc.created_at);
 
-      // Parse markdown with title to remove duplicate H1
-      const contentHtml = md.parse(state.currentDoc.content, { title: state.currentDoc.title });
+      // Use the server's pre-rendered HTML when available,
+      // otherwise parse markdown with title to remove duplicate H1
+      let contentHtml;
+      if (state.currentDoc.content_html != null) {
+        contentHtml = state.currentDoc.content_html;
+        md.headings = state.currentDoc.outline || [];
+      } else {
+        contentHtml = md.parse(state.currentDoc.content, { title: state.currentDoc.title });
+      }
       const tocHtml = md.generateTOC();
 
       // Render content
@@ -548,6 +585,13 @@ function escapeHtml(str) {
   return div.innerHTML;
 }
 
+// Escape a search snippet but keep the server's <mark> highlights
+function highlightSnippet(str) {
+  return escapeHtml(str)
+    .replace(/&lt;mark&gt;/g, '<mark>')
+    .replace(/&lt;\/mark&gt;/g, '</mark>');
+}
+
 function formatDate(dateStr) {
   if (!dateStr) return '';
   const date = new Date(dateStr);